@@ -0,0 +1,48 @@
+"""
+FastAPI 依赖：从 app.state.container（由 lifespan 构造）取用共享单例
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from backend.container import AppContainer
+from backend.core.manager import WorkflowRegistry
+from backend.core.session import SessionSigner
+from backend.core.task_store import BaseTaskStore
+from backend.services.feishu import FeishuClient
+from backend.services.triggers.debounce import EventDebouncer
+from backend.services.triggers.service import TriggerService
+
+
+def get_container(request: Request) -> AppContainer:
+    container: Optional[AppContainer] = getattr(request.app.state, "container", None)
+    if container is None:
+        # lifespan 未运行（如未以 `with TestClient(app)` 启动）或已停机
+        raise HTTPException(status_code=503, detail="Application is not started")
+    return container
+
+
+def get_task_store(request: Request) -> BaseTaskStore:
+    return get_container(request).task_store
+
+
+def get_trigger_service(request: Request) -> TriggerService:
+    return get_container(request).trigger_service
+
+
+def get_workflow_registry(request: Request) -> WorkflowRegistry:
+    return get_container(request).workflow_registry
+
+
+def get_feishu_client(request: Request) -> FeishuClient:
+    return get_container(request).feishu_client
+
+
+def get_session_signer(request: Request) -> SessionSigner:
+    return get_container(request).session_signer
+
+
+def get_event_debouncer(request: Request) -> Optional[EventDebouncer]:
+    return get_container(request).event_debouncer
@@ -2,22 +2,31 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import Any, Dict, List, Literal, Optional
-
-from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel, Field
-
-from backend.core.llm_client import LLMClient
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+
+from backend.api.deps import (
+    get_event_debouncer,
+    get_feishu_client,
+    get_session_signer,
+    get_task_store,
+    get_trigger_service,
+    get_workflow_registry,
+)
+from backend.core.session import SessionSigner
 from backend.core.manager import (
     ProcessContext,
-    ProcessManager,
     ProcessResult,
     WorkflowRegistry,
 )
-from backend.core.workflow_loader import build_default_workflow_registry, load_workflow_registry
-from backend.core.task_store import TaskStatus, TaskStore
+from backend.core.task_store import BaseTaskStore, TaskSnapshot, TaskStatus
 from backend.services.feishu import FeishuClient, FeishuAPIError
-from backend.services.triggers.service import TriggerService
+from backend.services.triggers.debounce import EventDebouncer
+from backend.services.triggers.pool import QueueFullError
+from backend.services.triggers.service import ServiceDrainingError, TriggerService
 from backend.config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -26,13 +35,15 @@ router = APIRouter()
 
 
 class AuthRequest(BaseModel):
-    """用户认证请求：code 换取 open_id"""
-    code: str = Field(..., description="飞书登录返回的临时授权码")
+    """用户认证请求：code 换取 open_id（携带有效的 X-Session-Token 时可不传 code）"""
+    code: Optional[str] = Field(default=None, description="飞书登录返回的临时授权码")
 
 
 class AuthResponse(BaseModel):
     """用户认证响应"""
     open_id: str = Field(..., description="用户的 open_id")
+    session_token: str = Field(..., description="会话令牌，之后的请求通过 X-Session-Token 请求头携带")
+    expires_at: float = Field(..., description="会话令牌过期时间（Unix 时间戳，秒）")
 
 
 class AddonProcessRequest(BaseModel):
@@ -46,6 +57,10 @@ class AddonProcessRequest(BaseModel):
     )
     user_id: str = Field(..., description="触发用户 open_id")
     mode: str = Field(default="idea_expand", description="处理模式")
+    modes: Optional[List[str]] = Field(
+        default=None,
+        description="（可选）多模式 fan-out：同一文档只读取一次，并发执行多个 mode；提供时忽略 mode",
+    )
     content: Optional[str] = Field(default=None, description="用户选中的文本（划词内容）")
     trigger_source: Optional[str] = Field(default=None, description="触发来源")
     wiki_node_token: Optional[str] = Field(default=None, description="（可选）知识库父节点 node_token")
@@ -56,6 +71,52 @@ class AddonProcessAccepted(BaseModel):
     task_id: str
     status: Literal["accepted"] = "accepted"
     message: str = "Processing started"
+    # 多模式 fan-out 时：mode -> 子任务 task_id（task_id 为父任务）
+    child_task_ids: Optional[Dict[str, str]] = None
+
+
+class AddonBatchProcessRequest(BaseModel):
+    # 条目逐个校验，单个条目不合法只影响该条目；条目数上限（BATCH_MAX_ITEMS）在处理函数中按当前配置校验
+    items: List[Dict[str, Any]] = Field(..., min_length=1, description="AddonProcessRequest 列表")
+
+
+class AddonBatchItemResult(BaseModel):
+    index: int
+    status: Literal["accepted", "rejected"]
+    task_id: Optional[str] = None
+    child_task_ids: Optional[Dict[str, str]] = None
+    # 被拒绝的原因与对应的单请求状态码（400 参数错误 / 429 队列已满 / 502 飞书调用失败）
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+
+
+class AddonBatchProcessAccepted(BaseModel):
+    accepted: int
+    rejected: int
+    items: List[AddonBatchItemResult]
+
+
+class AddonBulkProcessRequest(BaseModel):
+    token: str = Field(..., description="云盘文件夹 token 或知识库节点 node_token")
+    source_type: Literal["auto", "folder", "wiki"] = Field(
+        default="auto", description="token 类型；auto 时先按知识库节点解析，失败则按文件夹处理"
+    )
+    user_id: str = Field(..., description="触发用户 open_id")
+    mode: str = Field(default="idea_expand", description="处理模式")
+    concurrency: int = Field(
+        default=4,
+        ge=1,
+        le=get_settings().BULK_MAX_CONCURRENCY,
+        description="同时排队 / 执行的文档数上限",
+    )
+    recursive: bool = Field(default=True, description="是否包含子文件夹 / 子孙节点")
+    max_docs: int = Field(
+        default=get_settings().BULK_MAX_DOCS,
+        ge=1,
+        le=get_settings().BULK_MAX_DOCS,
+        description="最多处理的文档数",
+    )
+    trigger_source: Optional[str] = Field(default=None, description="触发来源")
 
 
 class TaskStatusResponse(BaseModel):
@@ -66,27 +127,60 @@ class TaskStatusResponse(BaseModel):
     progress: Optional[Dict[str, Any]] = None
     created_at: float
     updated_at: Optional[float] = None
+    # 记录版本号：每次状态/进度变更加一，可用于判断是否有更新
+    version: int = 1
     # 任务上下文信息（便于前端展示/调试）
     mode: Optional[str] = None
     doc_token: Optional[str] = None
     user_id: Optional[str] = None
+    # 多模式 fan-out：父子任务关系
+    parent_task_id: Optional[str] = None
+    child_task_ids: Optional[List[str]] = None
+    # 断点恢复：执行次数与已完成的阶段
+    attempts: int = 1
+    checkpoint_stages: Optional[List[str]] = None
+    # 阶段耗时时间线：[{stage, start, end, duration_s, calls: {llm, feishu}}]
+    timeline: Optional[List[Dict[str, Any]]] = None
 
 
-task_store = TaskStore()
+# 共享单例（飞书 / LLM 客户端、TaskStore、TriggerService 等）由 backend.container 在应用 lifespan 中构造，
+# 通过 backend.api.deps 中的依赖注入；本模块导入时不创建任何客户端
 
-try:
-    workflow_registry = load_workflow_registry()
-except Exception as exc:  # noqa: BLE001
-    # 配置文件缺失/配置错误时兜底（便于本地快速启动），同时打印告警
-    logger.warning("Failed to load workflow_config.yml, fallback to default registry: %s", exc)
-    workflow_registry = build_default_workflow_registry()
 
-process_manager = ProcessManager(
-    feishu_client=FeishuClient(),
-    llm_client=LLMClient(),
-    workflow_registry=workflow_registry,
-)
-trigger_service = TriggerService(task_store=task_store, process_manager=process_manager)
+async def session_user(
+    session_token: Optional[str] = Header(default=None, alias="X-Session-Token"),
+    session_signer: SessionSigner = Depends(get_session_signer),
+) -> Optional[str]:
+    """
+    返回会话令牌中的 open_id（本地校验签名与有效期，无效返回 401）。
+
+    未携带令牌时：SESSION_REQUIRED=true（默认）返回 401；关闭时返回 None，按兼容模式信任请求中的 user_id。
+    """
+    if not session_token:
+        if get_settings().SESSION_REQUIRED:
+            raise HTTPException(status_code=401, detail="X-Session-Token is required")
+        return None
+    try:
+        return session_signer.verify(session_token)
+    except ValueError as exc:
+        raise HTTPException(status_code=401, detail=str(exc)) from exc
+
+
+def _check_session_user(session_open_id: Optional[str], user_id: Optional[str]) -> None:
+    # user_id 必须是会话用户本人；session_open_id 为 None 只出现在 SESSION_REQUIRED=false 的兼容模式
+    if session_open_id is not None and session_open_id != user_id:
+        raise HTTPException(status_code=403, detail="user_id does not match the session user")
+
+
+async def _check_task_owner(
+    task_store: BaseTaskStore, task_id: str, session_open_id: Optional[str]
+) -> TaskSnapshot:
+    # 读取 / 操作已有任务时以任务上下文中的触发用户为准；返回任务快照供调用方复用
+    task = await task_store.get(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    _check_session_user(session_open_id, task.context.get("user_id"))
+    return task
 
 
 @router.get("/ping", summary="简单连通性测试")
@@ -99,34 +193,53 @@ async def ping() -> Dict[str, str]:
     summary="用户认证：code 换取 open_id",
     response_model=AuthResponse,
 )
-async def auth(payload: AuthRequest) -> AuthResponse:
+async def auth(
+    payload: AuthRequest,
+    session_token: Optional[str] = Header(default=None, alias="X-Session-Token"),
+    session_signer: SessionSigner = Depends(get_session_signer),
+    feishu_client: FeishuClient = Depends(get_feishu_client),
+) -> AuthResponse:
     """
-    用户认证接口：使用飞书登录返回的 code 换取用户 open_id
+    用户认证接口：使用飞书登录返回的 code 换取用户 open_id，并签发会话令牌
     
     流程：
     1. 前端调用 DocMiniApp.Service.User.login() 获取 code
     2. 前端调用此接口，传入 code
-    3. 后端使用 app_id + app_secret + code 调用飞书 OIDC 接口
-    4. 飞书返回 user_access_token 和用户信息（包含 open_id）
-    5. 返回 open_id 给前端，前端 SDK 缓存
+    3. 后端使用 app_id + app_secret + code 调用飞书小程序登录校验接口
+    4. 飞书返回用户信息（包含 open_id）
+    5. 返回 open_id 与签名的会话令牌，前端 SDK 缓存；有效期内再次认证只需携带 X-Session-Token，
+       在本地校验签名，不再调用飞书接口
     
     Args:
         payload: 包含飞书登录返回的 code
+        session_token: 之前签发的会话令牌（可选）
     
     Returns:
-        AuthResponse: 包含用户 open_id
+        AuthResponse: 用户 open_id、会话令牌及其过期时间
     
     Raises:
-        HTTPException: code 无效、认证失败等情况
+        HTTPException: code 无效、认证失败、会话过期且未提供 code 等情况
     """
+    if session_token:
+        try:
+            open_id, expires_at = session_signer.decode(session_token)
+        except ValueError as exc:
+            # 会话失效：有 code 时重新走飞书认证
+            logger.info("[POST /addon/auth] 会话令牌无效: %s", exc)
+            if not payload.code:
+                raise HTTPException(status_code=401, detail=str(exc)) from exc
+        else:
+            # 有效期内复用原令牌，不延长会话
+            return AuthResponse(open_id=open_id, session_token=session_token, expires_at=expires_at)
+
+    if not payload.code:
+        raise HTTPException(status_code=400, detail="code 或 X-Session-Token 必须提供")
     logger.info("[POST /addon/auth] 收到认证请求: code=%s...", payload.code[:10])
     
-    feishu = FeishuClient()
-    
     try:
-        # 调用飞书 OIDC 接口：用 code 换取 user_access_token 和用户信息
+        # 调用飞书小程序登录校验接口：用 code 换取用户信息（复用全局客户端的 tenant token 与连接池）
         # 响应中直接包含 open_id，无需额外调用 /userinfo 接口
-        user_data = await feishu._base.exchange_code_for_user_token(payload.code)
+        user_data = await feishu_client.exchange_code_for_user_token(payload.code)
         
         open_id = user_data.get("open_id")
         
@@ -138,8 +251,11 @@ async def auth(payload: AuthRequest) -> AuthResponse:
             )
         
         logger.info("[POST /addon/auth] 认证成功: open_id=%s...", open_id[:10])
-        return AuthResponse(open_id=open_id)
+        token, expires_at = session_signer.issue(open_id)
+        return AuthResponse(open_id=open_id, session_token=token, expires_at=expires_at)
         
+    except HTTPException:
+        raise
     except FeishuAPIError as e:
         logger.error("[POST /addon/auth] 飞书 API 调用失败: %s", e)
         raise HTTPException(
@@ -155,7 +271,9 @@ async def auth(payload: AuthRequest) -> AuthResponse:
 
 
 @router.get("/addon/modes", summary="获取所有可用的处理模式")
-async def get_available_modes() -> Dict[str, Any]:
+async def get_available_modes(
+    workflow_registry: WorkflowRegistry = Depends(get_workflow_registry),
+) -> Dict[str, Any]:
     """
     返回所有可用的 mode 列表，方便前端验证和显示。
     """
@@ -173,7 +291,18 @@ async def get_available_modes() -> Dict[str, Any]:
     response_model=AddonProcessAccepted,
     status_code=status.HTTP_202_ACCEPTED,
 )
-async def trigger_process(payload: AddonProcessRequest) -> AddonProcessAccepted:
+async def trigger_process(
+    payload: AddonProcessRequest,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    session_open_id: Optional[str] = Depends(session_user),
+    trigger_service: TriggerService = Depends(get_trigger_service),
+    workflow_registry: WorkflowRegistry = Depends(get_workflow_registry),
+    feishu_client: FeishuClient = Depends(get_feishu_client),
+) -> AddonProcessAccepted:
+    """
+    重复请求（同一 Idempotency-Key，或未提供时内容相同且任务仍在运行 / 刚成功）返回已有的 task_id。
+    """
+    _check_session_user(session_open_id, payload.user_id)
     # 记录请求详情（用于 debug）
     logger.info(
         "[POST /addon/process] 收到请求: token=%s, doc_token=%s, user_id=%s, mode=%s, trigger_source=%s",
@@ -185,13 +314,15 @@ async def trigger_process(payload: AddonProcessRequest) -> AddonProcessAccepted:
     )
     
     try:
-        workflow_registry.get(payload.mode)
+        modes = _requested_modes(payload, workflow_registry)
     except ValueError as exc:
-        logger.error("[POST /addon/process] 无效的 mode: %s, 错误: %s", payload.mode, exc)
+        logger.error(
+            "[POST /addon/process] 无效的 mode: %s, 错误: %s", payload.modes or payload.mode, exc
+        )
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
     try:
-        doc_token, wiki_node_token, wiki_space_id = await _resolve_tokens(payload)
+        doc_token, wiki_node_token, wiki_space_id = await _resolve_tokens(payload, feishu_client)
     except HTTPException as exc:
         logger.error(
             "[POST /addon/process] Token 解析失败: token=%s, doc_token=%s, 错误: %s",
@@ -201,77 +332,254 @@ async def trigger_process(payload: AddonProcessRequest) -> AddonProcessAccepted:
         )
         raise
 
-    ctx = ProcessContext(
-        doc_token=doc_token,
-        user_id=payload.user_id,
-        mode=payload.mode,
-        trigger_source=payload.trigger_source or "docs_addon",
-        selected_text=payload.content,  # 传递划词文本
-        wiki_node_token=wiki_node_token,
-        wiki_space_id=wiki_space_id,
-    )
+    ctx = _process_context(payload, modes[0], (doc_token, wiki_node_token, wiki_space_id))
 
-    task_id = await trigger_service.trigger(ctx=ctx)
+    # 客户端幂等键按用户隔离，避免不同用户的 key 冲突
+    key = f"client:{payload.user_id}:{idempotency_key}" if idempotency_key else None
+    try:
+        if len(modes) > 1:
+            task_id, child_task_ids = await trigger_service.trigger_many(
+                ctx=ctx, modes=modes, idempotency_key=key
+            )
+            return AddonProcessAccepted(task_id=task_id, child_task_ids=child_task_ids)
+
+        task_id = await trigger_service.trigger(ctx=ctx, idempotency_key=key)
+    except (QueueFullError, ServiceDrainingError) as exc:
+        raise _rejected(exc) from exc
 
     return AddonProcessAccepted(task_id=task_id)
 
 
-@router.get(
-    "/addon/tasks/{task_id}",
-    summary="查询任务状态",
-    response_model=TaskStatusResponse,
+@router.post(
+    "/addon/process/batch",
+    summary="一次请求触发多篇文档的处理",
+    response_model=AddonBatchProcessAccepted,
+    status_code=status.HTTP_202_ACCEPTED,
 )
-async def get_task_status(task_id: str) -> TaskStatusResponse:
-    task = await task_store.get(task_id)
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
+async def trigger_batch_process(
+    payload: AddonBatchProcessRequest,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+    session_open_id: Optional[str] = Depends(session_user),
+    trigger_service: TriggerService = Depends(get_trigger_service),
+    workflow_registry: WorkflowRegistry = Depends(get_workflow_registry),
+    feishu_client: FeishuClient = Depends(get_feishu_client),
+) -> AddonBatchProcessAccepted:
+    """
+    items 与 /addon/process 的请求体相同，按顺序返回每项的 task_id 或拒绝原因；单项失败不影响其他项。
+
+    token 并发解析（有上限、走解析缓存），单 mode 的条目在一次存储写入中创建；
+    带 Idempotency-Key 时按条目下标派生幂等键，整批重试返回相同的 task_id。
+    停机排空中或队列已满时整批返回 503 / 429（不创建任务）。
+    """
+    settings = get_settings()
+    if len(payload.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"items 最多 {settings.BATCH_MAX_ITEMS} 项，实际 {len(payload.items)} 项",
+        )
+    results: List[Optional[AddonBatchItemResult]] = [None] * len(payload.items)
+
+    def reject(index: int, error: str, status_code: int = 400) -> None:
+        results[index] = AddonBatchItemResult(
+            index=index, status="rejected", error=error, status_code=status_code
+        )
+
+    # 1) 逐项校验请求体与 mode
+    requests: List[tuple[int, AddonProcessRequest, List[str]]] = []
+    for index, raw in enumerate(payload.items):
+        try:
+            item = AddonProcessRequest.model_validate(raw)
+            _check_session_user(session_open_id, item.user_id)
+            requests.append((index, item, _requested_modes(item, workflow_registry)))
+        except (ValidationError, ValueError) as exc:
+            reject(index, str(exc))
+        except HTTPException as exc:
+            reject(index, str(exc.detail), exc.status_code)
+
+    # 2) 并发解析 token
+    limit = asyncio.Semaphore(settings.BATCH_RESOLVE_CONCURRENCY)
+
+    async def resolve(item: AddonProcessRequest) -> tuple[str, Optional[str], Optional[str]]:
+        async with limit:
+            return await _resolve_tokens(item, feishu_client)
+
+    resolved = await asyncio.gather(
+        *(resolve(item) for _, item, _ in requests), return_exceptions=True
+    )
+    single: List[tuple[int, ProcessContext]] = []
+    fan_out: List[tuple[int, ProcessContext, List[str]]] = []
+    for (index, item, modes), tokens in zip(requests, resolved):
+        if isinstance(tokens, HTTPException):
+            reject(index, str(tokens.detail), tokens.status_code)
+            continue
+        if isinstance(tokens, FeishuAPIError):
+            reject(index, f"Token 解析失败: {tokens}", status.HTTP_502_BAD_GATEWAY)
+            continue
+        if isinstance(tokens, Exception):
+            # 其他异常（网络错误等）同样只拒绝该项，不让整批返回 500
+            logger.error(
+                "[POST /addon/process/batch] item=%s token 解析异常", index, exc_info=tokens
+            )
+            reject(index, f"Token 解析失败: {tokens}", status.HTTP_502_BAD_GATEWAY)
+            continue
+        if isinstance(tokens, BaseException):
+            raise tokens
+        ctx = _process_context(item, modes[0], tokens)
+        if len(modes) > 1:
+            fan_out.append((index, ctx, modes))
+        else:
+            single.append((index, ctx))
+
+    def client_key(index: int, ctx: ProcessContext) -> Optional[str]:
+        return f"client:{ctx.user_id}:{idempotency_key}:{index}" if idempotency_key else None
+
+    # 3) 单 mode 条目一次创建；多 mode 条目按 fan-out 逐个创建
+    task_ids: List[str | QueueFullError] = []
+    try:
+        if single:
+            task_ids = await trigger_service.trigger_batch(
+                ctxs=[ctx for _, ctx in single],
+                idempotency_keys=[client_key(index, ctx) for index, ctx in single],
+                concurrency=settings.BATCH_RESOLVE_CONCURRENCY,
+            )
+    except (QueueFullError, ServiceDrainingError) as exc:
+        raise _rejected(exc) from exc
+    for (index, _), task_id in zip(single, task_ids):
+        if isinstance(task_id, QueueFullError):
+            reject(index, str(task_id), status.HTTP_429_TOO_MANY_REQUESTS)
+        else:
+            results[index] = AddonBatchItemResult(index=index, status="accepted", task_id=task_id)
+    for index, ctx, modes in fan_out:
+        try:
+            task_id, child_task_ids = await trigger_service.trigger_many(
+                ctx=ctx, modes=modes, idempotency_key=client_key(index, ctx)
+            )
+        except QueueFullError as exc:
+            reject(index, str(exc), status.HTTP_429_TOO_MANY_REQUESTS)
+            continue
+        except ServiceDrainingError as exc:
+            reject(index, str(exc), status.HTTP_503_SERVICE_UNAVAILABLE)
+            continue
+        results[index] = AddonBatchItemResult(
+            index=index, status="accepted", task_id=task_id, child_task_ids=child_task_ids
+        )
+
+    items = [result for result in results if result is not None]
+    accepted = sum(1 for result in items if result.status == "accepted")
+    logger.info(
+        "[POST /addon/process/batch] items=%s accepted=%s rejected=%s",
+        len(items),
+        accepted,
+        len(items) - accepted,
+    )
+    return AddonBatchProcessAccepted(accepted=accepted, rejected=len(items) - accepted, items=items)
+
 
-    context = task.get("context") or {}
+@router.post(
+    "/addon/process/bulk",
+    summary="批量处理云盘文件夹 / 知识库子树",
+    response_model=AddonProcessAccepted,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def trigger_bulk_process(
+    payload: AddonBulkProcessRequest,
+    session_open_id: Optional[str] = Depends(session_user),
+    trigger_service: TriggerService = Depends(get_trigger_service),
+    workflow_registry: WorkflowRegistry = Depends(get_workflow_registry),
+) -> AddonProcessAccepted:
+    """
+    返回父任务 task_id：progress.bulk 汇总 total / succeeded / failed，
+    各文档的子任务结果通过 /addon/tasks/{task_id}/children 分页查询。
+    """
+    _check_session_user(session_open_id, payload.user_id)
+    try:
+        workflow_registry.get(payload.mode)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-    return TaskStatusResponse(
+    ctx = ProcessContext(
+        doc_token=payload.token,
+        user_id=payload.user_id,
+        mode=payload.mode,
+        trigger_source=payload.trigger_source or "bulk",
+    )
+    try:
+        task_id = await trigger_service.trigger_bulk(
+            ctx=ctx,
+            source_type=payload.source_type,
+            recursive=payload.recursive,
+            concurrency=payload.concurrency,
+            max_docs=payload.max_docs,
+        )
+    except (QueueFullError, ServiceDrainingError) as exc:
+        raise _rejected(exc) from exc
+    return AddonProcessAccepted(task_id=task_id, message="Bulk processing started")
+
+
+def _rejected(exc: QueueFullError | ServiceDrainingError) -> HTTPException:
+    # 队列已满：429；停机排空中：503，由负载均衡 / 飞书重投递到其他实例或新进程
+    if isinstance(exc, QueueFullError):
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after_s)},
+        )
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(exc),
+        headers={"Retry-After": "5"},
+    )
+
+
+def _to_status_response(task_id: str, task: TaskSnapshot) -> TaskStatusResponse:
+    # 记录来自 TaskStore、字段类型已确定，跳过校验直接构造
+    context = task.context
+    return TaskStatusResponse.model_construct(
         task_id=task_id,
-        status=task["status"],
-        result=task.get("result"),
-        error=task.get("error"),
-        progress=task.get("progress"),
-        created_at=task.get("created_at", 0.0),
-        updated_at=task.get("updated_at"),
+        status=task.status,
+        result=task.result,
+        error=task.error,
+        progress=task.progress,
+        created_at=task.created_at,
+        updated_at=task.updated_at,
+        version=task.version,
         mode=context.get("mode"),
         doc_token=context.get("doc_token"),
         user_id=context.get("user_id"),
+        parent_task_id=task.parent_task_id,
+        child_task_ids=list(task.child_task_ids) if task.child_task_ids else None,
+        attempts=task.attempts or 1,
+        checkpoint_stages=list(task.checkpoints) if task.checkpoints else None,
+        timeline=task.timeline,
     )
 
 
+# 注意：by-doc / by-user 必须注册在 /addon/tasks/{task_id} 之前，否则会被路径参数路由吞掉
 @router.get(
     "/addon/tasks/by-doc",
     summary="按文档查询任务历史",
     response_model=List[TaskStatusResponse],
 )
-async def list_tasks_by_doc(doc_token: str, limit: int = 20) -> List[TaskStatusResponse]:
-    task_ids = await task_store.list_task_ids(doc_token=doc_token)
-    task_ids = task_ids[:limit]
-
-    items: List[TaskStatusResponse] = []
-    for tid in task_ids:
-        task = await task_store.get(tid)
-        if not task:
-            continue
-        context = task.get("context") or {}
-        items.append(
-            TaskStatusResponse(
-                task_id=tid,
-                status=task["status"],
-                result=task.get("result"),
-                error=task.get("error"),
-                progress=task.get("progress"),
-                created_at=task.get("created_at", 0.0),
-                updated_at=task.get("updated_at"),
-                mode=context.get("mode"),
-                doc_token=context.get("doc_token"),
-                user_id=context.get("user_id"),
-            )
-        )
-    return items
+async def list_tasks_by_doc(
+    doc_token: str,
+    response: Response,
+    limit: int = Query(default=20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    session_open_id: Optional[str] = Depends(session_user),
+    task_store: BaseTaskStore = Depends(get_task_store),
+) -> List[TaskStatusResponse]:
+    """
+    按创建时间倒序返回；还有更多数据时在响应头 X-Next-Cursor 中返回下一页游标。
+    只返回会话用户本人触发的任务。
+    """
+    return await _list_tasks(
+        task_store,
+        response,
+        doc_token=doc_token,
+        user_id=session_open_id,
+        limit=limit,
+        cursor=cursor,
+    )
 
 
 @router.get(
@@ -279,34 +587,317 @@ async def list_tasks_by_doc(doc_token: str, limit: int = 20) -> List[TaskStatusR
     summary="按用户查询任务历史",
     response_model=List[TaskStatusResponse],
 )
-async def list_tasks_by_user(user_id: str, limit: int = 20) -> List[TaskStatusResponse]:
-    task_ids = await task_store.list_task_ids(user_id=user_id)
-    task_ids = task_ids[:limit]
+async def list_tasks_by_user(
+    user_id: str,
+    response: Response,
+    limit: int = Query(default=20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    session_open_id: Optional[str] = Depends(session_user),
+    task_store: BaseTaskStore = Depends(get_task_store),
+) -> List[TaskStatusResponse]:
+    """
+    按创建时间倒序返回；还有更多数据时在响应头 X-Next-Cursor 中返回下一页游标。
+    """
+    _check_session_user(session_open_id, user_id)
+    return await _list_tasks(task_store, response, user_id=user_id, limit=limit, cursor=cursor)
+
+
+async def _list_tasks(
+    task_store: BaseTaskStore,
+    response: Response,
+    *,
+    doc_token: Optional[str] = None,
+    user_id: Optional[str] = None,
+    limit: int,
+    cursor: Optional[str],
+) -> List[TaskStatusResponse]:
+    try:
+        tasks, next_cursor = await task_store.list_tasks(
+            doc_token=doc_token, user_id=user_id, limit=limit, cursor=cursor
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [_to_status_response(task_id, task) for task_id, task in tasks]
 
-    items: List[TaskStatusResponse] = []
-    for tid in task_ids:
-        task = await task_store.get(tid)
+
+@router.get(
+    "/addon/tasks/{task_id}",
+    summary="查询任务状态",
+    response_model=TaskStatusResponse,
+)
+async def get_task_status(
+    task_id: str,
+    wait_s: float = Query(default=0, ge=0, le=60, description="长轮询：最多等待的秒数"),
+    since: Optional[int] = Query(default=None, ge=0, description="长轮询：等待版本号超过该值"),
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
+    session_open_id: Optional[str] = Depends(session_user),
+    task_store: BaseTaskStore = Depends(get_task_store),
+) -> Response:
+    """
+    查询任务状态，支持条件请求与长轮询：
+
+    - 响应带 ETag（记录版本号）；If-None-Match 与当前版本一致时返回 304，不含响应体
+    - wait_s > 0 时挂起请求，直到版本号超过 since（缺省取 If-None-Match 中的版本，再缺省取当前版本）
+      或等待超时；客户端每次状态变化只需一次请求
+    - 只能查询本人触发的任务（否则 403）
+    """
+    task = await _check_task_owner(task_store, task_id, session_open_id)
+
+    if wait_s > 0 and task.status == "running":
+        if since is None:
+            since = _version_from_etag(if_none_match) or task.version
+        task = await task_store.wait_for_change(task_id, since, wait_s)
         if not task:
-            continue
-        context = task.get("context") or {}
-        items.append(
-            TaskStatusResponse(
-                task_id=tid,
-                status=task["status"],
-                result=task.get("result"),
-                error=task.get("error"),
-                progress=task.get("progress"),
-                created_at=task.get("created_at", 0.0),
-                updated_at=task.get("updated_at"),
-                mode=context.get("mode"),
-                doc_token=context.get("doc_token"),
-                user_id=context.get("user_id"),
-            )
-        )
+            raise HTTPException(status_code=404, detail="Task not found")
+
+    etag = f'"{task.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # 前端高频轮询的接口：直接序列化为 JSON，避免 response_model 再做一轮 dump + 校验
+    return Response(
+        content=_to_status_response(task_id, task).model_dump_json(),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+@router.get(
+    "/addon/tasks/{task_id}/children",
+    summary="分页查询子任务（fan-out / 批量任务的逐项结果）",
+    response_model=List[TaskStatusResponse],
+)
+async def list_task_children(
+    task_id: str,
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    session_open_id: Optional[str] = Depends(session_user),
+    task_store: BaseTaskStore = Depends(get_task_store),
+) -> List[TaskStatusResponse]:
+    """
+    按子任务创建顺序返回；还有更多数据时在响应头 X-Next-Cursor 中返回下一页游标。
+    """
+    task = await _check_task_owner(task_store, task_id, session_open_id)
+    try:
+        offset = int(cursor) if cursor else 0
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}") from exc
+    child_ids = task.child_task_ids or ()
+    page = child_ids[offset : offset + limit]
+    if offset + limit < len(child_ids):
+        response.headers["X-Next-Cursor"] = str(offset + limit)
+    items: List[TaskStatusResponse] = []
+    for child_id in page:
+        child = await task_store.get(child_id)
+        if child:
+            items.append(_to_status_response(child_id, child))
     return items
 
 
-async def _resolve_tokens(payload: AddonProcessRequest) -> tuple[str, Optional[str], Optional[str]]:
+def _version_from_etag(if_none_match: Optional[str]) -> Optional[int]:
+    if not if_none_match:
+        return None
+    try:
+        return int(if_none_match.split(",")[0].strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        return None
+
+
+@router.get("/addon/tasks/{task_id}/events", summary="任务进度事件流（SSE）")
+async def stream_task_events(
+    task_id: str,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+    session_open_id: Optional[str] = Depends(session_user),
+    task_store: BaseTaskStore = Depends(get_task_store),
+) -> StreamingResponse:
+    """
+    以 Server-Sent Events 推送任务状态，替代定时轮询：
+
+    - 事件类型：progress / succeeded / failed / cancelled，data 与 GET /addon/tasks/{task_id} 的响应体相同
+    - 事件 id 为任务记录的 version；断线重连时浏览器会带上 Last-Event-ID，只推送更新的状态
+    - 空闲时每 TASK_EVENTS_HEARTBEAT_S 秒发送一条注释行作为心跳
+    - 任务结束（succeeded / failed / cancelled）后推送最终事件并关闭连接
+    - 只能订阅本人触发的任务（否则 403）
+    """
+    await _check_task_owner(task_store, task_id, session_open_id)
+    try:
+        since = int(last_event_id) if last_event_id else 0
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID") from exc
+
+    return StreamingResponse(
+        _task_events(
+            task_store, task_id, since, heartbeat_s=get_settings().TASK_EVENTS_HEARTBEAT_S
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _task_events(
+    task_store: BaseTaskStore, task_id: str, since: int, *, heartbeat_s: float
+) -> AsyncIterator[str]:
+    # 客户端断开时 Starlette 会取消该生成器，wait_for_change 中的订阅随之清理
+    yield "retry: 3000\n\n"
+    version = since
+    while True:
+        task = await task_store.wait_for_change(task_id, version, heartbeat_s)
+        if task is None:
+            yield 'event: gone\ndata: {"detail": "Task not found"}\n\n'
+            return
+        if task.version <= version and task.status == "running":
+            yield ": heartbeat\n\n"
+            continue
+        # 已结束的任务即使版本未变也补发最终事件，避免重连后空等
+        version = task.version
+        event = "progress" if task.status == "running" else task.status
+        data = _to_status_response(task_id, task).model_dump_json()
+        yield f"id: {version}\nevent: {event}\ndata: {data}\n\n"
+        if event != "progress":
+            return
+
+
+@router.get("/addon/stats/stages", summary="按 mode 统计各阶段耗时分位数")
+async def get_stage_stats(
+    trigger_service: TriggerService = Depends(get_trigger_service),
+) -> Dict[str, Any]:
+    """
+    基于已成功任务的时间线，返回每个 mode 下各阶段耗时的 p50/p90/p99（秒），
+    用于判断读取、模型、写入、通知哪一段占主导。
+    """
+    return {"modes": trigger_service.stage_stats.summary()}
+
+
+@router.get("/addon/stats/queue", summary="执行池与等待队列指标")
+async def get_queue_stats(
+    trigger_service: TriggerService = Depends(get_trigger_service),
+) -> Dict[str, Any]:
+    """
+    返回并发数、执行中 / 排队中任务数、累计提交 / 拒绝数，以及排队等待与执行耗时的分位数（秒）。
+    external 模式下返回共享队列长度、处理中任务数与存活的 worker 数。
+    """
+    return await trigger_service.queue_stats()
+
+
+@router.get("/addon/stats/store", summary="任务存储规模与单任务内存估算")
+async def get_store_stats(
+    task_store: BaseTaskStore = Depends(get_task_store),
+) -> Dict[str, Any]:
+    """
+    返回任务数、幂等键数、累计淘汰数及按样本估算的单任务内存占用。
+    """
+    return await task_store.stats()
+
+
+@router.get("/addon/stats/events", summary="飞书事件防抖合并指标")
+async def get_event_stats(
+    event_debouncer: Optional[EventDebouncer] = Depends(get_event_debouncer),
+) -> Dict[str, Any]:
+    """
+    返回收到的事件数、被合并的事件数、实际触发 / 失败次数，以及等待静默期结束的文档数。
+    """
+    if event_debouncer is None:
+        return {"enabled": False}
+    return {"enabled": True, **event_debouncer.stats()}
+
+
+@router.post(
+    "/addon/tasks/{task_id}/retry",
+    summary="从断点重试失败的任务",
+    response_model=TaskStatusResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def retry_task(
+    task_id: str,
+    session_open_id: Optional[str] = Depends(session_user),
+    trigger_service: TriggerService = Depends(get_trigger_service),
+    task_store: BaseTaskStore = Depends(get_task_store),
+) -> TaskStatusResponse:
+    """
+    从最后完成的阶段恢复失败任务：已生成的模型内容、已创建的子文档不会重复生成/创建。
+    只能重试本人触发的任务（否则 403）。
+    """
+    await _check_task_owner(task_store, task_id, session_open_id)
+    try:
+        await trigger_service.retry(task_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail="Task not found") from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    except (QueueFullError, ServiceDrainingError) as exc:
+        raise _rejected(exc) from exc
+
+    task = await task_store.get(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _to_status_response(task_id, task)
+
+
+@router.post(
+    "/addon/tasks/{task_id}/cancel",
+    summary="取消运行中的任务",
+    response_model=TaskStatusResponse,
+)
+async def cancel_task(
+    task_id: str,
+    session_open_id: Optional[str] = Depends(session_user),
+    trigger_service: TriggerService = Depends(get_trigger_service),
+    task_store: BaseTaskStore = Depends(get_task_store),
+) -> TaskStatusResponse:
+    """
+    中断任务正在进行的模型调用与飞书写入，任务状态变为 cancelled，已创建的云盘子文档会被删除。
+    fan-out 任务需取消父任务（子任务一并取消）。只能取消本人触发的任务（否则 403）。
+    """
+    await _check_task_owner(task_store, task_id, session_open_id)
+    try:
+        await trigger_service.cancel(task_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail="Task not found") from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+    task = await task_store.get(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _to_status_response(task_id, task)
+
+
+def _requested_modes(
+    payload: AddonProcessRequest, workflow_registry: WorkflowRegistry
+) -> List[str]:
+    """
+    请求的 mode 列表（去重并保持顺序；只给一个 mode 时退化为普通单任务）；mode 未配置时抛出 ValueError。
+    """
+    modes = list(dict.fromkeys(payload.modes or [payload.mode]))
+    for mode in modes:
+        workflow_registry.get(mode)
+    return modes
+
+
+def _process_context(
+    payload: AddonProcessRequest,
+    mode: str,
+    tokens: tuple[str, Optional[str], Optional[str]],
+) -> ProcessContext:
+    doc_token, wiki_node_token, wiki_space_id = tokens
+    return ProcessContext(
+        doc_token=doc_token,
+        user_id=payload.user_id,
+        mode=mode,
+        trigger_source=payload.trigger_source or "docs_addon",
+        selected_text=payload.content,  # 传递划词文本
+        wiki_node_token=wiki_node_token,
+        wiki_space_id=wiki_space_id,
+    )
+
+
+async def _resolve_tokens(
+    payload: AddonProcessRequest, feishu_client: FeishuClient
+) -> tuple[str, Optional[str], Optional[str]]:
     """
     统一解析入口 Token：
     - 如果提供 wiki_node_token/space_id，则直接使用（doc_token 需传 doc 实体 ID）
@@ -335,37 +926,18 @@ async def _resolve_tokens(payload: AddonProcessRequest) -> tuple[str, Optional[s
         )
 
     # 尝试将 token 视为 node_token，查询 wiki 信息；失败则降级为 doc_token
-    feishu = trigger_service._pm._feishu  # type: ignore[attr-defined]
-    try:
-        logger.debug("[_resolve_tokens] 尝试将 token 作为 Wiki 节点解析: %s", token)
-        wiki_node = await feishu.get_wiki_node_by_token(node_token=token)
-        doc_token = (
-            wiki_node.get("obj_token")
-            or wiki_node.get("objToken")
-            or wiki_node.get("document_id")
-            or wiki_node.get("doc_token")
-        )
-        space_id = wiki_node.get("space_id")
-        if doc_token:
-            logger.info(
-                "[_resolve_tokens] Wiki 节点解析成功: node_token=%s -> doc_token=%s, space_id=%s",
-                token,
-                doc_token,
-                space_id,
-            )
-            return str(doc_token), token, str(space_id) if space_id else None
-    except FeishuAPIError as e:
-        # 不是 wiki 节点或无权限，则降级为普通 doc_token
+    # （旧版 doc token 跳过查询；查询结果含失败结果均有 TTL 缓存，与输出阶段的节点查询共享）
+    resolved = await feishu_client.resolve_token(token)
+    if resolved["wiki_node_token"]:
         logger.info(
-            "[_resolve_tokens] 不是 Wiki 节点（或无权限），降级为普通 doc_token: %s, 错误: %s",
+            "[_resolve_tokens] Wiki 节点解析成功: node_token=%s -> doc_token=%s, space_id=%s",
             token,
-            str(e),
+            resolved["doc_token"],
+            resolved["wiki_space_id"],
         )
-        pass
-
-    # 默认当作 doc_token（云盘或普通文档）
-    logger.info("[_resolve_tokens] 使用普通 doc_token 模式: %s", token)
-    return token, None, None
+    else:
+        logger.info("[_resolve_tokens] 使用普通 doc_token 模式: %s", token)
+    return resolved["doc_token"], resolved["wiki_node_token"], resolved["wiki_space_id"]
 
 
 class FeishuEventCallback(BaseModel):
@@ -384,7 +956,11 @@ class FeishuEventCallback(BaseModel):
 
 
 @router.post("/feishu/event", summary="飞书事件订阅回调（最小骨架）")
-async def feishu_event(payload: FeishuEventCallback) -> Dict[str, Any]:
+async def feishu_event(
+    payload: FeishuEventCallback,
+    trigger_service: TriggerService = Depends(get_trigger_service),
+    event_debouncer: Optional[EventDebouncer] = Depends(get_event_debouncer),
+) -> Dict[str, Any]:
     # 1) URL 校验
     if payload.challenge:
         return {"challenge": payload.challenge}
@@ -417,14 +993,24 @@ async def feishu_event(payload: FeishuEventCallback) -> Dict[str, Any]:
         logger.warning("Feishu event missing doc_token/user_id, header=%s event=%s", header, event)
         return {"code": 0, "msg": "ok"}
 
-    # 4) 幂等：用 event_id 去重（如果没有 event_id，就退化为非幂等）
+    # 4) 防抖合并或立即触发；立即触发时用 event_id 去重（如果没有 event_id，就退化为非幂等）
     ctx = ProcessContext(
         doc_token=str(doc_token),
         user_id=str(user_id),
         mode=str(mode),
         trigger_source="feishu_event",
     )
-    await trigger_service.trigger(ctx=ctx, idempotency_key=str(event_id) if event_id else None)
+    if event_debouncer is not None:
+        # 防抖：静默期后合并为一次触发，重复投递的事件同样被合并，无需 event_id 幂等
+        if trigger_service.draining:
+            raise _rejected(ServiceDrainingError("Service is shutting down"))
+        event_debouncer.submit(ctx)
+        return {"code": 0, "msg": "ok"}
+    try:
+        await trigger_service.trigger(ctx=ctx, idempotency_key=str(event_id) if event_id else None)
+    except (QueueFullError, ServiceDrainingError) as exc:
+        # 返回非 200 时飞书会按退避策略重新投递，event_id 幂等保证不会重复处理
+        raise _rejected(exc) from exc
     return {"code": 0, "msg": "ok"}
 
 
@@ -438,7 +1024,10 @@ class FeishuCardCallback(BaseModel):
 
 
 @router.post("/feishu/card_callback", summary="飞书交互卡片回调（预留骨架）")
-async def feishu_card_callback(payload: FeishuCardCallback) -> Dict[str, Any]:
+async def feishu_card_callback(
+    payload: FeishuCardCallback,
+    trigger_service: TriggerService = Depends(get_trigger_service),
+) -> Dict[str, Any]:
     action = payload.action or {}
     value = action.get("value") or {}
     doc_token = value.get("doc_token")
@@ -453,6 +1042,9 @@ async def feishu_card_callback(payload: FeishuCardCallback) -> Dict[str, Any]:
             trigger_source="card_callback",
         )
         # 卡片回调一般用 request_id 做幂等，这里先留空
-        await trigger_service.trigger(ctx=ctx)
+        try:
+            await trigger_service.trigger(ctx=ctx)
+        except (QueueFullError, ServiceDrainingError) as exc:
+            raise _rejected(exc) from exc
 
     return {"code": 0, "msg": "ok"}
@@ -11,10 +11,75 @@ class Settings(BaseSettings):
     # 飞书应用配置
     FEISHU_APP_ID: str
     FEISHU_APP_SECRET: str
+    # 文档 / 知识库节点元数据缓存时长（秒），0 表示关闭；批量处理与重试时避免重复查询
+    FEISHU_META_CACHE_TTL_S: float = 300.0
+    # token 不是知识库节点（或无权限）的查询结果缓存时长（秒），避免普通文档每次触发都多一次失败请求
+    FEISHU_NEGATIVE_CACHE_TTL_S: float = 60.0
+    # 插件会话令牌：/api/addon/auth 签发、本地校验（HMAC）；未配置 secret 时每个进程随机生成（仅限本地开发，
+    # 重启后会话失效、多进程 / 多节点互不认可）
+    SESSION_SECRET: str | None = None
+    SESSION_TTL_S: float = 7200.0
+    # 插件接口（触发 / 查询 / 重试 / 取消任务）是否必须携带 X-Session-Token；关闭时未携带令牌的请求
+    # 按兼容模式信任请求中的 user_id，任何调用方都可代他人触发、读取任务，仅限本地调试
+    SESSION_REQUIRED: bool = True
 
     # 通用业务配置
     PROCESS_TIMEOUT: int = 60
 
+    # 任务执行池：最大并发执行数与等待队列上限，队列满时接口返回 429 + Retry-After
+    TASK_WORKERS: int = 8
+    TASK_QUEUE_MAX: int = 200
+    # 公平调度：单个用户同时执行的任务数上限（0 表示不限制）；同一文档的任务是否串行执行
+    TASK_MAX_PER_USER: int = 4
+    TASK_SERIALIZE_DOCS: bool = False
+    # 任务执行方式：inline（API 进程内执行）/ external（API 只入队，由 python -m backend.worker 执行，
+    # 需 TASK_STORE_BACKEND=redis；此时 TASK_WORKERS 为每个 worker 进程的并发数）
+    TASK_EXECUTION: str = "inline"
+    # 批量处理（/api/addon/process/bulk）：单次最多文档数、请求可指定的并发上限
+    BULK_MAX_DOCS: int = 500
+    BULK_MAX_CONCURRENCY: int = 8
+    # 批量触发（/api/addon/process/batch）：单次最多条目数、并发解析 token / 查询文档版本的上限
+    BATCH_MAX_ITEMS: int = 100
+    BATCH_RESOLVE_CONCURRENCY: int = 8
+    # 停机排空时限（秒）：收到退出信号后等待执行中任务完成的最长时间，超时的任务移交给下一个进程从断点恢复
+    SHUTDOWN_DRAIN_S: float = 25.0
+    # 收到 SIGTERM 后先进入排空状态（/ready 与触发接口返回 503）并保持监听端口开放的秒数，
+    # 留给负载均衡摘除实例；之后才交给 uvicorn 关闭端口并开始等待执行中的任务
+    SHUTDOWN_READINESS_GRACE_S: float = 5.0
+    # /metrics 事件循环延迟采样周期（秒）；0 表示不采样
+    METRICS_LOOP_LAG_INTERVAL_S: float = 0.5
+    # 飞书事件触发防抖（秒）：同一文档 + mode 的事件静默 EVENT_DEBOUNCE_S 后合并为一次处理，
+    # 持续编辑时最迟在首个事件后 EVENT_DEBOUNCE_MAX_WAIT_S 触发；0 表示收到事件立即触发
+    EVENT_DEBOUNCE_S: float = 30.0
+    EVENT_DEBOUNCE_MAX_WAIT_S: float = 300.0
+
+    # 任务失败后的自动延迟重试（从断点恢复，不重新调用模型）；0 表示关闭
+    TASK_AUTO_RETRY_MAX: int = 0
+    TASK_AUTO_RETRY_DELAY_S: float = 60.0
+
+    # 任务存储后端：memory（默认，进程内）/ sqlite（WAL 持久化，重启后保留任务历史与断点）
+    # / redis（多 worker、多节点共享，需安装 redis 包）
+    TASK_STORE_BACKEND: str = "memory"
+    TASK_STORE_SQLITE_PATH: str = "data/tasks.db"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    TASK_STORE_REDIS_PREFIX: str = "feishu_ai:"
+    # SQLite 批量落盘周期（秒）：周期内的多次进度更新合并为一次事务；<=0 表示每次变更立即落盘
+    TASK_STORE_FLUSH_INTERVAL_S: float = 0.5
+
+    # 任务保留策略：终态任务保留时长（秒）与任务总数上限，超出由后台清理协程淘汰；None 表示不限
+    TASK_RETENTION_S: float | None = 86400.0
+    TASK_MAX_RECORDS: int | None = 10000
+    # 幂等键有效期（秒），按任务创建时间计；None 表示与任务同生命周期
+    IDEMPOTENCY_TTL_S: float | None = 3600.0
+    # 重复触发去重窗口（秒）：相同文档 / mode / 划词文本 / 文档版本的任务仍在运行，或在该时间内成功结束时，
+    # /api/addon/process 返回已有 task_id；0 表示关闭（Idempotency-Key 请求头不受影响）。
+    # 开启后每次触发都会在请求路径上多一次文档元数据请求（读取最新 revision），默认关闭
+    TASK_DEDUP_WINDOW_S: float = 0.0
+    TASK_SWEEP_INTERVAL_S: float = 60.0
+
+    # 任务进度 SSE 推送的心跳间隔（秒），防止代理因空闲断开长连接
+    TASK_EVENTS_HEARTBEAT_S: float = 15.0
+
     # 示例输出：Webhook（可选）
     WEBHOOK_OUTPUT_URL: str | None = None
     WEBHOOK_OUTPUT_TIMEOUT_S: float = 10.0
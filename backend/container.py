@@ -0,0 +1,269 @@
+"""
+应用依赖容器：飞书 / LLM 客户端、TaskStore、任务调度等单例在应用生命周期内构造一次并共享，停机时统一释放
+
+API 进程（backend.main 的 lifespan）与独立 worker 进程（backend.worker）使用同一套构造逻辑；
+路由通过 backend.api.deps 中的 FastAPI 依赖取用，模块导入时不再创建任何客户端或连接池。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from backend.config import Settings
+from backend.core.llm_client import LLMClient
+from backend.core.manager import ProcessManager, WorkflowRegistry
+from backend.core.metrics import REGISTRY
+from backend.core.session import SessionSigner, build_session_signer
+from backend.core.task_store import BaseTaskStore, build_task_store
+from backend.core.workflow_loader import build_default_workflow_registry, load_workflow_registry
+from backend.services.feishu import FeishuClient
+from backend.services.triggers.debounce import EventDebouncer
+from backend.services.triggers.job_queue import RedisJobQueue, build_job_queue
+from backend.services.triggers.service import TriggerService
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+TASK_STORE_TASKS = REGISTRY.gauge(
+    "task_store_tasks", "Tasks held by the task store by state", ("state",)
+)
+ACTIVE_TASKS = REGISTRY.gauge(
+    "active_tasks", "Tasks queued or executing in this process by stage", ("stage",)
+)
+WORKER_POOL_TASKS = REGISTRY.gauge(
+    "worker_pool_tasks",
+    "Tasks queued or running in the in-process worker pool by pool and state",
+    ("pool", "state"),
+)
+STARTUP_SECONDS = REGISTRY.gauge(
+    "app_startup_seconds",
+    "Module import, per-component construction and start-up time of this process",
+    ("phase",),
+)
+
+
+@dataclass
+class AppContainer:
+    settings: Settings
+    feishu_client: FeishuClient
+    llm_client: LLMClient
+    workflow_registry: WorkflowRegistry
+    task_store: BaseTaskStore
+    job_queue: Optional[RedisJobQueue]
+    process_manager: ProcessManager
+    trigger_service: TriggerService
+    # EVENT_DEBOUNCE_S=0 时为 None（飞书事件立即触发）
+    event_debouncer: Optional[EventDebouncer]
+    session_signer: SessionSigner
+    # 各阶段耗时（秒）：build.<组件> 为构造耗时，start 为启动耗时
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    async def start(self, *, resume_handoff: bool = True) -> None:
+        """
+        启动 TaskStore 后台资源；API 进程同时恢复上一个进程移交的任务（worker 进程由队列领取，不需要）。
+        """
+        started = time.perf_counter()
+        await self.task_store.start()
+        if resume_handoff:
+            await self.trigger_service.resume_handoff()
+        self.timings["start"] = time.perf_counter() - started
+
+    async def begin_shutdown(self) -> None:
+        """
+        收到退出信号时立即调用：先触发防抖中等待的事件，再停止接收新任务（/ready 返回 503）；
+        执行中的任务继续运行，由 close 排空。
+        """
+        if self.event_debouncer is not None:
+            await self.event_debouncer.flush()
+        self.trigger_service.begin_drain()
+
+    async def close(self, *, drain_s: float) -> None:
+        """
+        停机：先立即触发防抖中等待的事件，再排空（不再接收新任务，等待执行中的任务至多 drain_s 秒，剩余任务移交），
+        确保任务数据落盘后再关闭各客户端的连接池。
+
+        单个资源关闭失败只记录日志，不影响其余资源释放。
+        """
+        if self.event_debouncer is not None:
+            await self._close_step("event_debouncer", self.event_debouncer.flush)
+        await self._close_step("trigger_service", lambda: self.trigger_service.drain(drain_s))
+        if self.job_queue is not None:
+            await self._close_step("job_queue", self.job_queue.close)
+        await self._close_step("task_store", self.task_store.close)
+        await self._close_step("process_manager", self.process_manager.close)
+        await self._close_step("llm_client", self.llm_client.close)
+        await self._close_step("feishu_client", self.feishu_client.close)
+
+    async def collect_metrics(self) -> None:
+        """/metrics 抓取时刷新存储规模、执行池队列深度与执行中任务的 Gauge。"""
+        stats = await self.task_store.stats()
+        TASK_STORE_TASKS.replace(
+            {("running",): stats["running"], ("finished",): stats["finished"]}
+        )
+        WORKER_POOL_TASKS.replace(
+            {
+                (pool, state): count
+                for pool, load in self.trigger_service.pool_load().items()
+                for state, count in load.items()
+            }
+        )
+        ACTIVE_TASKS.replace(
+            {
+                (stage,): count
+                for stage, count in self.trigger_service.active_stage_counts().items()
+            }
+        )
+
+    def report_startup(self, *, import_s: Optional[float] = None) -> None:
+        """把导入 / 构造 / 启动耗时写入日志与 app_startup_seconds 指标。"""
+        phases = dict(self.timings)
+        if import_s is not None:
+            phases["import"] = import_s
+        STARTUP_SECONDS.replace({(phase,): seconds for phase, seconds in phases.items()})
+        logger.info(
+            "Startup timings: %s",
+            ", ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in phases.items()),
+        )
+
+    @staticmethod
+    async def _close_step(name: str, close: Callable[[], Awaitable[None]]) -> None:
+        try:
+            await close()
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to close %s", name)
+
+
+class GracefulSignalHandler:
+    """
+    SIGTERM 时先执行 begin（进入排空状态，/ready 返回 503），grace_s 秒后再交给原有处理器（uvicorn 据此关闭监听端口、
+    进入 lifespan 关闭流程）。若直接由 uvicorn 处理，端口在 lifespan 关闭前就已关闭，负载均衡无法观察到排空状态。
+
+    grace_s 期间再次收到 SIGTERM 时立即交给原有处理器。只能在主线程的事件循环中安装。
+    """
+
+    def __init__(self, begin: Callable[[], Awaitable[None]], *, grace_s: float) -> None:
+        self._begin = begin
+        self._grace_s = grace_s
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._previous: Any = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._signalled = False
+
+    def install(self) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._previous = signal.signal(signal.SIGTERM, self._handle)
+
+    def uninstall(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._loop is not None and signal.getsignal(signal.SIGTERM) == self._handle:
+            signal.signal(signal.SIGTERM, self._previous)
+        self._loop = None
+
+    def _handle(self, sig: int, frame: Optional[FrameType]) -> None:
+        if self._signalled or self._loop is None:
+            self._forward(sig, frame)
+            return
+        self._signalled = True
+        logger.info("Received signal %s, draining for %.1fs before shutdown", sig, self._grace_s)
+        self._loop.call_soon_threadsafe(self._start, sig, frame)
+
+    def _start(self, sig: int, frame: Optional[FrameType]) -> None:
+        self._task = asyncio.create_task(self._begin_then_forward(sig, frame))
+
+    async def _begin_then_forward(self, sig: int, frame: Optional[FrameType]) -> None:
+        try:
+            await self._begin()
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to begin shutdown")
+        await asyncio.sleep(self._grace_s)
+        self._forward(sig, frame)
+
+    def _forward(self, sig: int, frame: Optional[FrameType]) -> None:
+        if callable(self._previous):
+            self._previous(sig, frame)
+            return
+        # 原处理器为默认行为（未由 uvicorn 等接管）：恢复后重新发出信号
+        signal.signal(sig, self._previous if self._previous is not None else signal.SIG_DFL)
+        signal.raise_signal(sig)
+
+
+def build_container(settings: Settings) -> AppContainer:
+    """
+    按配置构造所有共享组件并记录各自的构造耗时（不做任何网络 I/O，start 时才连接存储后端）。
+    """
+    timings: Dict[str, float] = {}
+
+    def timed(name: str, build: Callable[[], _T]) -> _T:
+        started = time.perf_counter()
+        value = build()
+        timings[f"build.{name}"] = time.perf_counter() - started
+        return value
+
+    task_store = timed("task_store", lambda: build_task_store(settings))
+    workflow_registry = timed("workflow_registry", _load_workflow_registry)
+    # 全局共享的飞书客户端：tenant token、元数据 / token 解析缓存与连接池在所有请求与任务间复用
+    feishu_client = timed("feishu_client", FeishuClient)
+    llm_client = timed("llm_client", LLMClient)
+    session_signer = timed("session_signer", lambda: build_session_signer(settings))
+    job_queue = timed("job_queue", lambda: build_job_queue(settings))
+    process_manager = ProcessManager(
+        feishu_client=feishu_client,
+        llm_client=llm_client,
+        workflow_registry=workflow_registry,
+    )
+    trigger_service = TriggerService(
+        task_store=task_store,
+        process_manager=process_manager,
+        auto_retry_max=settings.TASK_AUTO_RETRY_MAX,
+        auto_retry_delay_s=settings.TASK_AUTO_RETRY_DELAY_S,
+        workers=settings.TASK_WORKERS,
+        max_queue=settings.TASK_QUEUE_MAX,
+        max_per_user=settings.TASK_MAX_PER_USER,
+        serialize_docs=settings.TASK_SERIALIZE_DOCS,
+        pools=workflow_registry.pools,
+        mode_pools=workflow_registry.mode_pools(),
+        dedup_window_s=settings.TASK_DEDUP_WINDOW_S,
+        job_queue=job_queue,
+    )
+    # 飞书事件防抖：同一文档 + mode 的连续编辑合并为一次处理
+    event_debouncer = (
+        EventDebouncer(
+            trigger=lambda ctx: trigger_service.trigger(ctx=ctx),
+            quiet_s=settings.EVENT_DEBOUNCE_S,
+            max_wait_s=settings.EVENT_DEBOUNCE_MAX_WAIT_S,
+        )
+        if settings.EVENT_DEBOUNCE_S > 0
+        else None
+    )
+    return AppContainer(
+        settings=settings,
+        feishu_client=feishu_client,
+        llm_client=llm_client,
+        workflow_registry=workflow_registry,
+        task_store=task_store,
+        job_queue=job_queue,
+        process_manager=process_manager,
+        trigger_service=trigger_service,
+        event_debouncer=event_debouncer,
+        session_signer=session_signer,
+        timings=timings,
+    )
+
+
+def _load_workflow_registry() -> WorkflowRegistry:
+    try:
+        return load_workflow_registry()
+    except Exception as exc:  # noqa: BLE001
+        # 配置文件缺失/配置错误时兜底（便于本地快速启动），同时打印告警
+        logger.warning("Failed to load workflow_config.yml, fallback to default registry: %s", exc)
+        return build_default_workflow_registry()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+CheckpointSaveFn = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class StageCheckpoints:
+    """
+    按阶段记录的断点数据（绑定到 task_id），用于失败后从最后完成的阶段恢复。
+
+    阶段约定：
+    - source：原文档标题/父目录/正文
+    - processor：ProcessorResult（最昂贵的 LLM 产物）
+    - output.*：输出层内部阶段（标题、容器、子文档 token、内容写入、回链）
+
+    save_fn 负责把断点写入 TaskStore；未提供时仅保存在内存中（单次执行内有效）。
+    """
+
+    def __init__(
+        self,
+        data: Optional[Dict[str, Dict[str, Any]]] = None,
+        *,
+        save_fn: Optional[CheckpointSaveFn] = None,
+    ) -> None:
+        self._data: Dict[str, Dict[str, Any]] = dict(data or {})
+        self._save_fn = save_fn
+
+    def get(self, stage: str) -> Optional[Dict[str, Any]]:
+        return self._data.get(stage)
+
+    def has(self, stage: str) -> bool:
+        return stage in self._data
+
+    def stages(self) -> List[str]:
+        return list(self._data.keys())
+
+    async def save(self, stage: str, data: Dict[str, Any]) -> None:
+        self._data[stage] = data
+        if self._save_fn:
+            await self._save_fn(stage, data)
@@ -2,13 +2,16 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import time
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 import yaml
 
 from backend.core.llm_config_models import ChainStepConfig, LLMConfig
+from backend.core.metrics import LLM_REQUEST_SECONDS
 from backend.core.providers import LLMProviderError, NonRetryableLLMError, build_provider
+from backend.core.timeline import record_call
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +46,12 @@ class LLMClient:
         raw = yaml.safe_load(path.read_text(encoding="utf-8"))
         return LLMConfig.model_validate(raw)
 
+    async def close(self) -> None:
+        """
+        关闭所有 provider 的连接池（应用停机时调用）。
+        """
+        await asyncio.gather(*(p.close() for p in self._providers.values()))
+
     async def chat_completion(
         self,
         *,
@@ -70,8 +79,12 @@ class LLMClient:
             # 单 provider 超时配置
             timeout_s = step.timeout_s or self._config.global_.overall_timeout_s
 
+            # 结果类别写入 llm_request_duration_seconds 的 outcome 标签
+            outcome = "error"
+            started = time.perf_counter()
             try:
                 logger.info("Calling LLM provider=%s, chain=%s", provider_name, chain)
+                record_call("llm")
 
                 result = await asyncio.wait_for(
                     provider.chat(messages, **options), timeout=timeout_s
@@ -79,10 +92,17 @@ class LLMClient:
                 logger.info(
                     "LLM provider=%s succeeded for chain=%s", provider_name, chain
                 )
+                outcome = "success"
                 return result
 
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                # 任务被取消：httpx 请求随之中断，不再尝试链上后续 provider
+                logger.info("LLM call cancelled provider=%s, chain=%s", provider_name, chain)
+                raise
             except NonRetryableLLMError as exc:
                 # 不可重试错误，直接抛出
+                outcome = "non_retryable"
                 logger.error(
                     "Non-retryable error from provider=%s, chain=%s: %s",
                     provider_name,
@@ -92,6 +112,7 @@ class LLMClient:
                 raise
             except (LLMProviderError, asyncio.TimeoutError) as exc:
                 # 可重试 / 可 fallback 的错误，记录后尝试下一个
+                outcome = "timeout" if isinstance(exc, asyncio.TimeoutError) else "retryable"
                 logger.warning(
                     "Provider=%s failed for chain=%s, will try next if any: %s",
                     provider_name,
@@ -100,6 +121,10 @@ class LLMClient:
                 )
                 last_error = exc
                 continue
+            finally:
+                LLM_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, chain, provider_name, outcome
+                )
 
         # 所有 provider 都失败
         raise FallbackExhaustedError(
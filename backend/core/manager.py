@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from dataclasses import dataclass
-from typing import Any, Awaitable, Callable, Dict, Optional, Type
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
 
+from backend.core.checkpoints import StageCheckpoints
 from backend.core.llm_client import LLMClient
-from backend.services.feishu import FeishuClient
+from backend.services.feishu import FeishuAPIError, FeishuClient
 from backend.services.outputs.base import OutputResult, SourceDoc
 from backend.services.processors.base import BaseDocProcessor, ProcessorResult
+from backend.services.triggers.pool import PoolSpec
 from backend.services.outputs.base import BaseOutputHandler
 
 logger = logging.getLogger(__name__)
@@ -36,6 +39,30 @@ class WorkflowConfig:
     chain: str
     output_factory: Callable[[FeishuClient, LLMClient], BaseOutputHandler]
     notify_user: bool = True
+    # 执行分池（长耗时与短耗时的 workflow 分开排队）
+    pool: str = "default"
+
+
+@dataclass
+class FetchedSource:
+    """
+    已读取的原文档（元信息 + 正文），多模式并发处理时共享同一份，避免重复拉取。
+    """
+
+    source_doc: SourceDoc
+    content: str
+
+
+@dataclass
+class BulkItem:
+    """
+    批量处理枚举出的单篇文档。
+    """
+
+    doc_token: str
+    title: str
+    wiki_node_token: str | None = None
+    wiki_space_id: str | None = None
 
 
 @dataclass
@@ -48,11 +75,17 @@ class ProcessResult:
 
 class WorkflowRegistry:
     """
-    维护 mode -> WorkflowConfig 的映射，便于扩展。
+    维护 mode -> WorkflowConfig 的映射，便于扩展；同时携带执行分池配置。
     """
 
-    def __init__(self, mapping: Dict[str, WorkflowConfig]) -> None:
+    def __init__(
+        self,
+        mapping: Dict[str, WorkflowConfig],
+        *,
+        pools: Optional[Dict[str, PoolSpec]] = None,
+    ) -> None:
         self._mapping = mapping
+        self.pools: Dict[str, PoolSpec] = pools or {}
 
     def get(self, mode: str) -> WorkflowConfig:
         try:
@@ -68,6 +101,10 @@ class WorkflowRegistry:
         """返回所有可用的 mode 列表。"""
         return list(self._mapping.keys())
 
+    def mode_pools(self) -> Dict[str, str]:
+        """返回 mode -> 执行分池名。"""
+        return {mode: workflow.pool for mode, workflow in self._mapping.items()}
+
 
 class ProcessManager:
     """
@@ -84,20 +121,34 @@ class ProcessManager:
         self._feishu = feishu_client
         self._llm_client = llm_client
         self._registry = workflow_registry
+        # 输出策略按 mode 构造一次后复用（Webhook 等策略持有连接池），停机时由 close 统一释放
+        self._output_handlers: Dict[str, BaseOutputHandler] = {}
 
-    async def process_doc(
-        self, ctx: ProcessContext, *, progress: ProgressFn | None = None
-    ) -> ProcessResult:
-        async def _noop(stage: str, percent: int, message: str) -> None:
-            _ = stage
-            _ = percent
-            _ = message
+    def _output_handler(self, mode: str, workflow: WorkflowConfig) -> BaseOutputHandler:
+        handler = self._output_handlers.get(mode)
+        if handler is None:
+            handler = self._output_handlers[mode] = workflow.output_factory(
+                self._feishu, self._llm_client
+            )
+        return handler
 
-        report = progress or _noop
+    async def close(self) -> None:
+        """
+        释放已构造的输出策略持有的资源（飞书 / LLM 客户端由创建方负责关闭）。
+        """
+        handlers, self._output_handlers = list(self._output_handlers.values()), {}
+        await asyncio.gather(*(handler.close() for handler in handlers))
+
+    async def fetch_source(
+        self, ctx: ProcessContext, *, progress: ProgressFn | None = None
+    ) -> FetchedSource:
+        """
+        读取原文档元信息与正文（多模式 fan-out 时只调用一次）。
+        """
+        report = progress or _noop_progress
 
-        workflow = self._registry.get(ctx.mode)
         await report("fetch_meta", 5, "获取文档元信息")
-        
+
         # 区分 Wiki 和云盘场景，使用不同的 API 获取元数据
         if ctx.wiki_node_token:
             # Wiki 场景：使用 docx API（元数据较简单）
@@ -113,28 +164,140 @@ class ProcessManager:
 
         await report("fetch_content", 15, "读取文档内容")
         doc_content = await self._feishu.get_doc_content(ctx.doc_token)
-        
+
+        return FetchedSource(
+            source_doc=SourceDoc(
+                doc_token=ctx.doc_token, title=doc_title, parent_token=parent_token
+            ),
+            content=doc_content,
+        )
+
+    async def list_bulk_docs(
+        self,
+        token: str,
+        *,
+        source_type: str = "auto",
+        recursive: bool = True,
+        limit: int | None = None,
+    ) -> List[BulkItem]:
+        """
+        枚举云盘文件夹或知识库子树下的 docx 文档。
+
+        source_type:
+        - "wiki": token 为知识库节点，包含节点自身及其子孙节点
+        - "folder": token 为云盘文件夹
+        - "auto": 先按知识库节点解析，失败则按文件夹处理
+        """
+        if source_type not in {"auto", "wiki", "folder"}:
+            raise ValueError(f"Unsupported bulk source_type: {source_type}")
+        if source_type in {"auto", "wiki"}:
+            try:
+                nodes = await self._feishu.wiki.walk_subtree(
+                    node_token=token, recursive=recursive, limit=limit
+                )
+            except FeishuAPIError:
+                if source_type == "wiki":
+                    raise
+            else:
+                return [
+                    BulkItem(
+                        doc_token=str(node["obj_token"]),
+                        title=node.get("title") or "未命名文档",
+                        wiki_node_token=node.get("node_token"),
+                        wiki_space_id=node.get("space_id"),
+                    )
+                    for node in nodes
+                ]
+        files = await self._feishu.drive.walk_docs(token, recursive=recursive, limit=limit)
+        return [
+            BulkItem(doc_token=str(item["token"]), title=item.get("name") or "未命名文档")
+            for item in files
+        ]
+
+    async def get_doc_revision(self, doc_token: str) -> Optional[str]:
+        """
+        读取文档的 revision_id（触发去重用）；文档不可读时返回 None。
+
+        跳过元数据缓存：缓存中的 revision 可能滞后，文档编辑后重新触发会被误判为重复；结果仍会刷新缓存。
+        """
+        try:
+            meta = await self._feishu.doc.get_meta(doc_token, use_cache=False)
+        except FeishuAPIError as exc:
+            logger.info("Unable to read revision for doc=%s: %s", doc_token, exc)
+            return None
+        revision = meta.get("revision_id")
+        return str(revision) if revision is not None else None
+
+    async def process_doc(
+        self,
+        ctx: ProcessContext,
+        *,
+        progress: ProgressFn | None = None,
+        source: FetchedSource | None = None,
+        checkpoints: StageCheckpoints | None = None,
+    ) -> ProcessResult:
+        """
+        执行单个 mode 的完整流程。
+
+        - source：已读取的原文档；传入时跳过读取阶段（多模式共享同一次读取与同一个输出容器）
+        - checkpoints：阶段断点；已完成的阶段（读取 / 模型生成 / 输出子阶段）直接复用，不再重复执行
+        """
+        report = progress or _noop_progress
+        cps = checkpoints or StageCheckpoints()
+
+        workflow = self._registry.get(ctx.mode)
+        if source is None:
+            saved_source = cps.get("source")
+            if saved_source:
+                await report("fetch_meta", 15, "复用已读取的文档内容")
+                source = FetchedSource(
+                    source_doc=SourceDoc(
+                        doc_token=ctx.doc_token,
+                        title=saved_source["title"],
+                        parent_token=saved_source.get("parent_token"),
+                    ),
+                    content=saved_source["content"],
+                )
+            else:
+                source = await self.fetch_source(ctx, progress=report)
+                await cps.save(
+                    "source",
+                    {
+                        "title": source.source_doc.title,
+                        "parent_token": source.source_doc.parent_token,
+                        "content": source.content,
+                    },
+                )
+
+        doc_title = source.source_doc.title
+        doc_content = source.content
+
         # 保存原始内容到上下文（用于后续追加元数据）
         ctx.original_content = doc_content
-        
-        processor = workflow.processor_cls(self._llm_client)
-        await report("llm", 35, "调用模型生成内容")
-        processor_result = await processor.run(
-            doc_content=doc_content,
-            doc_title=doc_title,
-            chain=workflow.chain,
-            context={"trigger_source": ctx.trigger_source, "report_progress": report},
-        )
+
+        saved_result = cps.get("processor")
+        if saved_result:
+            await report("llm", 75, "复用已生成的内容")
+            processor_result = ProcessorResult(**saved_result)
+        else:
+            processor = workflow.processor_cls(self._llm_client)
+            await report("llm", 35, "调用模型生成内容")
+            processor_result = await processor.run(
+                doc_content=doc_content,
+                doc_title=doc_title,
+                chain=workflow.chain,
+                context={"trigger_source": ctx.trigger_source, "report_progress": report},
+            )
+            await cps.save("processor", asdict(processor_result))
 
         await report("output", 80, "输出落地（写入/推送）")
-        output_handler = workflow.output_factory(self._feishu, self._llm_client)
+        output_handler = self._output_handler(ctx.mode, workflow)
         output_result = await output_handler.handle(
             ctx=ctx,
-            source_doc=SourceDoc(
-                doc_token=ctx.doc_token, title=doc_title, parent_token=parent_token
-            ),
+            source_doc=source.source_doc,
             processor_result=processor_result,
             notify_user=workflow.notify_user,
+            checkpoints=cps,
         )
 
         await report("done", 100, "处理完成")
@@ -144,3 +307,17 @@ class ProcessManager:
             processor_result=processor_result,
             output_result=output_result,
         )
+
+    async def cleanup_outputs(self, ctx: ProcessContext, checkpoints: StageCheckpoints) -> None:
+        """
+        任务被取消时，由对应 mode 的输出策略撤销已创建的外部资源（如子文档）。
+        """
+        workflow = self._registry.get(ctx.mode)
+        output_handler = self._output_handler(ctx.mode, workflow)
+        await output_handler.cleanup(ctx=ctx, checkpoints=checkpoints)
+
+
+async def _noop_progress(stage: str, percent: int, message: str) -> None:
+    _ = stage
+    _ = percent
+    _ = message
@@ -0,0 +1,289 @@
+"""
+进程内指标（Prometheus 文本格式，由 GET /metrics 输出）
+
+记录路径只有一次字典查找、一次二分查找与几次数值加法：所有记录都发生在同一个事件循环线程里，
+不需要加锁；格式化、累计桶计数与读取存储规模等开销都放在抓取时。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# 覆盖毫秒级路由到分钟级模型调用
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CollectFn = Callable[[], Awaitable[None]]
+
+Labels = tuple[str, ...]
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type_name}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def _label_str(self, labels: Labels, extra: str = "") -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+
+_M = TypeVar("_M", bound=_Metric)
+_LE_INF = 'le="+Inf"'
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, value: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def _samples(self) -> Iterator[str]:
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{self._label_str(labels)} {_fmt(value)}"
+
+
+class Gauge(_Metric):
+    """抓取时由采集回调整体刷新的瞬时值。"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def replace(self, values: Dict[Labels, float]) -> None:
+        """整体替换所有序列（消失的标签组合不再输出）。"""
+        self._values = dict(values)
+
+    def _samples(self) -> Iterator[str]:
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{self._label_str(labels)} {_fmt(value)}"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self._buckets = tuple(sorted(buckets))
+        # 每个序列：各桶的非累计计数（末尾为 +Inf 桶），输出时再累计
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self._buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self._buckets, value)] += 1
+        self._sums[labels] += value
+
+    def _samples(self) -> Iterator[str]:
+        for labels, counts in list(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self._buckets, counts):
+                cumulative += count
+                le = self._label_str(labels, f'le="{_fmt(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            cumulative += counts[-1]
+            yield f"{self.name}_bucket{self._label_str(labels, _LE_INF)} {cumulative}"
+            yield f"{self.name}_sum{self._label_str(labels)} {_fmt(self._sums[labels])}"
+            yield f"{self.name}_count{self._label_str(labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    """
+    指标注册表：记录方直接持有指标对象；抓取时先运行采集回调（刷新存储规模等 Gauge），再按注册顺序输出。
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[CollectFn] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets=buckets))
+
+    def add_collector(self, collect: CollectFn) -> None:
+        self._collectors.append(collect)
+
+    def remove_collector(self, collect: CollectFn) -> None:
+        if collect in self._collectors:
+            self._collectors.remove(collect)
+
+    async def render(self) -> str:
+        for collect in self._collectors:
+            try:
+                await collect()
+            except Exception:  # noqa: BLE001
+                # 采集失败（如 Redis 不可用）不影响其他指标输出
+                logger.exception("Metrics collector failed")
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _M) -> _M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class EventLoopLagMonitor:
+    """
+    事件循环延迟：每 interval_s 休眠一次，实际唤醒时间超出 interval_s 的部分即为循环被阻塞的时长。
+    """
+
+    def __init__(self, histogram: Histogram, *, interval_s: float) -> None:
+        self._histogram = histogram
+        self._interval_s = interval_s
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        if self._task is None and self._interval_s > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self._interval_s)
+            self._histogram.observe(max(0.0, loop.time() - started - self._interval_s))
+
+
+# 未匹配任何路由模板的请求统一使用的标签值
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RouteTemplates:
+    """
+    把请求路径归并为已登记的路由模板（与入站请求取 FastAPI 匹配到的路由一样）：
+    /docx/v1/documents/Abc123/blocks -> /docx/v1/documents/{document_id}/blocks。
+
+    只输出登记过的模板，其余路径一律归为 UNMATCHED_ROUTE，标签基数不随文档 / token 数增长。
+    同一路径可匹配多个模板时优先不含占位符的（如 files/create_folder 先于 files/{file_token}）。
+    """
+
+    def __init__(self, templates: Sequence[str]) -> None:
+        ordered = sorted(templates, key=lambda template: template.count("{"))
+        self._routes = [(_compile_template(template), template) for template in ordered]
+
+    def match(self, path: str) -> str:
+        path = path.split("?", 1)[0]
+        for pattern, template in self._routes:
+            if pattern.match(path):
+                return template
+        return UNMATCHED_ROUTE
+
+
+def _compile_template(template: str) -> re.Pattern[str]:
+    return re.compile(
+        "/".join(
+            "[^/]+" if segment.startswith("{") and segment.endswith("}") else re.escape(segment)
+            for segment in template.split("/")
+        )
+        + "$"
+    )
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """最近秩法分位数（输入需已排序且非空）。"""
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template, measured to response headers",
+    ("method", "route", "status"),
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds",
+    "LLM provider call latency by chain, provider and outcome",
+    ("chain", "provider", "outcome"),
+)
+FEISHU_REQUEST_SECONDS = REGISTRY.histogram(
+    "feishu_request_duration_seconds",
+    "Feishu API call latency by method and path template",
+    ("method", "path"),
+)
+FEISHU_ERRORS = REGISTRY.counter(
+    "feishu_errors_total",
+    "Feishu API errors by path template, HTTP status and Feishu error code",
+    ("path", "status", "code"),
+)
+WORKER_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "worker_pool_queue_wait_seconds",
+    "Time tasks wait in the in-process worker pool queue before starting, by pool",
+    ("pool",),
+)
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds",
+    "Event loop scheduling delay beyond the sampling interval",
+    buckets=LAG_BUCKETS,
+)
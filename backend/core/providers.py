@@ -41,6 +41,10 @@ class LLMProvider(ABC):
         self._client = httpx.AsyncClient(base_url=config.base_url, timeout=None)
         self._api_key = api_key
 
+    async def close(self) -> None:
+        """关闭底层连接池。"""
+        await self._client.aclose()
+
     @abstractmethod
     async def chat(self, messages: List[Dict[str, Any]], **kwargs: Any) -> str:
         """
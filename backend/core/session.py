@@ -0,0 +1,85 @@
+"""
+插件会话令牌：/api/addon/auth 换取 open_id 后签发，之后在本地校验，不再调用飞书接口
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from backend.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSigner:
+    """
+    HMAC-SHA256 签名的短期会话令牌：<base64url(payload)>.<base64url(signature)>。
+
+    - payload 为 {"sub": open_id, "exp": 过期时间戳}；多进程 / 多节点共享同一 secret 即可互相校验
+    - verify / decode 对签名不符、格式错误或已过期的令牌抛出 ValueError
+    """
+
+    def __init__(self, *, secret: str, ttl_s: float) -> None:
+        if not secret:
+            raise ValueError("SessionSigner requires a non-empty secret")
+        self._key = secret.encode()
+        self.ttl_s = ttl_s
+
+    def issue(self, open_id: str, *, now: float | None = None) -> tuple[str, float]:
+        """签发令牌，返回 (令牌, 过期时间戳)。"""
+        expires_at = int((now if now is not None else time.time()) + self.ttl_s)
+        payload = _b64encode(
+            json.dumps({"sub": open_id, "exp": expires_at}, separators=(",", ":")).encode()
+        )
+        return f"{payload}.{self._sign(payload)}", float(expires_at)
+
+    def verify(self, token: str, *, now: float | None = None) -> str:
+        """校验令牌并返回 open_id。"""
+        return self.decode(token, now=now)[0]
+
+    def decode(self, token: str, *, now: float | None = None) -> tuple[str, float]:
+        """校验令牌并返回 (open_id, 过期时间戳)。"""
+        payload, sep, signature = token.partition(".")
+        if not sep or not hmac.compare_digest(signature.encode(), self._sign(payload).encode()):
+            raise ValueError("Invalid session token")
+        try:
+            claims = json.loads(_b64decode(payload))
+            open_id, expires_at = str(claims["sub"]), float(claims["exp"])
+        except (ValueError, KeyError, TypeError) as exc:
+            raise ValueError("Invalid session token") from exc
+        if expires_at <= (now if now is not None else time.time()):
+            raise ValueError("Session token expired")
+        return open_id, expires_at
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(hmac.new(self._key, payload.encode(), hashlib.sha256).digest())
+
+
+def build_session_signer(settings: "Settings") -> SessionSigner:
+    """
+    未配置 SESSION_SECRET 时生成进程内随机 secret 并告警：会话只在本进程内有效，重启后失效，
+    多进程 / 多节点部署时各实例互不认可，生产环境必须配置。
+    """
+    secret = settings.SESSION_SECRET
+    if not secret:
+        logger.warning(
+            "SESSION_SECRET is not configured; using a random per-process secret "
+            "(sessions are lost on restart and not shared between processes)"
+        )
+        secret = secrets.token_hex(32)
+    return SessionSigner(secret=secret, ttl_s=settings.SESSION_TTL_S)
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
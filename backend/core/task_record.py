@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+# 体积较大的上下文字段：不放在任务记录内，由 TaskStore 单独保存，只在重试 / 持久化时取回
+LARGE_CONTEXT_FIELDS = ("selected_text", "original_content")
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # 状态、阶段、mode 等取值集合很小，驻留后所有任务共享同一个字符串对象
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def split_context(context: Mapping[str, Any]) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """把上下文拆成 (常驻部分, 大字段)；大字段中的空值直接丢弃。"""
+    compact: Dict[str, Any] = {}
+    large: Dict[str, Any] = {}
+    for key, value in context.items():
+        if key in LARGE_CONTEXT_FIELDS:
+            if value:
+                large[key] = value
+        elif value is not None:
+            compact[_intern(key)] = _intern(value) if key in ("mode", "trigger_source") else value
+    return compact, large
+
+
+@dataclass(slots=True)
+class TaskRecord(Mapping[str, Any]):
+    """
+    单个任务的记录（__slots__，无实例 dict）。
+
+    - 进度拆成 stage / percent / message 平铺字段，状态与阶段字符串做驻留
+    - 同时实现只读 Mapping 接口（task["status"]、task.get("progress")、dict(task)），
+      与持久化的 JSON 结构保持一致；值为 None 的字段视为不存在
+    - 记录发布后不再修改，变更通过 evolve 生成新版本；未使用 frozen=True，
+      因为冻结 dataclass 的构造要逐字段 object.__setattr__，写入开销约为 3 倍
+    - checkpoints 只记录已保存断点的阶段名；断点数据（原文、模型产物等）与大字段一样由 TaskStore 单独存放，
+      进度更新与状态查询不随之编码 / 解码
+    """
+
+    status: str
+    created_at: float
+    context: Mapping[str, Any]
+    version: int = 1
+    stage: str = "accepted"
+    percent: Optional[int] = 0
+    message: Optional[str] = "任务已创建"
+    progress_extra: Optional[Mapping[str, Any]] = None
+    updated_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    parent_task_id: Optional[str] = None
+    child_task_ids: Optional[tuple[str, ...]] = None
+    attempts: Optional[int] = None
+    checkpoints: Optional[tuple[str, ...]] = None
+    timeline: Optional[list[Dict[str, Any]]] = None
+
+    @property
+    def progress(self) -> Dict[str, Any]:
+        progress: Dict[str, Any] = {"stage": self.stage}
+        if self.percent is not None:
+            progress["percent"] = self.percent
+        if self.message is not None:
+            progress["message"] = self.message
+        if self.progress_extra:
+            progress.update(self.progress_extra)
+        return progress
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "TaskRecord":
+        """从 dict 结构（新建任务 / 持久化数据）构造记录；context 需事先去掉大字段。"""
+        kwargs = {k: v for k, v in data.items() if k in _FIELD_NAMES and k != "progress"}
+        kwargs.update(_progress_fields(data.get("progress") or {}))
+        for key in ("child_task_ids", "checkpoints"):
+            # checkpoints 在旧数据中是 阶段 -> 数据 的 dict，这里只保留阶段名（数据由存储迁移到单独位置）
+            if kwargs.get(key) is not None:
+                kwargs[key] = tuple(kwargs[key])
+        kwargs["status"] = _intern(kwargs["status"])
+        return cls(**kwargs)
+
+    def evolve(self, changes: Mapping[str, Any]) -> "TaskRecord":
+        """按 dict 形式的变更生成下一个版本（progress 为整体覆盖）。"""
+        if "progress" in changes:
+            changes = {**changes, **_progress_fields(changes["progress"])}
+        get = changes.get
+        status = get("status", self.status)
+        child_task_ids = get("child_task_ids", self.child_task_ids)
+        # 按字段顺序显式传参：进度更新是最高频的写入，避免 dataclasses.replace 的逐字段反射
+        return TaskRecord(
+            _intern(status),
+            get("created_at", self.created_at),
+            get("context", self.context),
+            self.version + 1,
+            get("stage", self.stage),
+            get("percent", self.percent),
+            get("message", self.message),
+            get("progress_extra", self.progress_extra),
+            get("updated_at", self.updated_at),
+            get("result", self.result),
+            get("error", self.error),
+            get("parent_task_id", self.parent_task_id),
+            tuple(child_task_ids) if child_task_ids is not None else None,
+            get("attempts", self.attempts),
+            get("checkpoints", self.checkpoints),
+            get("timeline", self.timeline),
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "progress":
+            return self.progress
+        if key not in _MAPPING_KEYS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        for key in _MAPPING_KEYS:
+            if key == "progress" or getattr(self, key) is not None:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+def with_checkpoint_stage(stages: Optional[tuple[str, ...]], stage: str) -> tuple[str, ...]:
+    """追加阶段名（已存在时原样返回）。"""
+    stages = stages or ()
+    return stages if stage in stages else (*stages, stage)
+
+
+def _progress_fields(progress: Mapping[str, Any]) -> Dict[str, Any]:
+    extra = None
+    if not progress.keys() <= _PROGRESS_KEYS:
+        extra = {k: v for k, v in progress.items() if k not in _PROGRESS_KEYS}
+    return {
+        "stage": _intern(progress.get("stage", "accepted")),
+        "percent": progress.get("percent"),
+        "message": progress.get("message"),
+        "progress_extra": extra,
+    }
+
+
+_PROGRESS_KEYS = frozenset({"stage", "percent", "message"})
+_PROGRESS_FIELDS = ("stage", "percent", "message", "progress_extra")
+_FIELD_NAMES = frozenset(f.name for f in fields(TaskRecord))
+# Mapping 视图中的键：进度相关字段合并为 progress
+_MAPPING_KEYS = ("progress", *(f.name for f in fields(TaskRecord) if f.name not in _PROGRESS_FIELDS))
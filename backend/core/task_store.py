@@ -1,49 +1,115 @@
 from __future__ import annotations
 
 import asyncio
+import itertools
+import logging
+import sys
 import time
 import uuid
-from typing import Any, Dict, Literal, Optional
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, fields, is_dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Literal, Optional
 
-TaskStatus = Literal["running", "succeeded", "failed"]
+from backend.core.task_record import TaskRecord, split_context, with_checkpoint_stage
 
+if TYPE_CHECKING:
+    from backend.config import Settings
 
-class TaskStore:
+logger = logging.getLogger(__name__)
+
+TaskStatus = Literal["running", "succeeded", "failed", "cancelled"]
+
+# 对外返回的任务快照：不可变记录，发布后不再原地修改，读取方无需加锁或复制
+TaskSnapshot = TaskRecord
+
+# 幂等命中时判断是否复用已有任务（如只复用运行中或刚成功的任务）
+ReuseFn = Callable[[TaskSnapshot], bool]
+
+
+@dataclass(frozen=True)
+class TaskCreate:
+    """批量创建中的一项，字段含义同 get_or_create_task 的参数。"""
+
+    context: Dict[str, Any]
+    idempotency_key: str | None = None
+    parent_task_id: str | None = None
+    reuse: ReuseFn | None = None
+
+
+# 终态任务才参与淘汰，运行中的任务永远保留
+_FINISHED_STATUSES = frozenset({"succeeded", "failed", "cancelled"})
+
+# 二级索引条目：(created_at, 插入序号, task_id)，按创建时间升序；序号保证同一时刻创建的任务有稳定顺序
+_IndexEntry = tuple[float, int, str]
+
+
+class BaseTaskStore(ABC):
     """
-    简易内存版任务存储，便于查询处理状态。
-    后续可替换为 Redis / DB。
+    任务存储抽象：所有后端（内存 / SQLite / Redis）对外提供相同的异步接口。
     """
 
-    def __init__(self) -> None:
-        self._lock = asyncio.Lock()
-        self._tasks: Dict[str, Dict[str, Any]] = {}
-        # 幂等键 -> task_id，用于事件回调/重试去重
-        self._idempotency: Dict[str, str] = {}
+    # 任务是否跨进程保留：为 False 时停机移交的任务随进程退出丢失，无法由下一个进程恢复
+    durable = False
+
+    async def start(self) -> None:
+        """启动后台资源（如批量落盘协程）；默认无操作。"""
+
+    async def close(self) -> None:
+        """释放资源并确保未落盘的数据写出；默认无操作。"""
 
     async def create_task(
-        self, *, context: Dict[str, Any], idempotency_key: str | None = None
+        self,
+        *,
+        context: Dict[str, Any],
+        idempotency_key: str | None = None,
+        parent_task_id: str | None = None,
     ) -> str:
-        async with self._lock:
-            if idempotency_key:
-                existing = self._idempotency.get(idempotency_key)
-                if existing and existing in self._tasks:
-                    return existing
-
-            task_id = uuid.uuid4().hex
-            self._tasks[task_id] = {
-                "status": "running",
-                "created_at": time.time(),
-                "context": context,
-                "progress": {
-                    "stage": "accepted",
-                    "percent": 0,
-                    "message": "任务已创建",
-                },
-            }
-            if idempotency_key:
-                self._idempotency[idempotency_key] = task_id
+        """
+        创建任务并返回 task_id；幂等键已指向未过期的任务时直接返回该任务。
+
+        - parent_task_id：多模式 fan-out 时的父任务；子任务 id 会追加到父任务的 child_task_ids
+        """
+        task_id, _ = await self.get_or_create_task(
+            context=context, idempotency_key=idempotency_key, parent_task_id=parent_task_id
+        )
         return task_id
 
+    @abstractmethod
+    async def get_or_create_task(
+        self,
+        *,
+        context: Dict[str, Any],
+        idempotency_key: str | None = None,
+        parent_task_id: str | None = None,
+        reuse: ReuseFn | None = None,
+    ) -> tuple[str, bool]:
+        """
+        返回 (task_id, 是否新建)。
+
+        幂等键已指向未过期的任务、且 reuse 判定可复用（未提供 reuse 时总是复用）时返回该任务；
+        否则创建新任务，并把幂等键改为指向新任务。
+        """
+
+    async def get_or_create_tasks(self, items: list[TaskCreate]) -> list[tuple[str, bool]]:
+        """
+        批量版 get_or_create_task：按顺序返回每项的 (task_id, 是否新建)。
+
+        后端应在一次写入中完成（内存版单次调度内完成，SQLite 一次事务落盘，Redis 一次 MULTI）；
+        默认实现逐项创建。同一批中幂等键相同的项返回同一个任务。
+        """
+        return [
+            await self.get_or_create_task(
+                context=item.context,
+                idempotency_key=item.idempotency_key,
+                parent_task_id=item.parent_task_id,
+                reuse=item.reuse,
+            )
+            for item in items
+        ]
+
+    @abstractmethod
     async def update_progress(
         self,
         task_id: str,
@@ -51,40 +117,352 @@ class TaskStore:
         stage: str,
         percent: int | None = None,
         message: str | None = None,
-    ) -> None:
-        payload: Dict[str, Any] = {"progress": {"stage": stage}}
+        extra: Dict[str, Any] | None = None,
+        timeline: list[Dict[str, Any]] | None = None,
+    ) -> None: ...
+
+    @abstractmethod
+    async def succeed(
+        self,
+        task_id: str,
+        result: Dict[str, Any],
+        *,
+        timeline: list[Dict[str, Any]] | None = None,
+    ) -> None: ...
+
+    @abstractmethod
+    async def fail(
+        self,
+        task_id: str,
+        error: str,
+        *,
+        timeline: list[Dict[str, Any]] | None = None,
+    ) -> None: ...
+
+    @abstractmethod
+    async def cancel(self, task_id: str, reason: str) -> bool:
+        """
+        将运行中的任务标记为 cancelled（终态，之后的进度 / 结果写入均被忽略）；
+        任务不存在或已结束时返回 False。
+        """
+
+    @abstractmethod
+    async def save_checkpoint(
+        self, task_id: str, stage: str, data: Dict[str, Any]
+    ) -> None: ...
+
+    @abstractmethod
+    async def get_checkpoints(self, task_id: str) -> Dict[str, Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def restart(self, task_id: str) -> bool: ...
+
+    @abstractmethod
+    async def get_context(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """返回任务的完整上下文（包含单独存放的 selected_text 等大字段），用于重试时还原。"""
+
+    @abstractmethod
+    async def get(self, task_id: str) -> Optional[TaskSnapshot]: ...
+
+    @abstractmethod
+    async def wait_for_change(
+        self, task_id: str, since_version: int, timeout: float
+    ) -> Optional[TaskSnapshot]:
+        """
+        等待任务版本超过 since_version（任务变更的进程内订阅）。
+
+        已经更新则立即返回；超时返回当前记录（版本可能未变）；任务不存在或被淘汰返回 None。
+        """
+
+    @abstractmethod
+    async def list_task_ids(
+        self,
+        *,
+        doc_token: str | None = None,
+        user_id: str | None = None,
+    ) -> list[str]: ...
+
+    @abstractmethod
+    async def list_tasks(
+        self,
+        *,
+        doc_token: str | None = None,
+        user_id: str | None = None,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[tuple[str, TaskSnapshot]], str | None]:
+        """按创建时间倒序分页返回 (task_id, task) 列表与下一页 cursor（无更多时为 None）。"""
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        """存储规模统计（任务数、幂等键数、淘汰计数、单任务内存估算等）。"""
+
+    async def hand_off(self, task_ids: list[str], reason: str) -> None:
+        """
+        进程退出前移交未完成的任务：仍在运行的标记为 failed（断点保留），并登记到移交列表，
+        由下一个进程 take_handoff 取回后从断点恢复。默认只做标记（内存存储随进程退出丢失，无需登记）。
+        """
+        for task_id in task_ids:
+            task = await self.get(task_id)
+            if task and task.status == "running":
+                await self.fail(task_id, reason)
+
+    async def take_handoff(self) -> list[str]:
+        """取出并清空移交列表；默认为空。"""
+        return []
+
+    @staticmethod
+    def _progress_changes(
+        stage: str,
+        percent: int | None,
+        message: str | None,
+        extra: Dict[str, Any] | None,
+        timeline: list[Dict[str, Any]] | None,
+    ) -> Dict[str, Any]:
+        changes: Dict[str, Any] = {"progress": {"stage": stage}}
         if percent is not None:
-            payload["progress"]["percent"] = int(percent)
+            changes["progress"]["percent"] = int(percent)
         if message is not None:
-            payload["progress"]["message"] = message
-        await self._update(task_id, payload)
+            changes["progress"]["message"] = message
+        if extra:
+            changes["progress"].update(extra)
+        if timeline is not None:
+            changes["timeline"] = timeline
+        return changes
 
-    async def succeed(self, task_id: str, result: Dict[str, Any]) -> None:
-        await self._update(
-            task_id,
-            {
-                "status": "succeeded",
-                "result": result,
-                "updated_at": time.time(),
+    @staticmethod
+    def _finish_changes(
+        status: TaskStatus, field: str, value: Any, timeline: list[Dict[str, Any]] | None
+    ) -> Dict[str, Any]:
+        changes: Dict[str, Any] = {"status": status, field: value, "updated_at": time.time()}
+        if timeline is not None:
+            changes["timeline"] = timeline
+        return changes
+
+    @staticmethod
+    def _restart_changes(task: TaskRecord) -> Dict[str, Any]:
+        return {
+            "status": "running",
+            "error": None,
+            "attempts": (task.attempts or 1) + 1,
+            "updated_at": time.time(),
+            "progress": {
+                "stage": "retrying",
+                "percent": 0,
+                "message": "从断点恢复执行",
             },
+        }
+
+
+class TaskStore(BaseTaskStore):
+    """
+    简易内存版任务存储，便于查询处理状态。
+    持久化后端（如 SQLiteTaskStore）在此基础上通过 _on_change / _on_evict 钩子做批量落盘。
+
+    并发模型：
+    - 每个任务是一条带 version 的不可变 TaskRecord；写入时基于旧记录生成新记录并整体替换（copy-on-write），
+      读取直接返回只读快照，无需复制
+    - 所有读写都是不含 await 的同步代码段，在单线程事件循环内天然原子，因此不再使用全局锁；
+      历史查询与进度写入互不阻塞
+
+    保留策略（均为 None 时不淘汰）：
+    - retention_s：终态任务（succeeded / failed / cancelled）保留时长，按结束时间计
+    - max_records：任务总数上限，超出时淘汰最早结束的终态任务（运行中任务不淘汰）
+    - idempotency_ttl_s：幂等键有效期，按任务创建时间计
+    """
+
+    def __init__(
+        self,
+        *,
+        retention_s: float | None = None,
+        max_records: int | None = None,
+        idempotency_ttl_s: float | None = None,
+        sweep_interval_s: float = 60.0,
+    ) -> None:
+        self._tasks: Dict[str, TaskRecord] = {}
+        # 上下文中的大字段（selected_text 等）不进入常驻记录，按 task_id 单独存放
+        self._large_context: Dict[str, Dict[str, Any]] = {}
+        # 阶段断点数据（原文、模型产物等）同样单独存放：task_id -> 阶段 -> 数据，记录中只有阶段名
+        self._checkpoints: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # 幂等键 -> task_id，用于事件回调/重试去重；按插入（即任务创建）顺序排列，过期时从头部弹出
+        self._idempotency: OrderedDict[str, str] = OrderedDict()
+        self._retention_s = retention_s
+        self._max_records = max_records
+        self._idempotency_ttl_s = idempotency_ttl_s
+        self._sweep_interval_s = sweep_interval_s
+        self._sweeper: Optional[asyncio.Task[None]] = None
+        # 终态任务 task_id -> 结束时间，按结束顺序排列；淘汰只需从头部弹出，均摊 O(1)
+        self._finished: OrderedDict[str, float] = OrderedDict()
+        self._evicted_total = 0
+        # 变更订阅：task_id -> 等待下一次变更的 Future（一次性，触发后由等待方重新订阅）
+        self._watchers: Dict[str, set[asyncio.Future[None]]] = {}
+        # 二级索引：按创建时间有序，避免历史查询全表扫描 + 排序
+        self._seq = itertools.count()
+        self._index_keys: Dict[str, tuple[float, int]] = {}
+        self._by_created: list[_IndexEntry] = []
+        self._by_doc: defaultdict[str, list[_IndexEntry]] = defaultdict(list)
+        self._by_user: defaultdict[str, list[_IndexEntry]] = defaultdict(list)
+
+    async def get_or_create_task(
+        self,
+        *,
+        context: Dict[str, Any],
+        idempotency_key: str | None = None,
+        parent_task_id: str | None = None,
+        reuse: ReuseFn | None = None,
+    ) -> tuple[str, bool]:
+        return self._get_or_create(
+            TaskCreate(
+                context=context,
+                idempotency_key=idempotency_key,
+                parent_task_id=parent_task_id,
+                reuse=reuse,
+            )
         )
 
-    async def fail(self, task_id: str, error: str) -> None:
+    async def get_or_create_tasks(self, items: list[TaskCreate]) -> list[tuple[str, bool]]:
+        # 全部在同一次调度内完成，中间不让出事件循环
+        return [self._get_or_create(item) for item in items]
+
+    def _get_or_create(self, item: TaskCreate) -> tuple[str, bool]:
+        idempotency_key = item.idempotency_key
+        if idempotency_key:
+            existing = self._idempotency.get(idempotency_key)
+            if (
+                existing
+                and existing in self._tasks
+                and not self._key_expired(existing, time.time())
+                and (item.reuse is None or item.reuse(self._tasks[existing]))
+            ):
+                return existing, False
+
+        task_id = uuid.uuid4().hex
+        compact, large = split_context(item.context)
+        parent_task_id = item.parent_task_id
+        parent = self._tasks.get(parent_task_id) if parent_task_id else None
+        record = TaskRecord(
+            status="running",
+            created_at=time.time(),
+            context=compact,
+            parent_task_id=parent_task_id if parent is not None else None,
+        )
+        self._tasks[task_id] = record
+        if large:
+            self._large_context[task_id] = large
+        if parent is not None:
+            self._replace(
+                parent_task_id, {"child_task_ids": [*(parent.child_task_ids or ()), task_id]}
+            )
+        if idempotency_key:
+            self._idempotency[idempotency_key] = task_id
+            self._idempotency.move_to_end(idempotency_key)
+        self._index(task_id, record)
+        if self._max_records is not None and len(self._tasks) > self._max_records:
+            self._evict_over_capacity()
+        self._on_change(task_id, idempotency_key=idempotency_key)
+        return task_id, True
+
+    async def update_progress(
+        self,
+        task_id: str,
+        *,
+        stage: str,
+        percent: int | None = None,
+        message: str | None = None,
+        extra: Dict[str, Any] | None = None,
+        timeline: list[Dict[str, Any]] | None = None,
+    ) -> None:
+        """
+        覆盖式更新进度。
+
+        - extra：附加到 progress 的额外字段（如父任务按 mode 汇总的子任务进度）
+        - timeline：阶段耗时时间线（追加式记录，由调用方整体覆盖写入）
+        """
         await self._update(
-            task_id,
-            {
-                "status": "failed",
-                "error": error,
-                "updated_at": time.time(),
-            },
+            task_id, self._progress_changes(stage, percent, message, extra, timeline)
         )
 
-    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
-        async with self._lock:
-            if task_id not in self._tasks:
-                return None
-            # 返回副本避免外部修改
-            return dict(self._tasks[task_id])
+    async def succeed(
+        self,
+        task_id: str,
+        result: Dict[str, Any],
+        *,
+        timeline: list[Dict[str, Any]] | None = None,
+    ) -> None:
+        await self._update(task_id, self._finish_changes("succeeded", "result", result, timeline))
+
+    async def fail(
+        self,
+        task_id: str,
+        error: str,
+        *,
+        timeline: list[Dict[str, Any]] | None = None,
+    ) -> None:
+        await self._update(task_id, self._finish_changes("failed", "error", error, timeline))
+
+    async def cancel(self, task_id: str, reason: str) -> bool:
+        task = self._tasks.get(task_id)
+        if task is None or task.status != "running":
+            return False
+        await self._update(task_id, self._finish_changes("cancelled", "error", reason, None))
+        return True
+
+    async def save_checkpoint(
+        self, task_id: str, stage: str, data: Dict[str, Any]
+    ) -> None:
+        """记录阶段断点（处理结果、标题、已创建的子文档 token 等），用于失败后恢复。"""
+        task = self._tasks.get(task_id)
+        if task is None:
+            return
+        self._checkpoints.setdefault(task_id, {})[stage] = data
+        self._on_checkpoint(task_id, stage)
+        self._replace(task_id, {"checkpoints": with_checkpoint_stage(task.checkpoints, stage)})
+
+    async def get_checkpoints(self, task_id: str) -> Dict[str, Dict[str, Any]]:
+        if task_id not in self._tasks:
+            return {}
+        return dict(self._checkpoints.get(task_id, {}))
+
+    async def get_context(self, task_id: str) -> Optional[Dict[str, Any]]:
+        task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        return self._full_context(task_id, task)
+
+    async def restart(self, task_id: str) -> bool:
+        """
+        将失败任务重置为 running（保留断点），attempts 加一；任务不存在或未失败时返回 False。
+        """
+        task = self._tasks.get(task_id)
+        if task is None or task.status != "failed":
+            return False
+        self._replace(task_id, self._restart_changes(task))
+        self._finished.pop(task_id, None)
+        return True
+
+    async def get(self, task_id: str) -> Optional[TaskSnapshot]:
+        # 记录不会被原地修改，直接返回只读快照
+        return self._tasks.get(task_id)
+
+    async def wait_for_change(
+        self, task_id: str, since_version: int, timeout: float
+    ) -> Optional[TaskSnapshot]:
+        task = self._tasks.get(task_id)
+        if task is None or task.version > since_version or timeout <= 0:
+            return task
+        waiter = asyncio.get_running_loop().create_future()
+        self._watchers.setdefault(task_id, set()).add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            watchers = self._watchers.get(task_id)
+            if watchers is not None:
+                watchers.discard(waiter)
+                if not watchers:
+                    del self._watchers[task_id]
+        return self._tasks.get(task_id)
 
     async def list_task_ids(
         self,
@@ -93,23 +471,309 @@ class TaskStore:
         user_id: str | None = None,
     ) -> list[str]:
         """按 doc_token / user_id 过滤任务，按创建时间倒序返回 task_id 列表。"""
-        async with self._lock:
-            items: list[tuple[str, float]] = []
-            for task_id, data in self._tasks.items():
-                ctx = data.get("context") or {}
-                if doc_token and ctx.get("doc_token") != doc_token:
-                    continue
-                if user_id and ctx.get("user_id") != user_id:
-                    continue
-                items.append((task_id, float(data.get("created_at", 0.0))))
-
-            # 按创建时间倒序排序
-            items.sort(key=lambda x: x[1], reverse=True)
-            return [task_id for task_id, _ in items]
+        return [
+            task_id
+            for _, _, task_id in reversed(self._pick_index(doc_token, user_id))
+            if self._matches(task_id, doc_token, user_id)
+        ]
+
+    async def list_tasks(
+        self,
+        *,
+        doc_token: str | None = None,
+        user_id: str | None = None,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[tuple[str, TaskSnapshot]], str | None]:
+        index = self._pick_index(doc_token, user_id)
+        end = len(index) if cursor is None else bisect_left(index, self._decode_cursor(cursor))
+
+        items: list[tuple[str, TaskSnapshot]] = []
+        pos = end - 1
+        while pos >= 0 and len(items) < limit:
+            task_id = index[pos][2]
+            pos -= 1
+            if self._matches(task_id, doc_token, user_id):
+                items.append((task_id, self._tasks[task_id]))
+
+        next_cursor = None
+        if items and pos >= 0:
+            last_id = items[-1][0]
+            next_cursor = f"{self._index_keys[last_id][0]!r}:{last_id}"
+        return items, next_cursor
+
+    def _index(self, task_id: str, task: TaskSnapshot) -> None:
+        """写入二级索引；创建时间基本单调递增，insort 实际退化为尾部追加。"""
+        key = (task.created_at, next(self._seq))
+        entry = (*key, task_id)
+        self._index_keys[task_id] = key
+        insort(self._by_created, entry)
+        ctx = task.context
+        if ctx.get("doc_token"):
+            insort(self._by_doc[ctx["doc_token"]], entry)
+        if ctx.get("user_id"):
+            insort(self._by_user[ctx["user_id"]], entry)
+
+    def _rebuild_indexes(self) -> None:
+        """按创建时间重建全部二级索引（从持久化存储加载后调用）。"""
+        self._index_keys.clear()
+        self._by_created.clear()
+        self._by_doc.clear()
+        self._by_user.clear()
+        ordered = sorted(self._tasks.items(), key=lambda kv: kv[1].created_at)
+        for task_id, task in ordered:
+            self._index(task_id, task)
+        self._finished.clear()
+        finished = sorted(
+            (kv for kv in self._tasks.items() if kv[1].status in _FINISHED_STATUSES),
+            key=lambda kv: kv[1].updated_at or kv[1].created_at,
+        )
+        for task_id, task in finished:
+            self._track_finished(task_id, task)
+
+    def _pick_index(self, doc_token: str | None, user_id: str | None) -> list[_IndexEntry]:
+        # 同时按 doc 与 user 过滤时，遍历较短的索引再做二次过滤
+        if doc_token and user_id:
+            by_doc = self._by_doc.get(doc_token, [])
+            by_user = self._by_user.get(user_id, [])
+            return by_doc if len(by_doc) <= len(by_user) else by_user
+        if doc_token:
+            return self._by_doc.get(doc_token, [])
+        if user_id:
+            return self._by_user.get(user_id, [])
+        return self._by_created
+
+    def _matches(self, task_id: str, doc_token: str | None, user_id: str | None) -> bool:
+        task = self._tasks.get(task_id)
+        if task is None:
+            return False
+        ctx = task.context
+        if doc_token and ctx.get("doc_token") != doc_token:
+            return False
+        if user_id and ctx.get("user_id") != user_id:
+            return False
+        return True
+
+    def _decode_cursor(self, cursor: str) -> tuple[float, int]:
+        """cursor 格式为 "<created_at>:<task_id>"，定位到该任务在索引中的位置（返回其之前的更早任务）。"""
+        created_at, sep, task_id = cursor.partition(":")
+        try:
+            created = float(created_at)
+        except ValueError as exc:
+            raise ValueError(f"Invalid cursor: {cursor}") from exc
+        if not sep:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        # 任务已不存在时退化为按时间定位
+        return self._index_keys.get(task_id, (created, -1))
+
+    async def stats(self) -> Dict[str, Any]:
+        running = len(self._tasks) - len(self._finished)
+        sample = list(itertools.islice(reversed(self._tasks.values()), 200))
+        bytes_per_task = sum(_deep_sizeof(task) for task in sample) // len(sample) if sample else 0
+        return {
+            "tasks": len(self._tasks),
+            "running": running,
+            "finished": len(self._finished),
+            "idempotency_keys": len(self._idempotency),
+            "evicted_total": self._evicted_total,
+            "approx_bytes_per_task": bytes_per_task,
+            "approx_bytes_total": bytes_per_task * len(self._tasks),
+            "retention_s": self._retention_s,
+            "max_records": self._max_records,
+            "idempotency_ttl_s": self._idempotency_ttl_s,
+        }
+
+    async def start(self) -> None:
+        if self._sweeper is None and (
+            self._retention_s is not None
+            or self._max_records is not None
+            or self._idempotency_ttl_s is not None
+        ):
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def close(self) -> None:
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    async def sweep(self, now: float | None = None) -> int:
+        """淘汰过期的终态任务与幂等键，返回本次淘汰的任务数。"""
+        return self._sweep_now(time.time() if now is None else now)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._sweep_interval_s)
+            try:
+                evicted = await self.sweep()
+                if evicted:
+                    logger.info("TaskStore evicted %d finished tasks", evicted)
+            except Exception:  # noqa: BLE001
+                logger.exception("TaskStore sweep failed")
+
+    def _sweep_now(self, now: float) -> int:
+        evicted: list[str] = []
+        if self._retention_s is not None:
+            deadline = now - self._retention_s
+            while self._finished:
+                task_id, finished_at = next(iter(self._finished.items()))
+                if finished_at > deadline:
+                    break
+                self._finished.popitem(last=False)
+                self._evict(task_id)
+                evicted.append(task_id)
+        if self._max_records is not None:
+            evicted.extend(self._evict_over_capacity(notify=False))
+
+        expired_keys: list[str] = []
+        while self._idempotency:
+            key, task_id = next(iter(self._idempotency.items()))
+            if task_id in self._tasks and not self._key_expired(task_id, now):
+                break
+            self._idempotency.popitem(last=False)
+            expired_keys.append(key)
+
+        if evicted or expired_keys:
+            self._on_evict(evicted, expired_keys)
+        return len(evicted)
+
+    def _evict_over_capacity(self, *, notify: bool = True) -> list[str]:
+        """任务数超过 max_records 时按结束顺序淘汰终态任务。"""
+        evicted: list[str] = []
+        while len(self._tasks) > (self._max_records or 0) and self._finished:
+            task_id, _ = self._finished.popitem(last=False)
+            self._evict(task_id)
+            evicted.append(task_id)
+        if notify and evicted:
+            self._on_evict(evicted, [])
+        return evicted
+
+    def _evict(self, task_id: str) -> None:
+        task = self._tasks.pop(task_id, None)
+        self._large_context.pop(task_id, None)
+        self._checkpoints.pop(task_id, None)
+        self._notify(task_id)
+        key = self._index_keys.pop(task_id, None)
+        self._evicted_total += 1
+        if task is None or key is None:
+            return
+        entry = (*key, task_id)
+        ctx = task.context
+        _discard_entry(self._by_created, entry)
+        for index, value in ((self._by_doc, ctx.get("doc_token")), (self._by_user, ctx.get("user_id"))):
+            if value and value in index:
+                _discard_entry(index[value], entry)
+                if not index[value]:
+                    del index[value]
+
+    def _key_expired(self, task_id: str, now: float) -> bool:
+        if self._idempotency_ttl_s is None:
+            return False
+        created_at = self._tasks[task_id].created_at
+        return created_at + self._idempotency_ttl_s <= now
+
+    def _track_finished(self, task_id: str, task: TaskSnapshot) -> None:
+        if task.status in _FINISHED_STATUSES:
+            self._finished[task_id] = task.updated_at or time.time()
+            self._finished.move_to_end(task_id)
 
     async def _update(self, task_id: str, payload: Dict[str, Any]) -> None:
-        async with self._lock:
-            if task_id not in self._tasks:
-                return
-            self._tasks[task_id].update(payload)
+        task = self._tasks.get(task_id)
+        # 已取消的任务不再接受进度 / 结果写入（执行协程收到取消前可能仍有在途的写入）
+        if task is None or task.status == "cancelled":
+            return
+        self._replace(task_id, payload)
+        if "status" in payload:
+            self._track_finished(task_id, self._tasks[task_id])
+
+    def _replace(self, task_id: str, changes: Dict[str, Any]) -> bool:
+        """基于当前记录生成新版本并整体替换（version 加一）；任务不存在时返回 False。"""
+        task = self._tasks.get(task_id)
+        if task is None:
+            return False
+        self._tasks[task_id] = task.evolve(changes)
+        self._on_change(task_id)
+        self._notify(task_id)
+        return True
+
+    def _notify(self, task_id: str) -> None:
+        """唤醒等待该任务变更的订阅方（SSE / 长轮询）。"""
+        for waiter in self._watchers.pop(task_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _full_context(self, task_id: str, task: TaskRecord) -> Dict[str, Any]:
+        return {**task.context, **self._large_context.get(task_id, {})}
+
+    def _on_change(self, task_id: str, *, idempotency_key: str | None = None) -> None:
+        """记录变更后的钩子；内存版无需处理，持久化后端在此标记脏数据。"""
+        _ = task_id
+        _ = idempotency_key
+
+    def _on_checkpoint(self, task_id: str, stage: str) -> None:
+        """断点数据写入后的钩子；持久化后端在此标记待写出的断点。"""
+        _ = task_id
+        _ = stage
+
+    def _on_evict(self, task_ids: list[str], idempotency_keys: list[str]) -> None:
+        """淘汰后的钩子；持久化后端在此记录待删除的行。"""
+        _ = task_ids
+        _ = idempotency_keys
+
+
+def _discard_entry(index: list[_IndexEntry], entry: _IndexEntry) -> None:
+    pos = bisect_left(index, entry)
+    if pos < len(index) and index[pos] == entry:
+        del index[pos]
+
+
+def _deep_sizeof(obj: Any) -> int:
+    """粗略估算对象占用的内存（递归 dict / list / tuple），用于暴露单任务内存指标。"""
+    size = sys.getsizeof(obj)
+    if is_dataclass(obj) and not isinstance(obj, type):
+        # __slots__ 记录：逐字段累加（驻留的字符串同样计入，结果偏保守）
+        return size + sum(_deep_sizeof(getattr(obj, f.name)) for f in fields(obj))
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k) + _deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item) for item in obj)
+    return size
+
+
+def build_task_store(settings: "Settings") -> BaseTaskStore:
+    """
+    根据配置选择 TaskStore 后端：memory（默认）/ sqlite / redis。
+    """
+    backend = settings.TASK_STORE_BACKEND.lower()
+    retention: Dict[str, Any] = {
+        "retention_s": settings.TASK_RETENTION_S,
+        "max_records": settings.TASK_MAX_RECORDS,
+        "idempotency_ttl_s": settings.IDEMPOTENCY_TTL_S,
+        "sweep_interval_s": settings.TASK_SWEEP_INTERVAL_S,
+    }
+    if backend == "memory":
+        return TaskStore(**retention)
+    if backend == "sqlite":
+        from backend.core.task_store_sqlite import SQLiteTaskStore
+
+        return SQLiteTaskStore(
+            path=settings.TASK_STORE_SQLITE_PATH,
+            flush_interval_s=settings.TASK_STORE_FLUSH_INTERVAL_S,
+            **retention,
+        )
+    if backend == "redis":
+        try:
+            from backend.core.task_store_redis import RedisTaskStore
+        except ImportError as exc:
+            raise RuntimeError("TASK_STORE_BACKEND=redis requires the redis package (pip install redis)") from exc
+
+        return RedisTaskStore(
+            url=settings.REDIS_URL,
+            prefix=settings.TASK_STORE_REDIS_PREFIX,
+            **retention,
+        )
+    raise ValueError(f"Unknown TASK_STORE_BACKEND: {settings.TASK_STORE_BACKEND}")
 
@@ -0,0 +1,633 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+
+from backend.core.task_record import TaskRecord, split_context, with_checkpoint_stage
+from backend.core.task_store import (
+    _FINISHED_STATUSES,
+    BaseTaskStore,
+    ReuseFn,
+    TaskCreate,
+    TaskSnapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+# 历史分页时每次从索引取出的条数（同时按 doc 与 user 过滤时需要跳过不匹配的任务）
+_PAGE_BATCH = 100
+
+
+class RedisTaskStore(BaseTaskStore):
+    """
+    Redis（或兼容协议的服务）共享的 TaskStore，用于多 worker / 多节点部署。
+
+    数据布局（key 均带 prefix）：
+    - task:{id}：hash，record 为 TaskRecord 的 JSON，large 为单独存放的大字段，
+      另存 doc_token / user_id / idempotency_key 供索引维护与淘汰使用
+    - checkpoints:{id}：hash，阶段名 -> 断点数据 JSON（record 中只记录阶段名，进度更新不重写断点数据）
+    - idx:created / idx:doc:{doc_token} / idx:user:{user_id}：sorted set，score 为创建时间
+    - idx:finished：终态任务按结束时间排序，保留策略从这里淘汰
+    - idem:{key}：幂等键 -> task_id，有效期由 Redis 过期时间实现
+    - events:{id}：任务变更频道，消息为新版本号；wait_for_change 通过订阅唤醒
+    - handoff：set，进程退出前移交的未完成任务，由下一个启动的进程取回恢复
+
+    并发模型：
+    - 写入是 WATCH / MULTI 乐观事务：读出记录、evolve 出新版本后整体写回，冲突时重试；
+      版本号在所有 worker 之间单调递增
+    - 每个 store 实例持有一个模式订阅连接，收到变更消息后只唤醒本进程内的等待方
+    """
+
+    durable = True
+
+    def __init__(
+        self,
+        *,
+        url: str | None = None,
+        client: Any = None,
+        prefix: str = "feishu_ai:",
+        retention_s: float | None = None,
+        max_records: int | None = None,
+        idempotency_ttl_s: float | None = None,
+        sweep_interval_s: float = 60.0,
+    ) -> None:
+        if client is None:
+            if not url:
+                raise ValueError("RedisTaskStore requires url or client")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self._redis = client
+        self._prefix = prefix
+        self._retention_s = retention_s
+        self._max_records = max_records
+        self._idempotency_ttl_s = idempotency_ttl_s
+        self._sweep_interval_s = sweep_interval_s
+        self._sweeper: Optional[asyncio.Task[None]] = None
+        self._pubsub: Any = None
+        self._listener: Optional[asyncio.Task[None]] = None
+        self._listener_lock = asyncio.Lock()
+        self._watchers: Dict[str, set[asyncio.Future[None]]] = {}
+
+    # ---- key 布局 ----
+
+    def _task_key(self, task_id: str) -> str:
+        return f"{self._prefix}task:{task_id}"
+
+    def _checkpoints_key(self, task_id: str) -> str:
+        return f"{self._prefix}checkpoints:{task_id}"
+
+    def _idem_key(self, key: str) -> str:
+        return f"{self._prefix}idem:{key}"
+
+    def _channel(self, task_id: str) -> str:
+        return f"{self._prefix}events:{task_id}"
+
+    def _index_key(self, name: str, value: str | None = None) -> str:
+        return f"{self._prefix}idx:{name}" if value is None else f"{self._prefix}idx:{name}:{value}"
+
+    # ---- 写入 ----
+
+    async def get_or_create_task(
+        self,
+        *,
+        context: Dict[str, Any],
+        idempotency_key: str | None = None,
+        parent_task_id: str | None = None,
+        reuse: ReuseFn | None = None,
+    ) -> tuple[str, bool]:
+        [result] = await self.get_or_create_tasks(
+            [
+                TaskCreate(
+                    context=context,
+                    idempotency_key=idempotency_key,
+                    parent_task_id=parent_task_id,
+                    reuse=reuse,
+                )
+            ]
+        )
+        return result
+
+    async def get_or_create_tasks(self, items: list[TaskCreate]) -> list[tuple[str, bool]]:
+        """
+        幂等键的占用与任务记录在同一个 MULTI 中写入：WATCH 本批所有幂等键，读出已占用的任务后一次提交；
+        期间其他 worker 占用或替换了其中任一键时事务失败，整批重新判断（不会出现“键已占用、记录未写入”的中间状态，
+        也不会覆盖别人刚写入的键）。
+        父任务 key 同样被 WATCH，子任务 id 与子任务记录在同一事务中追加到父任务，父任务期间被删除时整批重试。
+        """
+        ttl_ms = int(self._idempotency_ttl_s * 1000) if self._idempotency_ttl_s else None
+        idem_keys = sorted(
+            {self._idem_key(item.idempotency_key) for item in items if item.idempotency_key}
+        )
+        parent_ids = sorted({item.parent_task_id for item in items if item.parent_task_id})
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    claimed: Dict[str, Optional[str]] = {}
+                    if idem_keys or parent_ids:
+                        await pipe.watch(*idem_keys, *(self._task_key(p) for p in parent_ids))
+                    if idem_keys:
+                        claimed = dict(zip(idem_keys, await pipe.mget(idem_keys)))
+                    results, created = await self._plan_creates(items, claimed)
+                    if not created:
+                        return results
+                    # 父任务在 WATCH 之下读取：读取后被删除 / 淘汰时事务失败重试，不会留下指向不存在父任务的子任务
+                    parents: Dict[str, Dict[str, Any]] = {}
+                    for parent in {item.parent_task_id for _, item in created if item.parent_task_id}:
+                        raw = await pipe.hget(self._task_key(parent), "record")
+                        if raw is not None:
+                            parents[parent] = json.loads(raw)
+                    pipe.multi()
+                    children: Dict[str, list[str]] = {}
+                    for task_id, item in created:
+                        parent_task_id = item.parent_task_id if item.parent_task_id in parents else None
+                        self._queue_create(pipe, task_id, item, parent_task_id, ttl_ms)
+                        if parent_task_id:
+                            children.setdefault(parent_task_id, []).append(task_id)
+                    for parent_task_id, child_ids in children.items():
+                        data = parents[parent_task_id]
+                        parent = TaskRecord.from_dict(data)
+                        self._queue_write(
+                            pipe,
+                            parent_task_id,
+                            data,
+                            parent,
+                            parent.evolve(
+                                {"child_task_ids": [*(parent.child_task_ids or ()), *child_ids]}
+                            ),
+                        )
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    continue
+
+        if self._max_records is not None:
+            await self._evict_over_capacity()
+        return results
+
+    async def _plan_creates(
+        self, items: list[TaskCreate], claimed: Dict[str, Optional[str]]
+    ) -> tuple[list[tuple[str, bool]], list[tuple[str, TaskCreate]]]:
+        """按已占用的幂等键决定每项复用已有任务还是新建（新建项的幂等键在提交时一并改指向新任务）。"""
+        results: list[tuple[str, bool]] = []
+        created: list[tuple[str, TaskCreate]] = []
+        # 同一批中幂等键相同的项返回同一个任务
+        in_batch: Dict[str, str] = {}
+        for item in items:
+            key = item.idempotency_key
+            if key and key in in_batch:
+                results.append((in_batch[key], False))
+                continue
+            existing = claimed.get(self._idem_key(key)) if key else None
+            if existing:
+                # 键与记录同时写入，记录缺失只可能是任务已被淘汰，此时可以新建
+                task = await self.get(existing)
+                if task is not None and (item.reuse is None or item.reuse(task)):
+                    in_batch[key] = existing
+                    results.append((existing, False))
+                    continue
+            task_id = uuid.uuid4().hex
+            if key:
+                in_batch[key] = task_id
+            results.append((task_id, True))
+            created.append((task_id, item))
+        return results, created
+
+    def _queue_create(
+        self,
+        pipe: Any,
+        task_id: str,
+        item: TaskCreate,
+        parent_task_id: str | None,
+        ttl_ms: int | None,
+    ) -> None:
+        compact, large = split_context(item.context)
+        record = TaskRecord(
+            status="running",
+            created_at=time.time(),
+            context=compact,
+            parent_task_id=parent_task_id,
+        )
+        fields: Dict[str, str] = {"record": _encode(record)}
+        if large:
+            fields["large"] = json.dumps(large, ensure_ascii=False)
+        if item.idempotency_key:
+            fields["idempotency_key"] = item.idempotency_key
+            pipe.set(self._idem_key(item.idempotency_key), task_id, px=ttl_ms)
+        pipe.zadd(self._index_key("created"), {task_id: record.created_at})
+        for field, index in (("doc_token", "doc"), ("user_id", "user")):
+            value = compact.get(field)
+            if value:
+                fields[field] = value
+                pipe.zadd(self._index_key(index, value), {task_id: record.created_at})
+        pipe.hset(self._task_key(task_id), mapping=fields)
+
+    async def update_progress(
+        self,
+        task_id: str,
+        *,
+        stage: str,
+        percent: int | None = None,
+        message: str | None = None,
+        extra: Dict[str, Any] | None = None,
+        timeline: list[Dict[str, Any]] | None = None,
+    ) -> None:
+        changes = self._progress_changes(stage, percent, message, extra, timeline)
+        await self._mutate(task_id, lambda _: changes)
+
+    async def succeed(
+        self,
+        task_id: str,
+        result: Dict[str, Any],
+        *,
+        timeline: list[Dict[str, Any]] | None = None,
+    ) -> None:
+        changes = self._finish_changes("succeeded", "result", result, timeline)
+        await self._mutate(task_id, lambda _: changes)
+
+    async def fail(
+        self,
+        task_id: str,
+        error: str,
+        *,
+        timeline: list[Dict[str, Any]] | None = None,
+    ) -> None:
+        changes = self._finish_changes("failed", "error", error, timeline)
+        await self._mutate(task_id, lambda _: changes)
+
+    async def cancel(self, task_id: str, reason: str) -> bool:
+        changes = self._finish_changes("cancelled", "error", reason, None)
+        cancelled = await self._mutate(
+            task_id, lambda task: changes if task.status == "running" else None
+        )
+        return cancelled is not None
+
+    async def save_checkpoint(
+        self, task_id: str, stage: str, data: Dict[str, Any]
+    ) -> None:
+        encoded = json.dumps(data, ensure_ascii=False, default=str)
+        await self._mutate(
+            task_id,
+            lambda task: {"checkpoints": with_checkpoint_stage(task.checkpoints, stage)},
+            also=lambda pipe: pipe.hset(self._checkpoints_key(task_id), stage, encoded),
+        )
+
+    async def restart(self, task_id: str) -> bool:
+        restarted = await self._mutate(
+            task_id, lambda task: self._restart_changes(task) if task.status == "failed" else None
+        )
+        return restarted is not None
+
+    async def _mutate(
+        self,
+        task_id: str,
+        build: Callable[[TaskRecord], Optional[Dict[str, Any]]],
+        *,
+        also: Callable[[Any], Any] | None = None,
+    ) -> Optional[TaskRecord]:
+        """
+        乐观事务更新：WATCH 任务 key，读出记录并按 build 返回的变更生成新版本后写回；
+        其他 worker 同时写入同一任务时事务失败并重试。
+        任务不存在、已取消（断点除外）或 build 返回 None 时不写入。
+        also 在同一事务中追加其他 key 的写入（如断点数据）。
+        """
+        key = self._task_key(task_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.hget(key, "record")
+                    if raw is None:
+                        return None
+                    data = json.loads(raw)
+                    task = TaskRecord.from_dict(data)
+                    changes = build(task)
+                    if changes is None or (task.status == "cancelled" and "checkpoints" not in changes):
+                        return None
+                    new = task.evolve(changes)
+                    pipe.multi()
+                    self._queue_write(pipe, task_id, data, task, new, also=also)
+                    await pipe.execute()
+                    return new
+                except WatchError:
+                    continue
+
+    def _queue_write(
+        self,
+        pipe: Any,
+        task_id: str,
+        data: Dict[str, Any],
+        task: TaskRecord,
+        new: TaskRecord,
+        *,
+        also: Callable[[Any], Any] | None = None,
+    ) -> None:
+        """在事务中写入任务的新版本（data 为读出的原始记录），并同步完成索引与变更通知。"""
+        legacy = _legacy_checkpoints(data)
+        if legacy:
+            # 旧版本内联在 record 中的断点数据：随本次写入迁移到 checkpoints hash
+            pipe.hset(
+                self._checkpoints_key(task_id),
+                mapping={
+                    stage: json.dumps(checkpoint, ensure_ascii=False, default=str)
+                    for stage, checkpoint in legacy.items()
+                },
+            )
+        if also is not None:
+            also(pipe)
+        pipe.hset(self._task_key(task_id), "record", _encode(new))
+        if new.status in _FINISHED_STATUSES:
+            pipe.zadd(self._index_key("finished"), {task_id: new.updated_at or time.time()})
+        elif task.status in _FINISHED_STATUSES:
+            pipe.zrem(self._index_key("finished"), task_id)
+        pipe.publish(self._channel(task_id), new.version)
+
+    # ---- 读取 ----
+
+    async def get(self, task_id: str) -> Optional[TaskSnapshot]:
+        raw = await self._redis.hget(self._task_key(task_id), "record")
+        return _decode(raw) if raw is not None else None
+
+    async def get_checkpoints(self, task_id: str) -> Dict[str, Dict[str, Any]]:
+        stored = await self._redis.hgetall(self._checkpoints_key(task_id))
+        if stored:
+            return {stage: json.loads(data) for stage, data in stored.items()}
+        raw = await self._redis.hget(self._task_key(task_id), "record")
+        return _legacy_checkpoints(json.loads(raw)) if raw is not None else {}
+
+    async def get_context(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raw, large = await self._redis.hmget(self._task_key(task_id), ["record", "large"])
+        if raw is None:
+            return None
+        return {**_decode(raw).context, **(json.loads(large) if large else {})}
+
+    async def wait_for_change(
+        self, task_id: str, since_version: int, timeout: float
+    ) -> Optional[TaskSnapshot]:
+        task = await self.get(task_id)
+        if task is None or task.version > since_version or timeout <= 0:
+            return task
+        await self._ensure_listener()
+        waiter = asyncio.get_running_loop().create_future()
+        self._watchers.setdefault(task_id, set()).add(waiter)
+        try:
+            # 先登记再读一次：避免首次读取与登记之间的变更消息被错过
+            task = await self.get(task_id)
+            if task is None or task.version > since_version:
+                return task
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            watchers = self._watchers.get(task_id)
+            if watchers is not None:
+                watchers.discard(waiter)
+                if not watchers:
+                    del self._watchers[task_id]
+        return await self.get(task_id)
+
+    async def list_task_ids(
+        self,
+        *,
+        doc_token: str | None = None,
+        user_id: str | None = None,
+    ) -> list[str]:
+        index_key, field, value = self._pick_index(doc_token, user_id)
+        task_ids: list[str] = await self._redis.zrevrange(index_key, 0, -1)
+        if not field:
+            return task_ids
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for task_id in task_ids:
+                pipe.hget(self._task_key(task_id), field)
+            values = await pipe.execute()
+        return [task_id for task_id, v in zip(task_ids, values) if v == value]
+
+    async def list_tasks(
+        self,
+        *,
+        doc_token: str | None = None,
+        user_id: str | None = None,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[tuple[str, TaskSnapshot]], str | None]:
+        """
+        按创建时间倒序分页；cursor 格式与内存版相同（"<created_at>:<task_id>"）。
+        同一时刻创建的任务按 task_id 倒序排列（sorted set 同分成员按字典序）。
+        """
+        index_key, field, value = self._pick_index(doc_token, user_id)
+        max_score: Any = "+inf"
+        after: tuple[float, str] | None = None
+        if cursor is not None:
+            after = _decode_cursor(cursor)
+            max_score = after[0]
+
+        fields = ["record", field] if field else ["record"]
+        # 多取一条用于判断是否还有下一页
+        items: list[tuple[str, TaskSnapshot, float]] = []
+        offset = 0
+        while len(items) <= limit:
+            entries = await self._redis.zrevrangebyscore(
+                index_key, max_score, "-inf", start=offset, num=_PAGE_BATCH, withscores=True
+            )
+            offset += len(entries)
+            if after is not None:
+                # 与 cursor 同一时刻创建的任务：只保留排在 cursor 之后（task_id 更小）的
+                entries = [(m, s) for m, s in entries if not (s == after[0] and m >= after[1])]
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for task_id, _ in entries:
+                    pipe.hmget(self._task_key(task_id), fields)
+                rows = await pipe.execute()
+            for (task_id, score), row in zip(entries, rows):
+                if row[0] is None or (field and row[1] != value):
+                    continue
+                items.append((task_id, _decode(row[0]), score))
+            if offset % _PAGE_BATCH or not offset:
+                break
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last_id, _, last_score = items[-1]
+            next_cursor = f"{last_score!r}:{last_id}"
+        return [(task_id, task) for task_id, task, _ in items], next_cursor
+
+    def _pick_index(
+        self, doc_token: str | None, user_id: str | None
+    ) -> tuple[str, str | None, str | None]:
+        """返回 (索引 key, 二次过滤字段, 过滤值)：同时按 doc 与 user 过滤时走 doc 索引再按 user 过滤。"""
+        if doc_token:
+            return self._index_key("doc", doc_token), "user_id" if user_id else None, user_id
+        if user_id:
+            return self._index_key("user", user_id), None, None
+        return self._index_key("created"), None, None
+
+    async def stats(self) -> Dict[str, Any]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zcard(self._index_key("created"))
+            pipe.zcard(self._index_key("finished"))
+            pipe.get(f"{self._prefix}evicted_total")
+            tasks, finished, evicted = await pipe.execute()
+        return {
+            "backend": "redis",
+            "tasks": tasks,
+            "running": tasks - finished,
+            "finished": finished,
+            "evicted_total": int(evicted or 0),
+            "retention_s": self._retention_s,
+            "max_records": self._max_records,
+            "idempotency_ttl_s": self._idempotency_ttl_s,
+        }
+
+    async def hand_off(self, task_ids: list[str], reason: str) -> None:
+        await super().hand_off(task_ids, reason)
+        if task_ids:
+            await self._redis.sadd(f"{self._prefix}handoff", *task_ids)
+
+    async def take_handoff(self) -> list[str]:
+        # SPOP 逐个原子取出：多个进程同时启动时每个任务只被一个进程恢复
+        task_ids: list[str] = []
+        while True:
+            task_id = await self._redis.spop(f"{self._prefix}handoff")
+            if task_id is None:
+                return task_ids
+            task_ids.append(task_id)
+
+    # ---- 生命周期与淘汰 ----
+
+    async def start(self) -> None:
+        await self._ensure_listener()
+        if self._sweeper is None and (self._retention_s is not None or self._max_records is not None):
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def close(self) -> None:
+        for task in (self._sweeper, self._listener):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._sweeper = self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self._redis.aclose()
+
+    async def sweep(self, now: float | None = None) -> int:
+        """淘汰过期 / 超出上限的终态任务，返回本次（由本实例）淘汰的任务数；幂等键由 Redis 过期时间处理。"""
+        now = time.time() if now is None else now
+        evicted = 0
+        if self._retention_s is not None:
+            expired = await self._redis.zrangebyscore(
+                self._index_key("finished"), "-inf", now - self._retention_s
+            )
+            for task_id in expired:
+                evicted += await self._evict(task_id)
+        if self._max_records is not None:
+            evicted += await self._evict_over_capacity()
+        return evicted
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._sweep_interval_s)
+            try:
+                evicted = await self.sweep()
+                if evicted:
+                    logger.info("RedisTaskStore evicted %d finished tasks", evicted)
+            except Exception:  # noqa: BLE001
+                logger.exception("RedisTaskStore sweep failed")
+
+    async def _evict_over_capacity(self) -> int:
+        over = await self._redis.zcard(self._index_key("created")) - (self._max_records or 0)
+        if over <= 0:
+            return 0
+        evicted = 0
+        for task_id in await self._redis.zrange(self._index_key("finished"), 0, over - 1):
+            evicted += await self._evict(task_id)
+        return evicted
+
+    async def _evict(self, task_id: str) -> int:
+        """删除任务及其索引；多个 worker 同时淘汰同一任务时只有一个计数，返回 1 / 0。"""
+        key = self._task_key(task_id)
+        doc_token, user_id, idempotency_key = await self._redis.hmget(
+            key, ["doc_token", "user_id", "idempotency_key"]
+        )
+        idem_owner = await self._redis.get(self._idem_key(idempotency_key)) if idempotency_key else None
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._index_key("finished"), task_id)
+            pipe.delete(key)
+            pipe.delete(self._checkpoints_key(task_id))
+            pipe.zrem(self._index_key("created"), task_id)
+            if doc_token:
+                pipe.zrem(self._index_key("doc", doc_token), task_id)
+            if user_id:
+                pipe.zrem(self._index_key("user", user_id), task_id)
+            # 幂等键已被重新使用（指向新任务）时保留
+            if idem_owner == task_id:
+                pipe.delete(self._idem_key(idempotency_key))
+            pipe.publish(self._channel(task_id), 0)
+            removed = (await pipe.execute())[0]
+        if removed:
+            await self._redis.incr(f"{self._prefix}evicted_total")
+        return 1 if removed else 0
+
+    # ---- 变更订阅 ----
+
+    async def _ensure_listener(self) -> None:
+        if self._listener is not None and not self._listener.done():
+            return
+        async with self._listener_lock:
+            if self._listener is not None and not self._listener.done():
+                return
+            if self._pubsub is None:
+                self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                await self._pubsub.psubscribe(self._channel("*"))
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        prefix_len = len(self._channel(""))
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") == "pmessage":
+                        self._notify(message["channel"][prefix_len:])
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001
+                logger.exception("RedisTaskStore pubsub listener failed, reconnecting")
+                await asyncio.sleep(1.0)
+
+    def _notify(self, task_id: str) -> None:
+        for waiter in self._watchers.pop(task_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+def _encode(task: TaskRecord) -> str:
+    return json.dumps(dict(task), ensure_ascii=False, default=str)
+
+
+def _decode(raw: str) -> TaskRecord:
+    return TaskRecord.from_dict(json.loads(raw))
+
+
+def _legacy_checkpoints(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """旧版本 record 中内联的断点数据（阶段名 -> 数据）；新格式只记录阶段名列表，返回空 dict。"""
+    checkpoints = data.get("checkpoints")
+    return dict(checkpoints) if isinstance(checkpoints, dict) else {}
+
+
+def _decode_cursor(cursor: str) -> tuple[float, str]:
+    created_at, sep, task_id = cursor.partition(":")
+    try:
+        created = float(created_at)
+    except ValueError as exc:
+        raise ValueError(f"Invalid cursor: {cursor}") from exc
+    if not sep:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return created, task_id
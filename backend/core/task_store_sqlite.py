@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from backend.core.task_record import TaskRecord, split_context
+from backend.core.task_store import TaskCreate, TaskStore
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    doc_token TEXT,
+    user_id TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_doc ON tasks (doc_token, created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_user ON tasks (user_id, created_at);
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    task_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (task_id, stage)
+);
+CREATE TABLE IF NOT EXISTS handoff (
+    task_id TEXT PRIMARY KEY,
+    handed_off_at REAL NOT NULL
+);
+"""
+
+# 进程重启时仍处于 running 的任务：执行协程已丢失，标记为失败，可通过 retry 从断点恢复
+_INTERRUPTED_ERROR = "服务重启，任务中断（可通过 retry 从断点恢复）"
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    SQLite（WAL 模式）持久化的 TaskStore。
+
+    - 读写仍走内存（与 TaskStore 完全相同的接口与语义），start 时打开数据库并加载历史任务（构造不做文件 I/O）
+    - 写入采用 write-behind：变更只标记脏 task_id，后台协程每 flush_interval_s 合并落盘一次；
+      同一任务在一个周期内的多次进度更新只写一行，一个周期只提交一次事务（一次 fsync）
+    - flush_interval_s <= 0 时退化为每次变更立即落盘（用于对比基准）
+    - 保留策略参数（retention_s / max_records / idempotency_ttl_s）同 TaskStore，被淘汰的任务同步从数据库删除
+    - 断点数据存放在 checkpoints 表（每个阶段一行），进度落盘只重写体积很小的任务行
+    """
+
+    durable = True
+
+    def __init__(self, *, path: str, flush_interval_s: float = 0.5, **retention: Any) -> None:
+        super().__init__(**retention)
+        self._path = path
+        self._flush_interval_s = flush_interval_s
+        self._dirty: set[str] = set()
+        self._dirty_keys: Dict[str, str] = {}
+        self._dirty_checkpoints: set[tuple[str, str]] = set()
+        self._deleted: set[str] = set()
+        self._deleted_keys: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task[None]] = None
+        self._closed = False
+        # 落盘在线程池中执行，由 _flush_lock 保证同一时间只有一个线程使用连接
+        self._conn: Optional[sqlite3.Connection] = None
+
+    async def start(self) -> None:
+        if self._conn is None:
+            async with self._flush_lock:
+                await asyncio.to_thread(self._open)
+        await super().start()
+        self._ensure_flusher()
+
+    def _open(self) -> None:
+        if self._path != ":memory:":
+            Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+        self._load()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise RuntimeError("SQLiteTaskStore is not started; call start() first")
+        return self._conn
+
+    async def close(self) -> None:
+        await super().close()
+        self._closed = True
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._conn is None:
+            return
+        await self.flush()
+        self._conn.close()
+        self._conn = None
+
+    async def flush(self) -> None:
+        """把当前所有脏数据合并写入数据库（单个事务）。"""
+        async with self._flush_lock:
+            # 收集脏数据是同步代码段（无 await），与并发写入天然互斥
+            if not (
+                self._dirty
+                or self._dirty_keys
+                or self._dirty_checkpoints
+                or self._deleted
+                or self._deleted_keys
+            ):
+                return
+            rows = [
+                self._to_row(task_id, self._tasks[task_id])
+                for task_id in self._dirty
+                if task_id in self._tasks
+            ]
+            keys = list(self._dirty_keys.items())
+            checkpoints = [
+                (task_id, stage, json.dumps(self._checkpoints[task_id][stage], ensure_ascii=False, default=str))
+                for task_id, stage in self._dirty_checkpoints
+                if stage in self._checkpoints.get(task_id, {})
+            ]
+            deleted = [(task_id,) for task_id in self._deleted]
+            deleted_keys = [(key,) for key in self._deleted_keys]
+            self._dirty.clear()
+            self._dirty_keys.clear()
+            self._dirty_checkpoints.clear()
+            self._deleted.clear()
+            self._deleted_keys.clear()
+            await asyncio.to_thread(self._write, rows, keys, deleted, deleted_keys, checkpoints)
+
+    def _on_change(self, task_id: str, *, idempotency_key: str | None = None) -> None:
+        self._dirty.add(task_id)
+        if idempotency_key:
+            self._dirty_keys[idempotency_key] = task_id
+        if self._flush_interval_s <= 0:
+            return
+        self._ensure_flusher()
+
+    def _on_checkpoint(self, task_id: str, stage: str) -> None:
+        self._dirty_checkpoints.add((task_id, stage))
+
+    def _on_evict(self, task_ids: list[str], idempotency_keys: list[str]) -> None:
+        evicted = set(task_ids)
+        self._dirty_checkpoints = {
+            item for item in self._dirty_checkpoints if item[0] not in evicted
+        }
+        for task_id in task_ids:
+            self._dirty.discard(task_id)
+            self._deleted.add(task_id)
+        for key in idempotency_keys:
+            self._dirty_keys.pop(key, None)
+            self._deleted_keys.add(key)
+        if self._flush_interval_s > 0:
+            self._ensure_flusher()
+
+    async def sweep(self, now: float | None = None) -> int:
+        evicted = await super().sweep(now)
+        if self._flush_interval_s <= 0:
+            await self.flush()
+        return evicted
+
+    async def _update(self, task_id: str, payload: Dict[str, Any]) -> None:
+        await super()._update(task_id, payload)
+        if self._flush_interval_s <= 0:
+            await self.flush()
+
+    async def get_or_create_task(self, **kwargs: Any) -> tuple[str, bool]:  # type: ignore[override]
+        task_id, created = await super().get_or_create_task(**kwargs)
+        if created and self._flush_interval_s <= 0:
+            await self.flush()
+        return task_id, created
+
+    async def get_or_create_tasks(self, items: list[TaskCreate]) -> list[tuple[str, bool]]:
+        # 整批创建后只落盘一次（一个事务）
+        results = await super().get_or_create_tasks(items)
+        if any(created for _, created in results) and self._flush_interval_s <= 0:
+            await self.flush()
+        return results
+
+    async def restart(self, task_id: str) -> bool:
+        restarted = await super().restart(task_id)
+        if restarted and self._flush_interval_s <= 0:
+            await self.flush()
+        return restarted
+
+    async def hand_off(self, task_ids: list[str], reason: str) -> None:
+        await super().hand_off(task_ids, reason)
+        await self.flush()
+        now = time.time()
+        async with self._flush_lock:
+            await asyncio.to_thread(self._write_handoff, [(task_id, now) for task_id in task_ids])
+
+    async def take_handoff(self) -> list[str]:
+        async with self._flush_lock:
+            return await asyncio.to_thread(self._pop_handoff)
+
+    def _write_handoff(self, rows: list[tuple[str, float]]) -> None:
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO handoff (task_id, handed_off_at) VALUES (?, ?)", rows
+            )
+
+    def _pop_handoff(self) -> list[str]:
+        conn = self._connection()
+        with conn:
+            task_ids = [
+                task_id
+                for (task_id,) in conn.execute(
+                    "SELECT task_id FROM handoff ORDER BY handed_off_at"
+                )
+            ]
+            conn.execute("DELETE FROM handoff")
+        return task_ids
+
+    async def save_checkpoint(self, task_id: str, stage: str, data: Dict[str, Any]) -> None:
+        await super().save_checkpoint(task_id, stage, data)
+        # 断点是恢复的依据，不等下一个周期，立即落盘
+        await self.flush()
+
+    def _ensure_flusher(self) -> None:
+        if self._closed or (self._flusher and not self._flusher.done()):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._flusher = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval_s)
+            try:
+                await self.flush()
+            except Exception:  # noqa: BLE001
+                logger.exception("SQLiteTaskStore flush failed, path=%s", self._path)
+
+    def _load(self) -> None:
+        conn = self._connection()
+        now = time.time()
+        interrupted: list[str] = []
+        # 旧版本把断点数据内联在任务行中：迁移到 checkpoints 表并重写任务行
+        migrated: list[str] = []
+        for task_id, stage, data in conn.execute(
+            "SELECT task_id, stage, data FROM checkpoints"
+        ):
+            self._checkpoints.setdefault(task_id, {})[stage] = json.loads(data)
+        for task_id, data in conn.execute("SELECT task_id, data FROM tasks"):
+            task = json.loads(data)
+            if task.get("status") == "running":
+                task.update({"status": "failed", "error": _INTERRUPTED_ERROR, "updated_at": now})
+                interrupted.append(task_id)
+            inline = task.get("checkpoints")
+            if isinstance(inline, dict):
+                self._checkpoints[task_id] = {**inline, **self._checkpoints.get(task_id, {})}
+                migrated.append(task_id)
+            compact, large = split_context(task.get("context") or {})
+            self._tasks[task_id] = TaskRecord.from_dict({**task, "context": compact})
+            if large:
+                self._large_context[task_id] = large
+        # 按任务创建顺序恢复幂等键，保证过期淘汰仍可从头部弹出
+        for key, task_id in conn.execute(
+            "SELECT i.key, i.task_id FROM idempotency i "
+            "LEFT JOIN tasks t ON t.task_id = i.task_id ORDER BY t.created_at"
+        ):
+            self._idempotency[key] = task_id
+        self._rebuild_indexes()
+        rewrite = list(dict.fromkeys(interrupted + migrated))
+        if rewrite:
+            self._write(
+                [self._to_row(tid, self._tasks[tid]) for tid in rewrite],
+                [],
+                [],
+                [],
+                [
+                    (tid, stage, json.dumps(data, ensure_ascii=False, default=str))
+                    for tid in migrated
+                    for stage, data in self._checkpoints[tid].items()
+                ],
+            )
+        # 启动时先按保留策略清理一次历史数据，删除在下一次落盘时执行
+        self._sweep_now(now)
+        logger.info(
+            "Loaded %d tasks from %s (%d interrupted)", len(self._tasks), self._path, len(interrupted)
+        )
+
+    def _write(
+        self,
+        rows: list[tuple[Any, ...]],
+        keys: list[tuple[str, str]],
+        deleted: list[tuple[str]],
+        deleted_keys: list[tuple[str]],
+        checkpoints: list[tuple[str, str, str]],
+    ) -> None:
+        conn = self._connection()
+        with conn:
+            # 先删后写：过期后被重新使用的幂等键不会被误删
+            if deleted:
+                conn.executemany("DELETE FROM tasks WHERE task_id = ?", deleted)
+                conn.executemany("DELETE FROM checkpoints WHERE task_id = ?", deleted)
+            if deleted_keys:
+                conn.executemany("DELETE FROM idempotency WHERE key = ?", deleted_keys)
+            if rows:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO tasks "
+                    "(task_id, doc_token, user_id, status, created_at, updated_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            if keys:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO idempotency (key, task_id) VALUES (?, ?)", keys
+                )
+            if checkpoints:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoints (task_id, stage, data) VALUES (?, ?, ?)",
+                    checkpoints,
+                )
+
+    def _to_row(self, task_id: str, task: TaskRecord) -> tuple[Any, ...]:
+        # 落盘时把单独存放的大字段合并回 context，数据库中仍是完整任务
+        data = {**task, "context": self._full_context(task_id, task)}
+        return (
+            task_id,
+            task.context.get("doc_token"),
+            task.context.get("user_id"),
+            task.status,
+            task.created_at,
+            task.updated_at,
+            json.dumps(data, ensure_ascii=False, default=str),
+        )
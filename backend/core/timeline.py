@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from backend.core.metrics import percentile
+
+
+class TaskTimeline:
+    """
+    单个任务的阶段耗时时间线。
+
+    - mark(stage)：进入新阶段（自动结束上一阶段）；与当前阶段同名时忽略
+    - count_call(kind)：当前阶段内的子调用计数（如 llm / feishu）
+    - 每段记录：stage / start / end / duration_s / calls
+    """
+
+    def __init__(self, spans: Optional[List[Dict[str, Any]]] = None) -> None:
+        # 重试时在已有时间线后继续追加
+        self._spans: List[Dict[str, Any]] = [dict(span) for span in spans or []]
+        self._current: Optional[Dict[str, Any]] = None
+
+    def mark(self, stage: str, *, now: float | None = None) -> None:
+        if self._current and self._current["stage"] == stage:
+            return
+        ts = now if now is not None else time.time()
+        self._close(ts)
+        self._current = {"stage": stage, "start": ts, "end": None, "duration_s": None, "calls": {}}
+        self._spans.append(self._current)
+
+    def count_call(self, kind: str) -> None:
+        if self._current is None:
+            return
+        calls = self._current["calls"]
+        calls[kind] = calls.get(kind, 0) + 1
+
+    def finish(self, *, now: float | None = None) -> None:
+        self._close(now if now is not None else time.time())
+        self._current = None
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [{**span, "calls": dict(span["calls"])} for span in self._spans]
+
+    def _close(self, ts: float) -> None:
+        if self._current is None:
+            return
+        self._current["end"] = ts
+        self._current["duration_s"] = round(ts - self._current["start"], 3)
+
+
+_current_timeline: ContextVar[Optional[TaskTimeline]] = ContextVar(
+    "current_timeline", default=None
+)
+
+
+def bind_timeline(timeline: TaskTimeline) -> None:
+    """
+    把时间线绑定到当前 asyncio 上下文。
+
+    每个后台任务（asyncio.create_task / gather 的子协程）拥有独立的上下文副本，
+    因此 fan-out 的各个 mode 互不干扰。
+    """
+    _current_timeline.set(timeline)
+
+
+def mark_stage(stage: str) -> None:
+    """在当前任务的时间线上进入新阶段（无绑定时忽略），用于不经过 ProgressFn 的细分阶段。"""
+    timeline = _current_timeline.get()
+    if timeline is not None:
+        timeline.mark(stage)
+
+
+def record_call(kind: str) -> None:
+    """为当前阶段累加一次子调用（LLM / 飞书 API）；无绑定时忽略。"""
+    timeline = _current_timeline.get()
+    if timeline is not None:
+        timeline.count_call(kind)
+
+
+class StageLatencyStats:
+    """
+    按 mode 聚合各阶段耗时（每个 mode+stage 保留最近 max_samples 个样本），输出分位数。
+    """
+
+    def __init__(self, *, max_samples: int = 1000) -> None:
+        self._samples: Dict[Tuple[str, str], Deque[float]] = defaultdict(
+            lambda: deque(maxlen=max_samples)
+        )
+
+    def observe(self, mode: str, spans: List[Dict[str, Any]]) -> None:
+        # 同一阶段在一次任务中可能出现多段（如重试），按任务合计
+        totals: Dict[str, float] = {}
+        for span in spans:
+            if span.get("duration_s") is None:
+                continue
+            totals[span["stage"]] = totals.get(span["stage"], 0.0) + float(span["duration_s"])
+        for stage, duration in totals.items():
+            self._samples[(mode, stage)].append(duration)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        result: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (mode, stage), samples in self._samples.items():
+            values = sorted(samples)
+            result.setdefault(mode, {})[stage] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "max": values[-1],
+            }
+        return result
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Dict
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class WorkflowItemConfig(BaseModel):
@@ -14,6 +14,16 @@ class WorkflowItemConfig(BaseModel):
     chain: str = Field(..., description="LLM chain 名称，对应 llm_config.yml 的 chains")
     output: str = Field(..., description="output 注册名，如 feishu_child_doc")
     notify_user: bool = Field(default=True, description="是否通知触发用户")
+    pool: str = Field(default="default", description="执行分池名，对应 pools 中的配置")
+
+
+class PoolItemConfig(BaseModel):
+    """
+    执行分池配置。
+    """
+
+    workers: int = Field(..., ge=1, description="专属执行位数")
+    borrow: bool = Field(default=False, description="专属执行位用满时是否借用其他分池的空闲执行位")
 
 
 class WorkflowConfigFile(BaseModel):
@@ -22,3 +32,12 @@ class WorkflowConfigFile(BaseModel):
     """
 
     workflows: Dict[str, WorkflowItemConfig]
+    # 未配置 default 分池时，其执行位数取 TASK_WORKERS
+    pools: Dict[str, PoolItemConfig] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def _check_pools(self) -> "WorkflowConfigFile":
+        for mode, item in self.workflows.items():
+            if item.pool != "default" and item.pool not in self.pools:
+                raise ValueError(f"Workflow '{mode}' uses undefined pool '{item.pool}'")
+        return self
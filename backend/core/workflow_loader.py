@@ -10,6 +10,7 @@ from backend.core.manager import WorkflowConfig, WorkflowRegistry
 from backend.core.workflow_config_models import WorkflowConfigFile
 from backend.services.outputs.registry import get_output_factory
 from backend.services.processors.registry import get_processor_cls
+from backend.services.triggers.pool import PoolSpec
 
 logger = logging.getLogger(__name__)
 
@@ -34,10 +35,19 @@ def load_workflow_registry(config_path: Optional[str] = None) -> WorkflowRegistr
             chain=item.chain,
             output_factory=get_output_factory(item.output),
             notify_user=item.notify_user,
+            pool=item.pool,
         )
+    pools = {
+        name: PoolSpec(workers=item.workers, borrow=item.borrow) for name, item in cfg.pools.items()
+    }
 
-    logger.info("Loaded workflow registry from %s, modes=%s", path, list(mapping.keys()))
-    return WorkflowRegistry(mapping)
+    logger.info(
+        "Loaded workflow registry from %s, modes=%s, pools=%s",
+        path,
+        list(mapping.keys()),
+        list(pools.keys()) or ["default"],
+    )
+    return WorkflowRegistry(mapping, pools=pools)
 
 
 def build_default_workflow_registry() -> WorkflowRegistry:
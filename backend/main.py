@@ -1,7 +1,16 @@
+import time
+
+# 模块导入耗时（fastapi / httpx / 路由与业务模块），启动时随各组件构造耗时一并上报
+_IMPORT_STARTED = time.perf_counter()
+
 import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from backend.config import get_settings
 from dotenv import load_dotenv
@@ -15,6 +24,92 @@ logging.basicConfig(
 )
 
 from backend.api.routes import router as api_router
+from backend.container import GracefulSignalHandler, build_container
+from backend.core.metrics import (
+    EVENT_LOOP_LAG_SECONDS,
+    HTTP_REQUEST_SECONDS,
+    REGISTRY,
+    UNMATCHED_ROUTE,
+    EventLoopLagMonitor,
+)
+
+loop_lag_monitor = EventLoopLagMonitor(
+    EVENT_LOOP_LAG_SECONDS, interval_s=get_settings().METRICS_LOOP_LAG_INTERVAL_S
+)
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+
+class RequestMetricsMiddleware:
+    """
+    按路由模板记录请求耗时（纯 ASGI 中间件，不包装响应体）。
+
+    在响应头发出时记录，SSE 等流式响应只计首字节耗时，不把连接时长计入直方图。
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status_code: int) -> None:
+            nonlocal recorded
+            recorded = True
+            # 路由匹配后 FastAPI 把 route 写入 scope；未匹配（404）归为 unmatched
+            route: Any = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                str(status_code),
+            )
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and not recorded:
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not recorded:
+                record(500)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    应用生命周期：构造依赖容器（共享的飞书 / LLM 客户端、TaskStore、任务调度等，挂在 app.state.container），
+    启动 TaskStore 后台资源并恢复上一个进程移交的任务，上报导入 / 构造 / 启动耗时。
+
+    收到 SIGTERM 时先进入排空状态并保持端口开放 SHUTDOWN_READINESS_GRACE_S 秒（/ready 返回 503，供负载均衡摘除），
+    之后 uvicorn 关闭端口、进入关闭流程：由容器排空任务（至多 SHUTDOWN_DRAIN_S 秒）、确保任务数据落盘，
+    再关闭各客户端的连接池。
+    """
+    settings = get_settings()
+    container = build_container(settings)
+    await container.start()
+    container.report_startup(import_s=IMPORT_SECONDS)
+    app.state.container = container
+    REGISTRY.add_collector(container.collect_metrics)
+    signal_handler = GracefulSignalHandler(
+        container.begin_shutdown, grace_s=settings.SHUTDOWN_READINESS_GRACE_S
+    )
+    signal_handler.install()
+    loop_lag_monitor.start()
+    try:
+        yield
+    finally:
+        signal_handler.uninstall()
+        await loop_lag_monitor.stop()
+        REGISTRY.remove_collector(container.collect_metrics)
+        await container.close(drain_s=settings.SHUTDOWN_DRAIN_S)
+        app.state.container = None
 
 
 def create_app() -> FastAPI:
@@ -24,6 +119,7 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="AI Idea Generator Backend",
         version="0.1.0",
+        lifespan=lifespan,
     )
 
     # 配置 CORS - 允许飞书小组件等前端跨域访问
@@ -35,6 +131,8 @@ def create_app() -> FastAPI:
         allow_headers=["*"],  # 允许所有请求头
     )
 
+    app.add_middleware(RequestMetricsMiddleware)
+
     # 预加载配置，启动时如果 .env 有问题可以尽早暴露
     get_settings()
 
@@ -45,10 +143,20 @@ def create_app() -> FastAPI:
     async def health_check():
         return {"status": "ok"}
 
-    return app
-
+    @app.get("/ready", summary="就绪检查（停机排空时返回 503）")
+    async def readiness_check(request: Request):
+        container = getattr(request.app.state, "container", None)
+        if container is None or container.trigger_service.draining:
+            return JSONResponse(status_code=503, content={"status": "draining"})
+        return {"status": "ready"}
 
-app = create_app()
+    @app.get("/metrics", summary="Prometheus 指标", response_class=PlainTextResponse)
+    async def metrics() -> PlainTextResponse:
+        return PlainTextResponse(
+            await REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
 
+    return app
 
 
+app = create_app()
@@ -44,6 +44,14 @@ class FeishuClient:
         """获取 tenant_access_token（向后兼容）"""
         return await self._base.get_tenant_access_token()
     
+    async def close(self) -> None:
+        """关闭共享的 HTTP 连接池（应用停机时调用）"""
+        await self._base.close()
+    
+    async def exchange_code_for_user_token(self, code: str):
+        """云文档小组件登录 code 换取用户信息（open_id 等）"""
+        return await self._base.exchange_code_for_user_token(code)
+    
     async def get_doc_meta(self, doc_token: str):
         """获取文档元数据（向后兼容）"""
         return await self.doc.get_meta(doc_token)
@@ -14,10 +14,32 @@ from typing import Any, Dict, Optional
 import httpx
 
 from backend.config import get_settings
+from backend.core.metrics import FEISHU_ERRORS, FEISHU_REQUEST_SECONDS, RouteTemplates
+from backend.core.timeline import record_call
+from backend.services.feishu.cache import TTLCache
 from backend.services.feishu.errors import FeishuAPIError
 
 logger = logging.getLogger(__name__)
 
+# 经 request 调用的飞书接口（指标按模板聚合；新增接口时在此登记，未登记的路径归为 unmatched）
+FEISHU_ROUTES = RouteTemplates(
+    [
+        "/open-apis/docx/v1/documents",
+        "/open-apis/docx/v1/documents/blocks/convert",
+        "/open-apis/docx/v1/documents/{document_id}",
+        "/open-apis/docx/v1/documents/{document_id}/raw_content",
+        "/open-apis/docx/v1/documents/{document_id}/blocks/{block_id}/descendant",
+        "/open-apis/drive/v1/files",
+        "/open-apis/drive/v1/files/create_folder",
+        "/open-apis/drive/v1/files/{file_token}",
+        "/open-apis/drive/v1/metas/batch_query",
+        "/open-apis/drive/v1/permissions/{token}/members",
+        "/open-apis/wiki/v2/spaces/get_node",
+        "/open-apis/wiki/v2/spaces/{space_id}/nodes",
+        "/open-apis/im/v1/messages",
+    ]
+)
+
 
 class FeishuBaseClient:
     """
@@ -26,6 +48,7 @@ class FeishuBaseClient:
     负责：
     - Tenant Access Token 获取与缓存
     - HTTP 请求封装（带认证、日志、错误处理）
+    - 文档 / 知识库节点元数据的 TTL 缓存（meta_cache），各子客户端共享
     """
 
     FEISHU_HOST = "https://open.feishu.cn"
@@ -36,11 +59,15 @@ class FeishuBaseClient:
         self._tenant_token: Optional[str] = None
         self._tenant_token_expire_at: float = 0.0
         self._token_lock = asyncio.Lock()
+        self.meta_cache = TTLCache(ttl_s=self.settings.FEISHU_META_CACHE_TTL_S)
 
     async def get_tenant_access_token(self) -> str:
         """
         获取并缓存 tenant_access_token，带有简单的 TTL 控制。
         """
+        # 快路径：token 有效时不进锁，批量并发请求不在锁上排队
+        if self._tenant_token and time.time() < self._tenant_token_expire_at - 60:
+            return self._tenant_token
         async with self._token_lock:
             if self._tenant_token and time.time() < self._tenant_token_expire_at - 60:
                 return self._tenant_token
@@ -83,6 +110,10 @@ class FeishuBaseClient:
             )
             return token
 
+    async def close(self) -> None:
+        """关闭底层连接池（应用停机时调用）。"""
+        await self._client.aclose()
+
     async def exchange_code_for_user_token(self, code: str) -> Dict[str, Any]:
         """
         用云文档小组件登录返回的 code 换取用户信息
@@ -204,6 +235,7 @@ class FeishuBaseClient:
         - 请求/响应日志
         - 错误处理
         """
+        record_call("feishu")
         token = await self.get_tenant_access_token()
         # Token 打码（用于日志）
         masked_token = f"{token[:4]}...{token[-4:]}" if len(token) > 8 else "***"
@@ -254,13 +286,21 @@ class FeishuBaseClient:
             body_summary or None,
         )
 
-        resp = await self._client.request(
-            method,
-            path,
-            params=params,
-            json=json,
-            headers=headers,
-        )
+        template = FEISHU_ROUTES.match(path)
+        started = time.perf_counter()
+        try:
+            resp = await self._client.request(
+                method,
+                path,
+                params=params,
+                json=json,
+                headers=headers,
+            )
+        except httpx.HTTPError:
+            FEISHU_ERRORS.inc(template, "0", "network")
+            raise
+        finally:
+            FEISHU_REQUEST_SECONDS.observe(time.perf_counter() - started, method, template)
         
         # 调试日志：打印响应状态和关键字段
         logger.info(
@@ -280,6 +320,7 @@ class FeishuBaseClient:
                 resp.status_code,
                 resp.text[:200],
             )
+            FEISHU_ERRORS.inc(template, str(resp.status_code), "non_json")
             raise FeishuAPIError(
                 f"Feishu API returned non-JSON response. Status: {resp.status_code}, Body: {resp.text[:200]}",
                 status_code=resp.status_code,
@@ -307,8 +348,10 @@ class FeishuBaseClient:
                 resp_msg,
                 data,
             )
+            FEISHU_ERRORS.inc(template, str(resp.status_code), str(resp_code))
             raise FeishuAPIError(
                 f"Feishu API error path={path}, status={resp.status_code}, data={data}",
                 status_code=resp.status_code,
+                code=resp_code if isinstance(resp_code, int) else None,
             )
         return data
@@ -0,0 +1,55 @@
+"""
+飞书元数据的进程内 TTL 缓存
+"""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    带过期时间的 LRU 缓存（单事件循环内使用，无需加锁）。
+
+    - 读取时惰性淘汰过期条目；超出 max_entries 时淘汰最久未使用的条目
+    - 缓存的值按只读约定共享，调用方不要原地修改
+    """
+
+    def __init__(self, *, ttl_s: float, max_entries: int = 4096) -> None:
+        self._ttl_s = ttl_s
+        self._max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, *, ttl_s: float | None = None) -> None:
+        if self._ttl_s <= 0 and ttl_s is None:
+            return
+        expire_at = time.monotonic() + (self._ttl_s if ttl_s is None else ttl_s)
+        self._entries[key] = (expire_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl_s": self._ttl_s,
+        }
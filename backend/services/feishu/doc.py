@@ -28,16 +28,23 @@ class FeishuDocClient:
     def __init__(self, base: "FeishuBaseClient") -> None:
         self._base = base
     
-    async def get_meta(self, doc_token: str) -> Dict[str, Any]:
+    async def get_meta(self, doc_token: str, *, use_cache: bool = True) -> Dict[str, Any]:
         """
-        获取文档元数据（title 等，但不包含 parent_token）
+        获取文档元数据（title、revision_id 等，但不包含 parent_token）
         
         注意：docx API 不返回父文件夹信息，如需获取请使用 drive.get_file_meta()
+        use_cache=False 时跳过缓存（如需要最新 revision_id），结果仍会刷新缓存
         """
+        cache_key = ("docx_meta", doc_token)
+        cached = self._base.meta_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            return cached
         data = await self._base.request(
             "GET", f"/open-apis/docx/v1/documents/{doc_token}"
         )
-        return data.get("data", {}).get("document", {})
+        document = data.get("data", {}).get("document", {})
+        self._base.meta_cache.set(cache_key, document)
+        return document
     
     async def get_content(self, doc_token: str) -> str:
         """获取文档纯文本内容"""
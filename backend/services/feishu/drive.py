@@ -4,7 +4,8 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, TYPE_CHECKING
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from backend.services.feishu.base import FeishuBaseClient
@@ -34,8 +35,10 @@ class FeishuDriveClient:
     
     提供云盘相关操作：
     - 获取文件元数据（包含 parent_token）
+    - 列出 / 递归遍历文件夹内容（分页）
     - 创建文件夹
     - 在文件夹中创建文档
+    - 删除文件（任务取消时清理已创建的子文档）
     """
     
     def __init__(self, base: "FeishuBaseClient") -> None:
@@ -58,6 +61,10 @@ class FeishuDriveClient:
             - owner_id: 所有者 ID
             - url: 文件访问链接（如果 with_url=True）
         """
+        cache_key = ("drive_meta", file_token, file_type, with_url)
+        cached = self._base.meta_cache.get(cache_key)
+        if cached is not None:
+            return cached
         payload = {
             "request_docs": [
                 {
@@ -99,6 +106,7 @@ class FeishuDriveClient:
             meta.get("parent_token"),
             meta.get("type"),
         )
+        self._base.meta_cache.set(cache_key, meta)
         return meta
     
     async def list_files(
@@ -109,7 +117,7 @@ class FeishuDriveClient:
         type_filter: str | None = None,
     ) -> list[Dict[str, Any]]:
         """
-        获取指定文件夹下的文件清单（仅当前层级）
+        获取指定文件夹下的文件清单（仅当前层级，自动翻页取完）
         
         API: GET /drive/v1/files
         
@@ -128,12 +136,19 @@ class FeishuDriveClient:
         if type_filter:
             params["type"] = type_filter
         
-        data = await self._base.request(
-            "GET",
-            "/open-apis/drive/v1/files",
-            params=params,
-        )
-        files = data.get("data", {}).get("files", [])
+        files: list[Dict[str, Any]] = []
+        while True:
+            data = await self._base.request(
+                "GET",
+                "/open-apis/drive/v1/files",
+                params=params,
+            )
+            page = data.get("data", {})
+            files.extend(page.get("files", []))
+            next_token = page.get("next_page_token")
+            if not page.get("has_more") or not next_token:
+                break
+            params["page_token"] = next_token
         logger.info(
             "list_files succeeded: folder=%s, type=%s, count=%s",
             folder_token or "(root)",
@@ -141,6 +156,40 @@ class FeishuDriveClient:
             len(files),
         )
         return files
+
+    async def walk_docs(
+        self,
+        folder_token: str,
+        *,
+        recursive: bool = True,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        列出文件夹（可递归子文件夹）下的 docx 文档，按广度优先顺序返回，最多 limit 个。
+
+        跳过与同层文档同名的子文件夹：那是本服务为该文档创建的输出文件夹，里面是生成的子文档。
+        输出文件夹的 token 只记录在各任务的断点中，无法按文件夹反查，因此按名称判断；
+        用户自建的同名文件夹也会被跳过，每个被跳过的文件夹都会记录日志。
+        """
+        docs: List[Dict[str, Any]] = []
+        pending: Deque[str] = deque([folder_token])
+        while pending and (limit is None or len(docs) < limit):
+            files = await self.list_files(folder_token=pending.popleft())
+            titles = {f.get("name") for f in files if f.get("type") == "docx"}
+            for item in files:
+                if item.get("type") == "docx":
+                    docs.append(item)
+                elif recursive and item.get("type") == "folder":
+                    if item.get("name") in titles:
+                        logger.info(
+                            "walk_docs skipped folder named after a sibling doc (treated as output folder): "
+                            "name=%s, token=%s",
+                            item.get("name"),
+                            item.get("token"),
+                        )
+                        continue
+                    pending.append(item["token"])
+        return docs if limit is None else docs[:limit]
     
     async def create_folder(
         self, *, parent_folder_token: str, name: str
@@ -217,6 +266,24 @@ class FeishuDriveClient:
         )
         return str(doc_token)
     
+    async def delete_file(self, file_token: str, *, file_type: str = "docx") -> None:
+        """
+        删除云盘文件（移入回收站）
+
+        API: DELETE /drive/v1/files/{file_token}?type={file_type}
+        参数:
+            - file_token: 文件 token
+            - file_type: 文件类型（docx, sheet, folder 等）
+
+        注意：仅支持云盘文件，知识库节点不能通过该接口删除
+        """
+        await self._base.request(
+            "DELETE",
+            f"/open-apis/drive/v1/files/{file_token}",
+            params={"type": file_type},
+        )
+        logger.info("delete_file succeeded: token=%s, type=%s", file_token, file_type)
+
     async def add_permission(
         self,
         *,
@@ -7,8 +7,13 @@ from typing import Optional
 class FeishuAPIError(Exception):
     """
     统一的飞书 API 异常。
+
+    status_code 为 HTTP 状态码；code 为响应体中的飞书错误码（飞书常以 HTTP 200 + 非 0 code 返回业务错误）。
     """
 
-    def __init__(self, message: str, *, status_code: Optional[int] = None) -> None:
+    def __init__(
+        self, message: str, *, status_code: Optional[int] = None, code: Optional[int] = None
+    ) -> None:
         super().__init__(message)
         self.status_code = status_code
+        self.code = code
@@ -4,7 +4,8 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, Optional, TYPE_CHECKING
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from backend.services.feishu.base import FeishuBaseClient
@@ -13,6 +14,21 @@ from backend.services.feishu.errors import FeishuAPIError
 
 logger = logging.getLogger(__name__)
 
+# 旧版文档 token 前缀（doccn / doxcn），一定不是知识库节点，解析时跳过 wiki 查询
+_DOC_TOKEN_PREFIXES = ("doccn", "doxcn")
+
+# 飞书限频错误码（可能随 HTTP 200 / 400 返回），节点查询失败时不缓存
+_RATE_LIMIT_CODES = frozenset({99991400})
+
+
+@dataclass(frozen=True)
+class _NodeMiss:
+    """缓存的节点查询失败结果（不缓存异常对象本身，避免重复 raise 累积 traceback）。"""
+
+    message: str
+    status_code: Optional[int]
+    code: Optional[int]
+
 
 class FeishuWikiClient:
     """
@@ -20,6 +36,7 @@ class FeishuWikiClient:
     
     提供知识库相关操作：
     - 获取节点信息
+    - 列出 / 遍历子节点（分页）
     - 创建子节点/文档
     - Token 解析
     """
@@ -31,16 +48,95 @@ class FeishuWikiClient:
         """
         通过 node_token 获取知识库节点信息（包含 space_id、obj_token 等）。
         需要应用开通 wiki:node:read（或更高）权限。
+
+        结果写入元数据缓存；不是知识库节点（或无权限）的失败结果也短时缓存，期间直接抛出 FeishuAPIError。
         """
-        data = await self._base.request(
-            "GET",
-            "/open-apis/wiki/v2/spaces/get_node",
-            params={"token": node_token},
-        )
+        cache_key = ("wiki_node", node_token)
+        cached = self._base.meta_cache.get(cache_key)
+        if isinstance(cached, _NodeMiss):
+            raise FeishuAPIError(cached.message, status_code=cached.status_code, code=cached.code)
+        if cached is not None:
+            return cached
+        try:
+            data = await self._base.request(
+                "GET",
+                "/open-apis/wiki/v2/spaces/get_node",
+                params={"token": node_token},
+            )
+        except FeishuAPIError as exc:
+            if _is_definite_miss(exc):
+                self._base.meta_cache.set(
+                    cache_key,
+                    _NodeMiss(str(exc), exc.status_code, exc.code),
+                    ttl_s=self._base.settings.FEISHU_NEGATIVE_CACHE_TTL_S,
+                )
+            raise
         node = data.get("data", {}).get("node")
         if not node:
             raise FeishuAPIError(f"Unable to parse wiki node from response: {data}")
+        self._base.meta_cache.set(cache_key, node)
         return node
+
+    async def list_child_nodes(
+        self, *, space_id: str, parent_node_token: str, page_size: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        获取知识库节点的直接子节点（自动翻页取完）。
+
+        API: GET /wiki/v2/spaces/{space_id}/nodes?parent_node_token=...
+        """
+        params: Dict[str, Any] = {
+            "parent_node_token": parent_node_token,
+            "page_size": page_size,
+        }
+        nodes: List[Dict[str, Any]] = []
+        while True:
+            data = await self._base.request(
+                "GET", f"/open-apis/wiki/v2/spaces/{space_id}/nodes", params=params
+            )
+            page = data.get("data", {})
+            nodes.extend(page.get("items", []))
+            next_token = page.get("page_token")
+            if not page.get("has_more") or not next_token:
+                break
+            params["page_token"] = next_token
+        for node in nodes:
+            # 子节点信息与 get_node 返回一致，顺带预热缓存
+            if node.get("node_token"):
+                self._base.meta_cache.set(("wiki_node", node["node_token"]), node)
+        logger.info(
+            "list_child_nodes succeeded: space=%s, parent=%s, count=%s",
+            space_id,
+            parent_node_token,
+            len(nodes),
+        )
+        return nodes
+
+    async def walk_subtree(
+        self,
+        *,
+        node_token: str,
+        recursive: bool = True,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        广度优先遍历知识库子树（包含根节点自身），返回 docx 节点，最多 limit 个。
+        """
+        root = await self.get_node_by_token(node_token=node_token)
+        space_id = str(root.get("space_id") or root.get("spaceId") or "")
+        docs: List[Dict[str, Any]] = []
+        pending: List[Dict[str, Any]] = [root]
+        while pending and (limit is None or len(docs) < limit):
+            node = pending.pop(0)
+            if node.get("obj_type") == "docx":
+                docs.append(node)
+            if node.get("has_child") and (recursive or node is root):
+                pending.extend(
+                    await self.list_child_nodes(
+                        space_id=space_id, parent_node_token=node["node_token"]
+                    )
+                )
+        return docs if limit is None else docs[:limit]
     
     async def resolve_token(
         self, token: str, *, obj_type: str = "docx"
@@ -52,9 +148,12 @@ class FeishuWikiClient:
         - wiki_space_id: 如果是知识库节点则返回
 
         逻辑：
-        1) 尝试按 wiki node 解析（需要 wiki:node:read 权限；若失败则忽略）
-        2) 失败则视为普通 doc_token
+        1) 旧版文档 token（doccn / doxcn 前缀）直接视为 doc_token
+        2) 尝试按 wiki node 解析（需要 wiki:node:read 权限；若失败则忽略，结果由 get_node_by_token 缓存）
+        3) 失败则视为普通 doc_token
         """
+        if token.startswith(_DOC_TOKEN_PREFIXES):
+            return {"doc_token": token, "wiki_node_token": None, "wiki_space_id": None}
         try:
             node = await self.get_node_by_token(node_token=token)
             doc_token = (
@@ -109,3 +208,15 @@ class FeishuWikiClient:
         if not node:
             raise FeishuAPIError(f"Unable to parse wiki node from response: {data}")
         return node
+
+
+def _is_definite_miss(exc: FeishuAPIError) -> bool:
+    """
+    节点查询失败是否可缓存：4xx 与 HTTP 200 + 非 0 飞书错误码（不是知识库节点 / 无权限）可缓存；
+    限流（429 或限频错误码）、服务端错误与网络错误不缓存，下次照常重试。
+    """
+    if exc.status_code == 429 or exc.code in _RATE_LIMIT_CODES:
+        return False
+    if exc.status_code == 200:
+        return bool(exc.code)
+    return exc.status_code is not None and 400 <= exc.status_code < 500
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import asyncio
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any, Dict, Optional
 
 from backend.services.processors.base import ProcessorResult
@@ -12,6 +13,7 @@ except ImportError:  # pragma: no cover
     TYPE_CHECKING = False  # type: ignore[assignment]
 
 if TYPE_CHECKING:
+    from backend.core.checkpoints import StageCheckpoints
     from backend.core.manager import ProcessContext
 
 
@@ -25,6 +27,11 @@ class SourceDoc:
     doc_token: str
     title: str
     parent_token: Optional[str] = None
+    # 产物容器（云盘场景下的同名文件夹）：多模式共享同一个 SourceDoc 时只解析/创建一次
+    container_token: Optional[str] = None
+    container_lock: asyncio.Lock = field(
+        default_factory=asyncio.Lock, repr=False, compare=False
+    )
 
 
 @dataclass
@@ -48,6 +55,7 @@ class BaseOutputHandler(ABC):
 
     - 输入：ProcessContext + 原文档信息 + ProcessorResult
     - 输出：OutputResult（可包含子文档链接、消息 id、外部系统回执等）
+    - checkpoints：可选的阶段断点；实现方应记录已创建的外部资源，重试时跳过已完成的步骤
     """
 
     @abstractmethod
@@ -58,7 +66,25 @@ class BaseOutputHandler(ABC):
         source_doc: SourceDoc,
         processor_result: ProcessorResult,
         notify_user: bool = True,
+        checkpoints: "StageCheckpoints | None" = None,
     ) -> OutputResult:
         raise NotImplementedError
 
+    async def cleanup(
+        self,
+        *,
+        ctx: "ProcessContext",
+        checkpoints: "StageCheckpoints",
+    ) -> None:
+        """
+        任务被取消时撤销 handle 已创建的外部资源（依据 checkpoints 中记录的资源）；默认无操作。
+        """
+        _ = ctx
+        _ = checkpoints
+
+    async def close(self) -> None:
+        """
+        释放输出策略持有的资源（如 HTTP 连接池）；默认无操作。
+        """
+
 
@@ -4,6 +4,8 @@ import asyncio
 import logging
 from typing import Any, Dict, TYPE_CHECKING
 
+from backend.core.checkpoints import StageCheckpoints
+from backend.core.timeline import mark_stage
 from backend.services.feishu import FeishuClient
 from backend.services.outputs.base import BaseOutputHandler, OutputResult, SourceDoc
 from backend.services.processors.base import ProcessorResult
@@ -40,29 +42,40 @@ class FeishuChildDocOutputHandler(BaseOutputHandler):
         source_doc: SourceDoc,
         processor_result: ProcessorResult,
         notify_user: bool = True,
+        checkpoints: StageCheckpoints | None = None,
     ) -> OutputResult:
-        # 智能标题生成：如果原标题包含"未命名"，则调用 AI 生成标题
-        title = processor_result.title or f"{source_doc.title} - AI 生成"
-        # 智能标题生成触发条件：空标题or包含"未命名"
-                # if "未命名" in title:
-        if not title or "未命名" in title:
-            logger.info("检测到未命名文档，启动智能标题生成")
-            try:
-                title = await self._title_generator.generate_title(
-                    content_md=processor_result.content_md,
-                    mode=ctx.mode,
-                    original_doc_title=source_doc.title,
-                )
-                logger.info("智能生成标题: %s", title)
-            except Exception as exc:
-                logger.warning("标题生成失败，使用默认标题: %s", exc)
-                # title 保持原值（fallback 已在 TitleGenerator 内部处理）
+        # 断点：重试时复用已生成的标题 / 已创建的子文档，跳过已完成的写入与回链
+        cps = checkpoints or StageCheckpoints()
+
+        saved_title = cps.get("output.title")
+        if saved_title:
+            title = saved_title["title"]
+            logger.info("复用断点中的标题: %s", title)
         else:
-            logger.info("使用默认标题: %s", title)
+            # 智能标题生成：如果原标题包含"未命名"，则调用 AI 生成标题
+            title = processor_result.title or f"{source_doc.title} - AI 生成"
+            # 智能标题生成触发条件：空标题or包含"未命名"
+                    # if "未命名" in title:
+            if not title or "未命名" in title:
+                logger.info("检测到未命名文档，启动智能标题生成")
+                mark_stage("output_title")
+                try:
+                    title = await self._title_generator.generate_title(
+                        content_md=processor_result.content_md,
+                        mode=ctx.mode,
+                        original_doc_title=source_doc.title,
+                    )
+                    logger.info("智能生成标题: %s", title)
+                except Exception as exc:
+                    logger.warning("标题生成失败，使用默认标题: %s", exc)
+                    # title 保持原值（fallback 已在 TitleGenerator 内部处理）
+            else:
+                logger.info("使用默认标题: %s", title)
         
-        # 添加模式标签（如 [思路扩展]），但避免重复添加模式名称
-        title = self._add_mode_label(title, ctx.mode)
-        logger.info("添加标签后的最终标题: %s", title)
+            # 添加模式标签（如 [思路扩展]），但避免重复添加模式名称
+            title = self._add_mode_label(title, ctx.mode)
+            logger.info("添加标签后的最终标题: %s", title)
+            await cps.save("output.title", {"title": title})
 
         # 1) 知识库优先：如果前端/触发方提供了 wiki_node_token，则走知识库创建子节点
         wiki_node: Dict[str, Any] | None = None
@@ -81,132 +94,172 @@ class FeishuChildDocOutputHandler(BaseOutputHandler):
 
         if wiki_node_token:
             # === 知识库路径 ===
-            if not wiki_space_id:
-                wiki_node = await self._feishu.get_wiki_node_by_token(node_token=wiki_node_token)
-                wiki_space_id = str(wiki_node.get("space_id") or "")
-            if not wiki_space_id:
-                raise RuntimeError("Missing wiki_space_id (cannot create child node)")
-
-            child_node = await self._feishu.create_wiki_child_doc(
-                space_id=wiki_space_id,
-                parent_node_token=wiki_node_token,
-                title=title,
-                obj_type="docx",
-                node_type="origin",
-            )
+            saved_child = cps.get("output.child_doc")
+            created = cps.get("output.created")
+            if saved_child:
+                child_doc_token = saved_child["child_doc_token"]
+                child_doc_url = saved_child["child_doc_url"]
+                wiki_space_id = saved_child.get("wiki_space_id")
+                permission_granted = bool(saved_child.get("permission_granted"))
+                logger.info("复用断点中已创建的 Wiki 子文档: obj_token=%s", child_doc_token)
+            elif created:
+                # 上次在子节点创建后、授权完成前中断：复用已创建的子节点，只补做授权
+                child_doc_token = created["child_doc_token"]
+                child_node_token = created["child_node_token"]
+                wiki_space_id = created.get("wiki_space_id") or wiki_space_id
+                logger.info("复用断点中已创建的 Wiki 子文档（补做授权）: obj_token=%s", child_doc_token)
+            else:
+                mark_stage("output_create")
+                if not wiki_space_id:
+                    wiki_node = await self._feishu.get_wiki_node_by_token(node_token=wiki_node_token)
+                    wiki_space_id = str(wiki_node.get("space_id") or "")
+                if not wiki_space_id:
+                    raise RuntimeError("Missing wiki_space_id (cannot create child node)")
 
-            child_obj_token = (
-                child_node.get("obj_token")
-                or child_node.get("objToken")
-                or child_node.get("document_id")
-                or child_node.get("doc_token")
-            )
-            child_node_token = (
-                child_node.get("node_token")
-                or child_node.get("nodeToken")
-                or child_node.get("token")
-            )
-            if not child_obj_token or not child_node_token:
-                raise RuntimeError(
-                    "Unable to parse wiki child node from response. "
-                    f"expect obj_token/node_token, got: {child_node}"
+                child_node = await self._feishu.create_wiki_child_doc(
+                    space_id=wiki_space_id,
+                    parent_node_token=wiki_node_token,
+                    title=title,
+                    obj_type="docx",
+                    node_type="origin",
                 )
 
-            child_doc_token = str(child_obj_token)
-            child_doc_url = self._build_wiki_url(str(child_node_token))
+                child_obj_token = (
+                    child_node.get("obj_token")
+                    or child_node.get("objToken")
+                    or child_node.get("document_id")
+                    or child_node.get("doc_token")
+                )
+                child_node_token = (
+                    child_node.get("node_token")
+                    or child_node.get("nodeToken")
+                    or child_node.get("token")
+                )
+                if not child_obj_token or not child_node_token:
+                    raise RuntimeError(
+                        "Unable to parse wiki child node from response. "
+                        f"expect obj_token/node_token, got: {child_node}"
+                    )
 
-            logger.info(
-                "Wiki child created: node_token=%s obj_token=%s space_id=%s parent_node=%s",
-                child_node_token,
-                child_doc_token,
-                wiki_space_id,
-                wiki_node_token,
-            )
-            
-            # 添加用户权限（知识库：edit + container）
-            perm_ok, perm_err = await self._grant_permission_safe(
-                token=child_node_token,
-                file_type="wiki",
-                user_id=ctx.user_id,
-                perm="edit",
-                perm_type="container",
-            )
-            permission_granted = perm_ok
-            if perm_err:
-                permission_errors.append(perm_err)
+                child_doc_token = str(child_obj_token)
+                # 先登记已创建的资源：任务在授权 / 写入期间被取消时据此清理，中断后重试时据此复用
+                await cps.save(
+                    "output.created",
+                    {
+                        "child_doc_token": child_doc_token,
+                        "child_node_token": str(child_node_token),
+                        "wiki_space_id": wiki_space_id,
+                    },
+                )
 
-            # 部分场景下新建文档的 docx 接口存在短暂可见性延迟，等待片刻再写内容
-            await asyncio.sleep(5.0)
+                logger.info(
+                    "Wiki child created: node_token=%s obj_token=%s space_id=%s parent_node=%s",
+                    child_node_token,
+                    child_doc_token,
+                    wiki_space_id,
+                    wiki_node_token,
+                )
 
-            # 写入内容（写内容始终走 docx obj_token）
-            # 追加元数据到文档末尾
-            from backend.services.utils.metadata_builder import build_metadata_section
+            if not saved_child:
+                child_doc_url = self._build_wiki_url(str(child_node_token))
+                # 添加用户权限（知识库：edit + container）
+                perm_ok, perm_err = await self._grant_permission_safe(
+                    token=child_node_token,
+                    file_type="wiki",
+                    user_id=ctx.user_id,
+                    perm="edit",
+                    perm_type="container",
+                )
+                permission_granted = perm_ok
+                if perm_err:
+                    permission_errors.append(perm_err)
+                await cps.save(
+                    "output.child_doc",
+                    {
+                        "child_doc_token": child_doc_token,
+                        "child_doc_url": child_doc_url,
+                        "child_node_token": str(child_node_token),
+                        "wiki_space_id": wiki_space_id,
+                        "permission_granted": permission_granted,
+                    },
+                )
+
+                if not created:
+                    # 部分场景下新建文档的 docx 接口存在短暂可见性延迟，等待片刻再写内容
+                    await asyncio.sleep(5.0)
+
+            if not cps.has("output.content"):
+                mark_stage("output_write")
+                # 写入内容（写内容始终走 docx obj_token）
+                # 追加元数据到文档末尾
+                from backend.services.utils.metadata_builder import build_metadata_section
             
-            # 构建元数据（包含原始内容）
-            metadata = build_metadata_section(
-                mode=ctx.mode,
-                source_title=source_doc.title,
-                source_url=f"https://feishu.cn/wiki/{wiki_node_token}",  # 知识库链接
-                original_content=ctx.original_content,
-                trigger_source=ctx.trigger_source,
-            )
-            final_content = processor_result.content_md + metadata
-            await self._feishu.write_doc_content(child_doc_token, final_content)
+                # 构建元数据（包含原始内容）
+                metadata = build_metadata_section(
+                    mode=ctx.mode,
+                    source_title=source_doc.title,
+                    source_url=f"https://feishu.cn/wiki/{wiki_node_token}",  # 知识库链接
+                    original_content=ctx.original_content,
+                    trigger_source=ctx.trigger_source,
+                )
+                final_content = processor_result.content_md + metadata
+                await self._feishu.write_doc_content(child_doc_token, final_content)
+                await cps.save("output.content", {})
         else:
             # === 云盘路径 ===
             # 飞书官方建议的流程：
             # 1. 在原文档同级目录（或根目录）创建同名文件夹
             # 2. 在新文件夹中创建子文档
             
-            # 确定父文件夹 token（None 或空字符串表示根目录）
-            parent_folder = source_doc.parent_token or ""
-            
-            logger.info(
-                "云盘场景：准备创建同名文件夹 parent_folder=%s, folder_name=%s",
-                parent_folder or "(root)",
-                source_doc.title,
-            )
-            
-            # 1) 先查询同级目录下是否已有同名文件夹
-            existing_folders = await self._feishu.drive.list_files(
-                folder_token=parent_folder,
-                page_size=200,
-                type_filter="folder",
-            )
-            new_folder_token: str | None = None
-            for item in existing_folders:
-                item_name = item.get("name") or item.get("title")
-                item_token = item.get("token")
-                if item_name == source_doc.title and item_token:
-                    new_folder_token = str(item_token)
-                    folder_name = item_name  # 记录复用的文件夹名
-                    logger.info(
-                        "发现同名文件夹已存在，将复用: token=%s, name=%s",
-                        new_folder_token,
-                        folder_name,
+            saved_child = cps.get("output.child_doc")
+            created = cps.get("output.created")
+            if saved_child:
+                child_doc_token = saved_child["child_doc_token"]
+                child_doc_url = saved_child["child_doc_url"]
+                folder_token = saved_child.get("folder_token")
+                folder_name = saved_child.get("folder_name")
+                permission_granted = bool(saved_child.get("permission_granted"))
+                logger.info("复用断点中已创建的云盘子文档: doc_token=%s", child_doc_token)
+            elif created:
+                # 上次在子文档创建后、授权完成前中断：复用已创建的子文档，只补做授权
+                child_doc_token = created["child_doc_token"]
+                folder_token = created.get("folder_token")
+                folder_name = created.get("folder_name")
+                logger.info("复用断点中已创建的云盘子文档（补做授权）: doc_token=%s", child_doc_token)
+                folder_perm_ok = True
+                if folder_token:
+                    folder_perm_ok, folder_perm_err = await self._grant_permission_safe(
+                        token=folder_token,
+                        file_type="folder",
+                        user_id=ctx.user_id,
+                        perm="view",
                     )
-                    break
+                    if folder_perm_err:
+                        permission_errors.append(folder_perm_err)
+            else:
+                mark_stage("output_create")
+                # 确定父文件夹 token（None 或空字符串表示根目录）
+                parent_folder = source_doc.parent_token or ""
             
-            # 如未找到同名文件夹，则创建新文件夹
-            if not new_folder_token:
-                try:
-                    new_folder_token = await self._feishu.drive.create_folder(
-                        parent_folder_token=parent_folder,
-                        name=source_doc.title,
-                    )
-                    folder_name = source_doc.title  # 记录实际创建的文件夹名
-                    logger.info(
-                        "成功创建文件夹：%s，现在在其中创建子文档",
-                        new_folder_token,
-                    )
-                except Exception as e:
-                    # 检查是否是“文件夹已存在”错误（1062505）——可能是并发场景下其他请求刚创建了同名文件夹
-                    error_str = str(e)
-                    if "1062505" in error_str or "folder already exists" in error_str.lower():
+                logger.info(
+                    "云盘场景：准备创建同名文件夹 parent_folder=%s, folder_name=%s",
+                    parent_folder or "(root)",
+                    source_doc.title,
+                )
+            
+                # 同一 SourceDoc 的多个模式共享一个文件夹：加锁，避免并发重复查询/创建
+                async with source_doc.container_lock:
+                    new_folder_token: str | None = source_doc.container_token
+                    folder_perm_ok = True
+                    if new_folder_token:
+                        folder_name = source_doc.title
                         logger.info(
-                            "检测到同名文件夹已存在，重新查询以获取现有文件夹 token，name=%s",
-                            source_doc.title,
+                            "复用本次触发已解析的文件夹: token=%s, name=%s",
+                            new_folder_token,
+                            folder_name,
                         )
+                    else:
+                        # 1) 先查询同级目录下是否已有同名文件夹
                         existing_folders = await self._feishu.drive.list_files(
                             folder_token=parent_folder,
                             page_size=200,
@@ -217,83 +270,150 @@ class FeishuChildDocOutputHandler(BaseOutputHandler):
                             item_token = item.get("token")
                             if item_name == source_doc.title and item_token:
                                 new_folder_token = str(item_token)
-                                folder_name = item_name
+                                folder_name = item_name  # 记录复用的文件夹名
                                 logger.info(
-                                    "复用现有同名文件夹: token=%s, name=%s",
+                                    "发现同名文件夹已存在，将复用: token=%s, name=%s",
                                     new_folder_token,
                                     folder_name,
                                 )
                                 break
-                        if not new_folder_token:
-                            # 理论上不应发生：返回“已存在”但又查不到；此时向上抛出便于排查
-                            raise
-                    else:
-                        # 其他错误，直接抛出
-                        raise
-            # 保存文件夹信息供后续返回
-            folder_token = new_folder_token
-            
-            # 添加文件夹权限（云盘：view）
-            folder_perm_ok, folder_perm_err = await self._grant_permission_safe(
-                token=new_folder_token,
-                file_type="folder",
-                user_id=ctx.user_id,
-                perm="view",
-            )
-            if folder_perm_err:
-                permission_errors.append(folder_perm_err)
-            
-            # 2) 在新文件夹中创建子文档
-            child_doc_token = await self._feishu.drive.create_doc(
-                folder_token=new_folder_token,
-                title=title,
-            )
-            child_doc_url = self._build_doc_url(child_doc_token)
             
-            # 添加文档权限（云盘：view）
-            doc_perm_ok, doc_perm_err = await self._grant_permission_safe(
-                token=child_doc_token,
-                file_type="docx",
-                user_id=ctx.user_id,
-                perm="view",
-            )
-            if doc_perm_err:
-                permission_errors.append(doc_perm_err)
+                        # 如未找到同名文件夹，则创建新文件夹
+                        if not new_folder_token:
+                            try:
+                                new_folder_token = await self._feishu.drive.create_folder(
+                                    parent_folder_token=parent_folder,
+                                    name=source_doc.title,
+                                )
+                                folder_name = source_doc.title  # 记录实际创建的文件夹名
+                                logger.info(
+                                    "成功创建文件夹：%s，现在在其中创建子文档",
+                                    new_folder_token,
+                                )
+                            except Exception as e:
+                                # 检查是否是“文件夹已存在”错误（1062505）——可能是并发场景下其他请求刚创建了同名文件夹
+                                error_str = str(e)
+                                if "1062505" in error_str or "folder already exists" in error_str.lower():
+                                    logger.info(
+                                        "检测到同名文件夹已存在，重新查询以获取现有文件夹 token，name=%s",
+                                        source_doc.title,
+                                    )
+                                    existing_folders = await self._feishu.drive.list_files(
+                                        folder_token=parent_folder,
+                                        page_size=200,
+                                        type_filter="folder",
+                                    )
+                                    for item in existing_folders:
+                                        item_name = item.get("name") or item.get("title")
+                                        item_token = item.get("token")
+                                        if item_name == source_doc.title and item_token:
+                                            new_folder_token = str(item_token)
+                                            folder_name = item_name
+                                            logger.info(
+                                                "复用现有同名文件夹: token=%s, name=%s",
+                                                new_folder_token,
+                                                folder_name,
+                                            )
+                                            break
+                                    if not new_folder_token:
+                                        # 理论上不应发生：返回“已存在”但又查不到；此时向上抛出便于排查
+                                        raise
+                                else:
+                                    # 其他错误，直接抛出
+                                    raise
+                        # 添加文件夹权限（云盘：view）
+                        folder_perm_ok, folder_perm_err = await self._grant_permission_safe(
+                            token=new_folder_token,
+                            file_type="folder",
+                            user_id=ctx.user_id,
+                            perm="view",
+                        )
+                        if folder_perm_err:
+                            permission_errors.append(folder_perm_err)
+                        source_doc.container_token = new_folder_token
+                # 保存文件夹信息供后续返回
+                folder_token = new_folder_token
+
+                # 2) 在新文件夹中创建子文档
+                child_doc_token = await self._feishu.drive.create_doc(
+                    folder_token=new_folder_token,
+                    title=title,
+                )
+                await cps.save(
+                    "output.created",
+                    {
+                        "child_doc_token": child_doc_token,
+                        "folder_token": folder_token,
+                        "folder_name": folder_name,
+                    },
+                )
+
+            if not saved_child:
+                child_doc_url = self._build_doc_url(child_doc_token)
+                # 添加文档权限（云盘：view）
+                doc_perm_ok, doc_perm_err = await self._grant_permission_safe(
+                    token=child_doc_token,
+                    file_type="docx",
+                    user_id=ctx.user_id,
+                    perm="view",
+                )
+                if doc_perm_err:
+                    permission_errors.append(doc_perm_err)
             
-            # 权限添加状态：两个都成功才算成功
-            permission_granted = folder_perm_ok and doc_perm_ok
+                # 权限添加状态：两个都成功才算成功
+                permission_granted = folder_perm_ok and doc_perm_ok
             
-            # 追加元数据到文档末尾
-            from backend.services.utils.metadata_builder import build_metadata_section
+                await cps.save(
+                    "output.child_doc",
+                    {
+                        "child_doc_token": child_doc_token,
+                        "child_doc_url": child_doc_url,
+                        "folder_token": folder_token,
+                        "folder_name": folder_name,
+                        "permission_granted": permission_granted,
+                    },
+                )
+
+            if not cps.has("output.content"):
+                mark_stage("output_write")
+                # 追加元数据到文档末尾
+                from backend.services.utils.metadata_builder import build_metadata_section
             
-            metadata = build_metadata_section(
-                mode=ctx.mode,
-                source_title=source_doc.title,
-                source_url=self._build_doc_url(source_doc.doc_token),
-                original_content=ctx.original_content,
-                trigger_source=ctx.trigger_source,
-            )
-            final_content = processor_result.content_md + metadata
-            await self._feishu.write_doc_content(child_doc_token, final_content)
+                metadata = build_metadata_section(
+                    mode=ctx.mode,
+                    source_title=source_doc.title,
+                    source_url=self._build_doc_url(source_doc.doc_token),
+                    original_content=ctx.original_content,
+                    trigger_source=ctx.trigger_source,
+                )
+                final_content = processor_result.content_md + metadata
+                await self._feishu.write_doc_content(child_doc_token, final_content)
+                await cps.save("output.content", {})
 
         # 2) 回链到原文档末尾（原文档可为 Wiki 挂载的 docx，仍可用 docx blocks 接口）
         # 注意：回链可能失败（如应用无编辑原文档权限），不影响主流程
-        try:
-            await self._feishu.append_reference_block(
-                source_doc.doc_token, title, child_doc_url
-            )
-            logger.info("成功在原文档末尾添加回链引用")
+        if cps.has("output.backlink"):
             backlink_success = True
-        except Exception as e:
-            error_msg = str(e)
-            backlink_error = error_msg
-            logger.warning(
-                "回链到原文档失败（应用可能无编辑权限），但主流程已完成: %s",
-                error_msg,
-            )
+        else:
+            mark_stage("output_backlink")
+            try:
+                await self._feishu.append_reference_block(
+                    source_doc.doc_token, title, child_doc_url
+                )
+                logger.info("成功在原文档末尾添加回链引用")
+                backlink_success = True
+                await cps.save("output.backlink", {})
+            except Exception as e:
+                error_msg = str(e)
+                backlink_error = error_msg
+                logger.warning(
+                    "回链到原文档失败（应用可能无编辑权限），但主流程已完成: %s",
+                    error_msg,
+                )
 
         # 可选通知
         if notify_user:
+            mark_stage("notify")
             # 生成预览文本（使用智能模式 + 降级）
             preview_text = await self._preview_generator.generate_preview(
                 content_md=processor_result.content_md,
@@ -344,6 +464,26 @@ class FeishuChildDocOutputHandler(BaseOutputHandler):
             },
         )
 
+    async def cleanup(self, *, ctx: "ProcessContext", checkpoints: StageCheckpoints) -> None:
+        """
+        任务取消时删除本次创建的云盘子文档（同名文件夹可能被其他模式 / 历史任务共用，保留）。
+        知识库子节点无法通过开放接口删除，仅记录日志。
+        """
+        created = checkpoints.get("output.child_doc") or checkpoints.get("output.created")
+        if not created:
+            return
+        child_doc_token = created["child_doc_token"]
+        if created.get("child_node_token"):
+            logger.warning(
+                "任务已取消，知识库子节点需手动删除: node_token=%s obj_token=%s doc=%s",
+                created["child_node_token"],
+                child_doc_token,
+                ctx.doc_token,
+            )
+            return
+        await self._feishu.drive.delete_file(child_doc_token, file_type="docx")
+        logger.info("任务已取消，已删除子文档: doc_token=%s", child_doc_token)
+
     def _build_doc_url(self, doc_token: str) -> str:
         return f"https://feishu.cn/docx/{doc_token}"
 
@@ -4,6 +4,7 @@ from typing import Any, Dict, Optional
 
 import httpx
 
+from backend.core.checkpoints import StageCheckpoints
 from backend.core.manager import ProcessContext
 from backend.services.outputs.base import BaseOutputHandler, OutputResult, SourceDoc
 from backend.services.processors.base import ProcessorResult
@@ -15,6 +16,7 @@ class WebhookOutputHandler(BaseOutputHandler):
 
     - 不创建飞书子文档，因此 OutputResult.child_doc_* 为 None
     - 将关键字段作为 JSON 推送：mode/doc_token/title/content_md/summary/metadata
+    - 实例由 ProcessManager 按 mode 缓存复用，连接池在停机时由 close 关闭
     """
 
     def __init__(
@@ -25,8 +27,11 @@ class WebhookOutputHandler(BaseOutputHandler):
         headers: Optional[Dict[str, str]] = None,
     ) -> None:
         self._url = webhook_url
-        self._timeout = timeout_s
         self._headers = headers or {}
+        self._client = httpx.AsyncClient(timeout=timeout_s)
+
+    async def close(self) -> None:
+        await self._client.aclose()
 
     async def handle(
         self,
@@ -35,9 +40,23 @@ class WebhookOutputHandler(BaseOutputHandler):
         source_doc: SourceDoc,
         processor_result: ProcessorResult,
         notify_user: bool = True,
+        checkpoints: StageCheckpoints | None = None,
     ) -> OutputResult:
         _ = notify_user  # webhook 输出一般不“通知用户”，这里保留参数以统一接口
 
+        # 已推送成功（后续阶段失败重试）时不重复推送
+        pushed = checkpoints.get("output.webhook") if checkpoints else None
+        if pushed:
+            return OutputResult(
+                child_doc_token=None,
+                child_doc_url=None,
+                metadata={
+                    "output": "webhook",
+                    "webhook_url": self._url,
+                    "http_status": pushed.get("http_status"),
+                },
+            )
+
         payload: Dict[str, Any] = {
             "mode": ctx.mode,
             "trigger_source": ctx.trigger_source,
@@ -55,9 +74,11 @@ class WebhookOutputHandler(BaseOutputHandler):
             },
         }
 
-        async with httpx.AsyncClient(timeout=self._timeout) as client:
-            resp = await client.post(self._url, json=payload, headers=self._headers)
-            resp.raise_for_status()
+        resp = await self._client.post(self._url, json=payload, headers=self._headers)
+        resp.raise_for_status()
+
+        if checkpoints:
+            await checkpoints.save("output.webhook", {"http_status": resp.status_code})
 
         return OutputResult(
             child_doc_token=None,
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from backend.core.manager import ProcessContext
+from backend.services.triggers.pool import QueueFullError
+from backend.services.triggers.service import ServiceDrainingError
+
+logger = logging.getLogger(__name__)
+
+TriggerFn = Callable[[ProcessContext], Awaitable[str]]
+
+
+@dataclass
+class _Pending:
+    ctx: ProcessContext
+    first_at: float
+    events: int
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class EventDebouncer:
+    """
+    事件触发的防抖合并：同一 (doc_token, mode) 的事件在 quiet_s 秒内没有新事件时才触发一次处理。
+
+    - 持续编辑时最迟在第一个事件后 max_wait_s 秒触发，避免一直推迟
+    - 合并期间以最后一个事件的上下文为准（通知最后一次操作的用户）
+    - 触发时队列已满则按 Retry-After 推迟重试；停机前由 flush 立即触发所有等待中的合并
+    - 只在单进程内合并，多实例部署时同一文档的事件落到不同实例会各触发一次（内容去重可进一步拦截）
+    """
+
+    def __init__(self, *, trigger: TriggerFn, quiet_s: float, max_wait_s: float) -> None:
+        self._trigger = trigger
+        self._quiet_s = quiet_s
+        self._max_wait_s = max(max_wait_s, quiet_s)
+        self._pending: Dict[tuple[str, str], _Pending] = {}
+        self._inflight: Set[asyncio.Task[None]] = set()
+        self._received_total = 0
+        self._coalesced_total = 0
+        self._triggered_total = 0
+        self._failed_total = 0
+
+    def submit(self, ctx: ProcessContext) -> bool:
+        """登记一个事件；已有等待中的合并时返回 True（本事件被合并）。"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        key = (ctx.doc_token, ctx.mode)
+        self._received_total += 1
+        pending = self._pending.get(key)
+        coalesced = pending is not None
+        if pending is None:
+            pending = self._pending[key] = _Pending(ctx=ctx, first_at=now, events=1)
+        else:
+            pending.ctx = ctx
+            pending.events += 1
+            self._coalesced_total += 1
+            if pending.timer is not None:
+                pending.timer.cancel()
+        delay = min(self._quiet_s, pending.first_at + self._max_wait_s - now)
+        pending.timer = loop.call_later(max(0.0, delay), self._fire, key)
+        return coalesced
+
+    async def flush(self) -> None:
+        """立即触发所有等待中的合并并等待触发完成（停机排空前调用）。"""
+        for key in list(self._pending):
+            self._fire(key)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "quiet_s": self._quiet_s,
+            "max_wait_s": self._max_wait_s,
+            "pending": len(self._pending),
+            "pending_events": sum(p.events for p in self._pending.values()),
+            "received_total": self._received_total,
+            "coalesced_total": self._coalesced_total,
+            "triggered_total": self._triggered_total,
+            "failed_total": self._failed_total,
+        }
+
+    def _fire(self, key: tuple[str, str]) -> None:
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        if pending.timer is not None:
+            pending.timer.cancel()
+        handle = asyncio.create_task(self._run(key, pending))
+        self._inflight.add(handle)
+        handle.add_done_callback(self._inflight.discard)
+
+    async def _run(self, key: tuple[str, str], pending: _Pending) -> None:
+        try:
+            task_id = await self._trigger(pending.ctx)
+        except QueueFullError as exc:
+            logger.info(
+                "Debounced trigger deferred (queue full) doc=%s mode=%s retry_after=%ss",
+                *key,
+                exc.retry_after_s,
+            )
+            if key not in self._pending:
+                # 期间没有新事件：原样放回，Retry-After 后再触发
+                pending.timer = asyncio.get_running_loop().call_later(
+                    exc.retry_after_s, self._fire, key
+                )
+                self._pending[key] = pending
+            return
+        except ServiceDrainingError:
+            self._failed_total += 1
+            logger.warning("Debounced trigger dropped while draining doc=%s mode=%s", *key)
+            return
+        except Exception:  # noqa: BLE001
+            self._failed_total += 1
+            logger.exception("Debounced trigger failed doc=%s mode=%s", *key)
+            return
+        self._triggered_total += 1
+        logger.info(
+            "Debounced trigger doc=%s mode=%s events=%s task_id=%s",
+            *key,
+            pending.events,
+            task_id,
+        )
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    from backend.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class RedisJobQueue:
+    """
+    Redis 列表实现的任务队列：API 进程只入队，独立的 worker 进程（python -m backend.worker）取出执行，
+    进度通过共享的 RedisTaskStore 回传（SSE / 长轮询照常工作）。
+
+    key 布局（均带 prefix）：
+    - jobs:queue：list，入队 LPUSH、出队 BLMOVE（先进先出），元素为 task_id
+    - jobs:processing:{worker_id}：list，worker 已取出但未完成的 task_id
+    - jobs:heartbeat:{worker_id}：worker 心跳，带过期时间
+    - jobs:workers：set，登记过的 worker_id
+
+    worker 正常退出时把未完成的任务放回队首；异常退出后心跳过期，其他 worker 在 recover 时接管
+    （重新执行时从断点恢复，不会重复调用模型）。
+    """
+
+    def __init__(
+        self,
+        *,
+        url: str | None = None,
+        client: Any = None,
+        prefix: str = "feishu_ai:",
+        heartbeat_ttl_s: float = 30.0,
+    ) -> None:
+        if client is None:
+            if not url:
+                raise ValueError("RedisJobQueue requires url or client")
+            import redis.asyncio as redis
+
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self._redis = client
+        self._prefix = prefix
+        self.heartbeat_ttl_s = heartbeat_ttl_s
+
+    def _key(self, name: str) -> str:
+        return f"{self._prefix}jobs:{name}"
+
+    async def push(self, task_id: str) -> int:
+        """入队，返回入队后的队列长度（即该任务的排队位置）。"""
+        return int(await self._redis.lpush(self._key("queue"), task_id))
+
+    async def depth(self) -> int:
+        return int(await self._redis.llen(self._key("queue")))
+
+    async def pop(self, worker_id: str, timeout_s: float) -> Optional[str]:
+        """阻塞取出队首任务并登记到该 worker 的处理中列表；超时返回 None。"""
+        return await self._redis.blmove(
+            self._key("queue"), self._key(f"processing:{worker_id}"), timeout_s, "RIGHT", "LEFT"
+        )
+
+    async def ack(self, worker_id: str, task_id: str) -> None:
+        """任务执行结束（成功 / 失败 / 被取消），从处理中列表移除。"""
+        await self._redis.lrem(self._key(f"processing:{worker_id}"), 1, task_id)
+
+    async def heartbeat(self, worker_id: str) -> None:
+        await self._redis.sadd(self._key("workers"), worker_id)
+        await self._redis.set(
+            self._key(f"heartbeat:{worker_id}"), str(time.time()), px=int(self.heartbeat_ttl_s * 1000)
+        )
+
+    async def requeue(self, worker_id: str) -> int:
+        """把 worker 处理中的任务放回队首并注销该 worker，返回放回的任务数。"""
+        processing = self._key(f"processing:{worker_id}")
+        moved = 0
+        # LMOVE 逐个原子移动：多个 worker 同时接管同一个失联 worker 也不会重复入队
+        while await self._redis.lmove(processing, self._key("queue"), "RIGHT", "RIGHT"):
+            moved += 1
+        await self._redis.delete(self._key(f"heartbeat:{worker_id}"))
+        await self._redis.srem(self._key("workers"), worker_id)
+        if moved:
+            logger.info("Requeued %s task(s) from worker %s", moved, worker_id)
+        return moved
+
+    async def recover(self) -> int:
+        """接管心跳已过期的 worker 的处理中任务，返回放回队列的任务数。"""
+        moved = 0
+        for worker_id in await self._redis.smembers(self._key("workers")):
+            if not await self._redis.exists(self._key(f"heartbeat:{worker_id}")):
+                moved += await self.requeue(worker_id)
+        return moved
+
+    async def stats(self) -> Dict[str, Any]:
+        workers = await self._redis.smembers(self._key("workers"))
+        alive = 0
+        processing = 0
+        for worker_id in workers:
+            alive += int(await self._redis.exists(self._key(f"heartbeat:{worker_id}")))
+            processing += int(await self._redis.llen(self._key(f"processing:{worker_id}")))
+        return {"queued": await self.depth(), "processing": processing, "workers_alive": alive}
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def build_job_queue(settings: "Settings") -> Optional[RedisJobQueue]:
+    """
+    TASK_EXECUTION=external 时构造共享任务队列；inline（默认）返回 None，任务在 API 进程内执行。
+    """
+    execution = settings.TASK_EXECUTION.lower()
+    if execution == "inline":
+        return None
+    if execution != "external":
+        raise ValueError(f"Unknown TASK_EXECUTION: {settings.TASK_EXECUTION}")
+    if settings.TASK_STORE_BACKEND.lower() != "redis":
+        # 进度要由 worker 进程写回 API 进程可见的存储
+        raise RuntimeError("TASK_EXECUTION=external requires TASK_STORE_BACKEND=redis")
+    try:
+        import redis.asyncio  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError("TASK_EXECUTION=external requires the redis package (pip install redis)") from exc
+    return RedisJobQueue(url=settings.REDIS_URL, prefix=settings.TASK_STORE_REDIS_PREFIX)
@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Mapping, Optional
+
+from backend.core.metrics import WORKER_POOL_WAIT_SECONDS, percentile
+
+logger = logging.getLogger(__name__)
+
+JobFn = Callable[[], Awaitable[Any]]
+# 排队变化回调：参数为排队位置发生变化的 task_id
+QueueChangeFn = Callable[[List[str]], Awaitable[None]]
+
+DEFAULT_POOL = "default"
+
+
+class QueueFullError(Exception):
+    """
+    等待队列已满；retry_after_s 为建议的重试间隔（秒）。
+    """
+
+    def __init__(self, depth: int, retry_after_s: int) -> None:
+        super().__init__(f"Task queue is full ({depth} waiting), retry after {retry_after_s}s")
+        self.depth = depth
+        self.retry_after_s = retry_after_s
+
+
+@dataclass(frozen=True)
+class PoolSpec:
+    """
+    执行池中一个分池的配置：workers 为专属执行位数；borrow 为 True 时可借用其他分池的空闲执行位。
+    """
+
+    workers: int
+    borrow: bool = False
+
+
+@dataclass
+class _Job:
+    task_id: str
+    run: JobFn
+    enqueued_at: float
+    user: str
+    doc: Optional[str]
+    cost: int
+    pool: str = DEFAULT_POOL
+
+
+class WorkerPool:
+    """
+    固定并发的执行池 + 有界等待队列，按用户公平调度。
+
+    - 同时执行的任务不超过 workers 个，其余排队；队列满时 submit 抛出 QueueFullError，不阻塞调用方
+    - 等待中的任务按 user_key 分组，组间按赤字轮转（DRR）出队：每轮每个用户获得 quantum 个额度，
+      任务消耗 cost 个额度（fan-out 任务按 mode 数计），批量提交的用户不会饿死其他用户
+    - max_per_user > 0 时单个用户同时执行的任务数不超过该值；serialize_docs 时同一文档的任务串行执行，
+      被限制的任务让位给队列中的其他任务
+    - 每个任务在独立的 asyncio.Task 中执行，可单独取消；任务结束后立即补位
+    - 队列发生变化后调用 on_queue_change（只传排队位置变化的任务），多次变化合并为一次回调
+    - 提供 pools 时执行位按分池划分（长耗时与短耗时的 workflow 互不占位）：各分池先用自己的执行位，
+      borrow=True 的分池再借用其他分池空闲的执行位（不抢占，被借出的执行位在借用任务结束后归还）；
+      排队位置与预计等待时间按分池计算
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int,
+        max_queue: int,
+        max_per_user: int = 0,
+        serialize_docs: bool = False,
+        quantum: int = 1,
+        pools: Mapping[str, PoolSpec] | None = None,
+        on_queue_change: QueueChangeFn | None = None,
+        default_retry_after_s: int = 30,
+        max_samples: int = 1000,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        if quantum < 1:
+            raise ValueError("quantum must be >= 1")
+        # 未单独配置的 default 分池使用 workers 个执行位
+        self._pools: Dict[str, PoolSpec] = dict(pools or {})
+        self._pools.setdefault(DEFAULT_POOL, PoolSpec(workers=workers))
+        if any(spec.workers < 1 for spec in self._pools.values()):
+            raise ValueError("pool workers must be >= 1")
+        workers = sum(spec.workers for spec in self._pools.values())
+        self._can_borrow = any(spec.borrow for spec in self._pools.values())
+        self._workers = workers
+        self._max_queue = max_queue
+        self._max_per_user = max_per_user
+        self._serialize_docs = serialize_docs
+        self._quantum = quantum
+        self._on_queue_change = on_queue_change
+        self._default_retry_after_s = default_retry_after_s
+        # 等待中的任务：user_key -> 该用户的任务（提交顺序）；_ring 为轮转顺序，只含有任务的用户
+        self._queues: Dict[str, Deque[_Job]] = {}
+        self._ring: Deque[str] = deque()
+        self._deficit: Dict[str, int] = {}
+        self._pending: Dict[str, _Job] = {}
+        self._running: Dict[str, asyncio.Task[Any]] = {}
+        self._running_users: Counter[str] = Counter()
+        self._running_docs: Counter[str] = Counter()
+        self._running_pools: Counter[str] = Counter()
+        self._started_at: Dict[str, float] = {}
+        # 预计出队顺序（task_id -> 排队位置），队列变化时失效
+        self._order: Optional[Dict[str, int]] = None
+        self._reported: Dict[str, int] = {}
+        self._notifier: Optional[asyncio.Task[None]] = None
+        self._queue_dirty = False
+        self._closed = False
+        # 最近的排队等待 / 执行耗时样本（秒）
+        self._wait_samples: Deque[float] = deque(maxlen=max_samples)
+        self._run_samples: Deque[float] = deque(maxlen=max_samples)
+        self._pool_wait_samples: Dict[str, Deque[float]] = {
+            name: deque(maxlen=max_samples) for name in self._pools
+        }
+        self._pool_run_samples: Dict[str, Deque[float]] = {
+            name: deque(maxlen=max_samples) for name in self._pools
+        }
+        self._submitted_total = 0
+        self._rejected_total = 0
+        self._completed_total = 0
+
+    def check_capacity(self) -> None:
+        """队列已满时抛出 QueueFullError（创建任务前预检，避免创建后才被拒绝）。"""
+        if len(self._running) >= self._workers and len(self._pending) >= self._max_queue:
+            self._rejected_total += 1
+            raise QueueFullError(len(self._pending), self.retry_after_s())
+
+    def submit(
+        self,
+        task_id: str,
+        run: JobFn,
+        *,
+        user_key: Optional[str] = None,
+        doc_key: Optional[str] = None,
+        cost: int = 1,
+        pool: str = DEFAULT_POOL,
+    ) -> int:
+        """
+        提交任务，返回排队位置（0 表示已开始执行）；run 在轮到时才被调用。
+
+        pool 未配置时抛出 ValueError。
+        """
+        if pool not in self._pools:
+            raise ValueError(f"Unknown execution pool: {pool}")
+        self.check_capacity()
+        self._submitted_total += 1
+        job = _Job(task_id, run, time.monotonic(), user_key or "", doc_key, max(1, cost), pool)
+        self._pending[task_id] = job
+        queue = self._queues.get(job.user)
+        if queue is None:
+            queue = self._queues[job.user] = deque()
+            self._ring.append(job.user)
+            self._deficit[job.user] = 0
+        queue.append(job)
+        self._order = None
+        self._dispatch()
+        if task_id in self._pending:
+            self._queue_changed()
+        return self.position(task_id) or 0
+
+    def cancel(self, task_id: str) -> bool:
+        """移出排队中的任务或取消执行中的任务；任务不在池中时返回 False。"""
+        job = self._pending.pop(task_id, None)
+        if job is not None:
+            self._dequeue(job)
+            self._reported.pop(task_id, None)
+            # 被移出的任务可能正阻塞同用户 / 同文档之外的任务，顺带补位
+            self._dispatch()
+            self._queue_changed()
+            return True
+        handle = self._running.get(task_id)
+        if handle is None or handle.done():
+            return False
+        handle.cancel()
+        return True
+
+    async def drain(self, timeout_s: float) -> List[str]:
+        """
+        停止出队并等待执行中的任务结束，最多 timeout_s 秒，超时后中断剩余任务。
+
+        返回未完成的 task_id：先是被中断的，再是按出队顺序排列的排队中任务（已移出队列，不会再执行）。
+        """
+        self._closed = True
+        pending = list(self._expected_order())
+        self._queues.clear()
+        self._ring.clear()
+        self._deficit.clear()
+        self._pending.clear()
+        self._reported.clear()
+        self._order = None
+        handles = dict(self._running)
+        interrupted: List[str] = []
+        if handles:
+            _, not_done = await asyncio.wait(handles.values(), timeout=timeout_s)
+            interrupted = [task_id for task_id, handle in handles.items() if handle in not_done]
+            for handle in not_done:
+                handle.cancel()
+            await asyncio.gather(*not_done, return_exceptions=True)
+        return interrupted + pending
+
+    def position(self, task_id: str) -> Optional[int]:
+        """分池内的排队位置：0 表示执行中，1 表示该分池下一个出队；不在池中时返回 None。"""
+        if task_id in self._running:
+            return 0
+        if task_id not in self._pending:
+            return None
+        return self._expected_order()[task_id]
+
+    def estimated_wait_s(self, task_id: str) -> Optional[float]:
+        """
+        按最近平均执行耗时估算开始执行前还需等待的秒数；没有耗时样本或任务不在排队中时返回 None。
+
+        取两者中的较大值：分池内前面的任务分摊到该分池执行位的轮数，以及受 max_per_user 限制时
+        该用户自己排在前面的任务需要的轮数。耗时样本优先取该分池的（不计可借用的执行位）。
+        """
+        position = self.position(task_id)
+        if not position or not self._run_samples:
+            return None
+        job = self._pending[task_id]
+        samples = self._pool_run_samples[job.pool] or self._run_samples
+        mean = sum(samples) / len(samples)
+        rounds = math.ceil(position / self._pools[job.pool].workers)
+        if self._max_per_user > 0:
+            own = list(self._queues[job.user]).index(job) + 1
+            rounds = max(rounds, math.ceil(own / self._max_per_user))
+        return rounds * mean
+
+    def queued_count(self) -> int:
+        return len(self._pending)
+
+    def load(self) -> Dict[str, Dict[str, int]]:
+        """各分池当前排队与执行中的任务数（/metrics 抓取用，不计算耗时分位数）。"""
+        queued: Counter[str] = Counter(job.pool for job in self._pending.values())
+        return {
+            name: {"queued": queued[name], "running": self._running_pools[name]}
+            for name in self._pools
+        }
+
+    def retry_after_s(self) -> int:
+        """按最近平均执行耗时估算空出一个位置的时间：平均耗时 / workers。"""
+        if not self._run_samples:
+            return self._default_retry_after_s
+        mean = sum(self._run_samples) / len(self._run_samples)
+        return max(1, math.ceil(mean / self._workers))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self._workers,
+            "running": len(self._running),
+            "queued": len(self._pending),
+            "queued_users": len(self._queues),
+            "max_queue": self._max_queue,
+            "max_per_user": self._max_per_user,
+            "serialize_docs": self._serialize_docs,
+            "submitted_total": self._submitted_total,
+            "rejected_total": self._rejected_total,
+            "completed_total": self._completed_total,
+            "oldest_wait_s": (
+                time.monotonic() - next(iter(self._pending.values())).enqueued_at
+                if self._pending
+                else 0.0
+            ),
+            "wait_s": _summarize(self._wait_samples),
+            "run_s": _summarize(self._run_samples),
+            "pools": {name: self._pool_stats(name) for name in self._pools},
+        }
+
+    def _pool_stats(self, name: str) -> Dict[str, Any]:
+        spec = self._pools[name]
+        running = self._running_pools[name]
+        waiting = [job for job in self._pending.values() if job.pool == name]
+        return {
+            "workers": spec.workers,
+            "borrow": spec.borrow,
+            "running": running,
+            # 超出专属执行位、借用其他分池的执行数
+            "borrowed": max(0, running - spec.workers),
+            "utilization": round(running / spec.workers, 3),
+            "queued": len(waiting),
+            "oldest_wait_s": time.monotonic() - waiting[0].enqueued_at if waiting else 0.0,
+            "wait_s": _summarize(self._pool_wait_samples[name]),
+            "run_s": _summarize(self._pool_run_samples[name]),
+        }
+
+    def _eligible(self, job: _Job, *, borrowing: bool = False) -> bool:
+        if self._running_pools[job.pool] >= self._pools[job.pool].workers:
+            if not (borrowing and self._pools[job.pool].borrow):
+                return False
+        if self._max_per_user > 0 and self._running_users[job.user] >= self._max_per_user:
+            return False
+        return not (self._serialize_docs and job.doc and self._running_docs[job.doc])
+
+    def _dispatch(self) -> None:
+        if self._closed:
+            return
+        started = False
+        # 第一轮各分池只用自己的执行位；仍有空位时第二轮允许可借用的分池占用
+        for borrowing in (False, True) if self._can_borrow else (False,):
+            eligible = partial(self._eligible, borrowing=borrowing)
+            while self._pending and len(self._running) < self._workers:
+                job = _select(self._queues, self._ring, self._deficit, self._quantum, eligible)
+                if job is None:
+                    # 剩余任务都受分池、用户并发上限或文档串行限制，等执行中的任务结束
+                    break
+                del self._pending[job.task_id]
+                self._reported.pop(job.task_id, None)
+                self._start(job)
+                started = True
+        if started:
+            self._order = None
+            if self._pending:
+                self._queue_changed()
+
+    def _dequeue(self, job: _Job) -> None:
+        queue = self._queues[job.user]
+        queue.remove(job)
+        if not queue:
+            del self._queues[job.user]
+            del self._deficit[job.user]
+            self._ring.remove(job.user)
+        self._order = None
+
+    def _start(self, job: _Job) -> None:
+        now = time.monotonic()
+        self._wait_samples.append(now - job.enqueued_at)
+        self._pool_wait_samples[job.pool].append(now - job.enqueued_at)
+        WORKER_POOL_WAIT_SECONDS.observe(now - job.enqueued_at, job.pool)
+        handle = asyncio.create_task(job.run())
+        self._running[job.task_id] = handle
+        self._running_pools[job.pool] += 1
+        self._running_users[job.user] += 1
+        if job.doc:
+            self._running_docs[job.doc] += 1
+        self._started_at[job.task_id] = now
+
+        def _done(_: asyncio.Task[Any]) -> None:
+            if self._running.get(job.task_id) is handle:
+                del self._running[job.task_id]
+                self._running_pools[job.pool] -= 1
+                self._running_users[job.user] -= 1
+                if not self._running_users[job.user]:
+                    del self._running_users[job.user]
+                if job.doc:
+                    self._running_docs[job.doc] -= 1
+                    if not self._running_docs[job.doc]:
+                        del self._running_docs[job.doc]
+                elapsed = time.monotonic() - self._started_at.pop(job.task_id)
+                self._run_samples.append(elapsed)
+                self._pool_run_samples[job.pool].append(elapsed)
+            self._completed_total += 1
+            self._dispatch()
+
+        handle.add_done_callback(_done)
+
+    def _expected_order(self) -> Dict[str, int]:
+        """
+        在当前队列上模拟轮转，得到各分池内的预计出队顺序（不考虑用户并发上限、文档串行与借用，只用于展示）。
+        """
+        if self._order is None:
+            queues = {user: deque(jobs) for user, jobs in self._queues.items()}
+            ring, deficit = deque(self._ring), dict(self._deficit)
+            order: Dict[str, int] = {}
+            ranks: Counter[str] = Counter()
+            while True:
+                job = _select(queues, ring, deficit, self._quantum, None)
+                if job is None:
+                    break
+                ranks[job.pool] += 1
+                order[job.task_id] = ranks[job.pool]
+            self._order = order
+        return self._order
+
+    def _queue_changed(self) -> None:
+        if self._on_queue_change is None:
+            return
+        self._queue_dirty = True
+        if self._notifier is None or self._notifier.done():
+            self._notifier = asyncio.create_task(self._notify_queue())
+
+    async def _notify_queue(self) -> None:
+        assert self._on_queue_change is not None
+        while self._queue_dirty:
+            self._queue_dirty = False
+            order = self._expected_order()
+            changed = [task_id for task_id, pos in order.items() if self._reported.get(task_id) != pos]
+            self._reported = dict(order)
+            if not changed:
+                continue
+            try:
+                await self._on_queue_change(changed)
+            except Exception:  # noqa: BLE001
+                logger.exception("WorkerPool queue change callback failed")
+
+
+def _select(
+    queues: Dict[str, Deque[_Job]],
+    ring: Deque[str],
+    deficit: Dict[str, int],
+    quantum: int,
+    eligible: Callable[[_Job], bool] | None,
+) -> Optional[_Job]:
+    """
+    赤字轮转选出下一个任务并移出队列；没有可执行的任务时返回 None。
+
+    轮到的用户额度不足时补充 quantum 并让位；额度用完或队列清空时本轮结束。
+    用户组内按提交顺序取第一个 eligible 的任务（允许越过被文档串行阻塞的任务）。
+    """
+    skipped = 0
+    while ring and skipped < len(ring):
+        user = ring[0]
+        queue = queues[user]
+        job = next((j for j in queue if eligible(j)), None) if eligible else queue[0]
+        if job is None:
+            ring.rotate(-1)
+            skipped += 1
+            continue
+        if deficit[user] < job.cost:
+            deficit[user] += quantum
+            ring.rotate(-1)
+            skipped = 0
+            continue
+        deficit[user] -= job.cost
+        if queue[0] is job:
+            queue.popleft()
+        else:
+            queue.remove(job)
+        if not queue:
+            # 队列清空的用户退出轮转，剩余额度作废（DRR 的标准做法，避免攒额度）
+            ring.popleft()
+            del queues[user]
+            del deficit[user]
+        elif deficit[user] < queue[0].cost:
+            ring.rotate(-1)
+        return job
+    return None
+
+
+def _summarize(samples: Deque[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+    }
@@ -1,24 +1,104 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import json
 import logging
-from dataclasses import asdict
-from typing import Any, Dict, Optional
+import time
+from dataclasses import asdict, fields, replace
+from functools import partial
+from typing import TYPE_CHECKING, Any, Coroutine, Dict, List, Mapping, Optional
 
-from backend.core.manager import ProcessContext, ProcessManager, ProcessResult
-from backend.core.task_store import TaskStore
+from backend.core.checkpoints import StageCheckpoints
+from backend.core.manager import (
+    BulkItem,
+    FetchedSource,
+    ProcessContext,
+    ProcessManager,
+    ProcessResult,
+    ProgressFn,
+)
+from backend.core.task_store import BaseTaskStore, ReuseFn, TaskCreate, TaskSnapshot
+from backend.core.timeline import StageLatencyStats, TaskTimeline, bind_timeline
+from backend.services.outputs.base import SourceDoc
+from backend.services.triggers.pool import (
+    DEFAULT_POOL,
+    JobFn,
+    PoolSpec,
+    QueueFullError,
+    WorkerPool,
+)
+
+if TYPE_CHECKING:
+    from backend.services.triggers.job_queue import RedisJobQueue
 
 logger = logging.getLogger(__name__)
 
+# 停机排空超时仍未完成的任务：标记为失败并移交给下一个进程
+_HANDOFF_ERROR = "服务停机，任务已移交（新进程启动后从断点恢复）"
+
+
+class ServiceDrainingError(Exception):
+    """
+    服务正在停机排空，不再接收新任务。
+    """
+
 
 class TriggerService:
     """
     触发层统一服务：负责幂等、创建任务、启动后台处理，并将结果写回 TaskStore。
+
+    - 任务经 WorkerPool 执行：最多 workers 个并发，其余按 user_id 公平轮转排队
+      （排队位置与预计开始时间写入 progress），队列满时 trigger / retry 抛出 QueueFullError
+    - fan-out 任务（父任务 + 各 mode 子任务）整体占用一个执行位，公平调度时按 mode 数计额度
+    - 按 mode_pools 把任务分到不同执行分池（pools），fan-out 任务归入第一个 mode 的分池
+    - dedup_window_s > 0 时按 (doc_token, mode, 划词文本哈希, 文档 revision) 去重：相同内容的任务仍在运行、
+      或在窗口内成功结束时直接返回已有 task_id（调用方显式提供 idempotency_key 时以其为准）；
+      revision 取自元数据缓存，触发请求不额外请求飞书
+    - 提供 job_queue 时只入队不执行，由独立 worker 进程取出后调用 run_queued（API 进程不承担流水线负载）
+    - 批量任务（trigger_bulk）由不占执行位的协调协程逐篇创建子任务并提交，同时在途的子任务不超过 concurrency 个
     """
 
-    def __init__(self, *, task_store: TaskStore, process_manager: ProcessManager) -> None:
+    def __init__(
+        self,
+        *,
+        task_store: BaseTaskStore,
+        process_manager: ProcessManager,
+        auto_retry_max: int = 0,
+        auto_retry_delay_s: float = 60.0,
+        workers: int = 8,
+        max_queue: int = 200,
+        max_per_user: int = 0,
+        serialize_docs: bool = False,
+        pools: Optional[Mapping[str, PoolSpec]] = None,
+        mode_pools: Optional[Mapping[str, str]] = None,
+        dedup_window_s: float = 0.0,
+        job_queue: Optional["RedisJobQueue"] = None,
+    ) -> None:
         self._tasks = task_store
         self._pm = process_manager
+        # 失败后自动延迟重试（仅当模型产物已落断点时才有意义）
+        self._auto_retry_max = auto_retry_max
+        self._auto_retry_delay_s = auto_retry_delay_s
+        # 按 mode 聚合的阶段耗时分位数（仅统计成功任务）
+        self.stage_stats = StageLatencyStats()
+        self._pool = WorkerPool(
+            workers=workers,
+            max_queue=max_queue,
+            max_per_user=max_per_user,
+            serialize_docs=serialize_docs,
+            pools=pools,
+            on_queue_change=self._report_queue,
+        )
+        self._mode_pools = dict(mode_pools or {})
+        self._dedup_window_s = dedup_window_s
+        self._job_queue = job_queue
+        self._max_queue = max_queue
+        self._draining = False
+        # 等待中的自动重试句柄：task_id -> asyncio.Task，用于取消
+        self._handles: Dict[str, asyncio.Task[Any]] = {}
+        # 本进程执行中的任务 -> 当前阶段
+        self._active_stages: Dict[str, str] = {}
 
     async def trigger(
         self,
@@ -29,35 +109,774 @@ class TriggerService:
         """
         创建任务并异步执行，返回 task_id。
 
-        - idempotency_key：用于事件回调去重；同一 key 将返回同一个 task_id
+        - idempotency_key：事件 id / 客户端 Idempotency-Key；同一 key 将返回同一个 task_id（不再重复执行）
+        - 未提供 idempotency_key 时按内容去重（见 dedup_window_s）
+        - 等待队列已满：抛出 QueueFullError；停机排空中：抛出 ServiceDrainingError（均不创建任务）
         """
-        task_id = await self._tasks.create_task(
-            context=asdict(ctx), idempotency_key=idempotency_key
+        await self._check_capacity()
+        key, reuse = await self._dedup(ctx, [ctx.mode], idempotency_key)
+        task_id, created = await self._tasks.get_or_create_task(
+            context=asdict(ctx), idempotency_key=key, reuse=reuse
         )
+        if created:
+            await self._enqueue(task_id, ctx, partial(self._run, task_id, ctx))
+        return task_id
+
+    async def trigger_batch(
+        self,
+        *,
+        ctxs: List[ProcessContext],
+        idempotency_keys: Optional[List[Optional[str]]] = None,
+        concurrency: int = 8,
+    ) -> List[str | QueueFullError]:
+        """
+        批量触发（每项一个 mode）：去重键并发计算（同时最多 concurrency 篇文档查询版本），
+        所有任务在一次存储写入中创建，再逐个入队。
+
+        返回与 ctxs 顺序一致的列表：task_id，或入队时队列已满的 QueueFullError（该任务已标记失败）。
+        幂等 / 去重规则同 trigger；停机排空中或队列已满时整批拒绝（不创建任务）。
+        """
+        await self._check_capacity()
+        keys = idempotency_keys or [None] * len(ctxs)
+        limit = asyncio.Semaphore(max(1, concurrency))
+
+        async def dedup(
+            ctx: ProcessContext, key: Optional[str]
+        ) -> tuple[Optional[str], Optional[ReuseFn]]:
+            async with limit:
+                return await self._dedup(ctx, [ctx.mode], key)
+
+        dedups = await asyncio.gather(*(dedup(ctx, key) for ctx, key in zip(ctxs, keys)))
+        created = await self._tasks.get_or_create_tasks(
+            [
+                TaskCreate(context=asdict(ctx), idempotency_key=key, reuse=reuse)
+                for ctx, (key, reuse) in zip(ctxs, dedups)
+            ]
+        )
+        results: List[str | QueueFullError] = []
+        for ctx, (task_id, is_new) in zip(ctxs, created):
+            if is_new:
+                try:
+                    await self._enqueue(task_id, ctx, partial(self._run, task_id, ctx))
+                except QueueFullError as exc:
+                    results.append(exc)
+                    continue
+            results.append(task_id)
+        return results
+
+    async def trigger_many(
+        self,
+        *,
+        ctx: ProcessContext,
+        modes: List[str],
+        idempotency_key: Optional[str] = None,
+    ) -> tuple[str, Dict[str, str]]:
+        """
+        多模式 fan-out：同一文档只读取一次，各 mode 的 Processor 并发执行并共享输出容器。
+
+        返回 (父任务 task_id, {mode: 子任务 task_id})。父任务的 progress 汇总各 mode 的进度。
+        幂等 / 去重规则同 trigger，命中时返回已有的父子任务。
+        """
+        await self._check_capacity()
+        parent_ctx = asdict(ctx)
+        parent_ctx["mode"] = ",".join(modes)
+        parent_ctx["modes"] = list(modes)
+        key, reuse = await self._dedup(ctx, modes, idempotency_key)
+        parent_id, created = await self._tasks.get_or_create_task(
+            context=parent_ctx, idempotency_key=key, reuse=reuse
+        )
+        if not created:
+            parent = await self._tasks.get(parent_id)
+            return parent_id, await self._children_by_mode(
+                (parent.child_task_ids or ()) if parent else ()
+            )
+
+        children: Dict[str, str] = {}
+        for mode in modes:
+            children[mode] = await self._tasks.create_task(
+                context=asdict(replace(ctx, mode=mode)), parent_task_id=parent_id
+            )
+        await self._enqueue(
+            parent_id, ctx, partial(self._run_many, parent_id, ctx, children), cost=len(children)
+        )
+        return parent_id, children
+
+    async def trigger_bulk(
+        self,
+        *,
+        ctx: ProcessContext,
+        source_type: str = "auto",
+        recursive: bool = True,
+        concurrency: int = 4,
+        max_docs: int = 500,
+    ) -> str:
+        """
+        批量处理云盘文件夹 / 知识库子树（ctx.doc_token 为文件夹或节点 token），返回父任务 task_id。
+
+        父任务枚举文档后为每篇文档创建一个子任务（parent_task_id 指向父任务），progress 汇总完成数；
+        子任务与普通任务一样排队执行、可单独查询结果。
+        """
+        await self._check_capacity()
+        parent_ctx = asdict(ctx)
+        parent_ctx["bulk"] = {
+            "source_type": source_type,
+            "recursive": recursive,
+            "concurrency": concurrency,
+            "max_docs": max_docs,
+        }
+        parent_id = await self._tasks.create_task(context=parent_ctx)
+        self._spawn(parent_id, self._run_bulk(parent_id, ctx, parent_ctx["bulk"]))
+        return parent_id
+
+    async def retry(self, task_id: str) -> None:
+        """
+        从最后完成的阶段恢复失败的任务（已生成的模型内容、已创建的子文档不会重复生成/创建）。
+
+        - 任务不存在：抛出 KeyError
+        - 任务不是 failed 状态，或是 fan-out 子任务（需通过父任务重试）：抛出 ValueError
+        - 等待队列已满：抛出 QueueFullError（任务保持 failed）
+        """
+        task = await self._tasks.get(task_id)
+        if not task:
+            raise KeyError(task_id)
+        if task.parent_task_id:
+            raise ValueError(
+                f"Task {task_id} is a child task, retry its parent {task.parent_task_id} instead"
+            )
+        await self._check_capacity()
+        if not await self._tasks.restart(task_id):
+            raise ValueError(f"Task {task_id} is {task.status}, only failed tasks can be retried")
+
+        context = await self._tasks.get_context(task_id) or {}
+        ctx = _context_from_task(context)
+        if "bulk" in context:
+            # 已成功的文档直接跳过，失败的子任务由 _run_bulk 重新提交
+            self._spawn(task_id, self._run_bulk(task_id, ctx, context["bulk"]))
+            return
+        child_task_ids = task.child_task_ids
+        if not child_task_ids:
+            await self._enqueue(task_id, ctx, partial(self._run, task_id, ctx))
+            return
+
+        children = await self._children_by_mode(child_task_ids)
+        for child_id in children.values():
+            # 已成功的子任务保持原状，_run_many 会直接复用其结果
+            await self._tasks.restart(child_id)
+        await self._enqueue(
+            task_id, ctx, partial(self._run_many, task_id, ctx, children), cost=len(children)
+        )
+
+    async def cancel(self, task_id: str, *, reason: str = "任务已被用户取消") -> None:
+        """
+        取消任务：中断进行中的模型 / 飞书调用，任务标记为 cancelled，并清理已创建的子文档。
+
+        - 任务不存在：抛出 KeyError
+        - 任务已结束（且没有待执行的自动重试），或是 fan-out 子任务（需取消父任务）：抛出 ValueError
+        - 任务在其他 worker 上执行时只更新状态，执行方在下一次进度上报时感知并中断
+        """
+        task = await self._tasks.get(task_id)
+        if not task:
+            raise KeyError(task_id)
+        if task.parent_task_id:
+            raise ValueError(
+                f"Task {task_id} is a child task, cancel its parent {task.parent_task_id} instead"
+            )
+        handle = self._handles.get(task_id)
+        if task.status != "running" and (handle is None or handle.done()):
+            raise ValueError(f"Task {task_id} is {task.status}, only running tasks can be cancelled")
+
+        # 先写状态再中断执行：接口返回后查询到的一定是 cancelled
+        for child_id in task.child_task_ids or ():
+            await self._tasks.cancel(child_id, reason)
+            # 批量任务的子任务各自在池中排队 / 执行
+            self._pool.cancel(child_id)
+        if not await self._tasks.cancel(task_id, reason):
+            # 失败后等待自动重试的任务：只撤销重试，保持 failed
+            await self._tasks.update_progress(
+                task_id, stage="retry_cancelled", message="已取消自动重试"
+            )
+        # 排队中的任务直接移出队列，执行中的任务中断
+        self._pool.cancel(task_id)
+        if handle is not None:
+            handle.cancel()
+
+    async def run_queued(self, task_id: str) -> None:
+        """
+        执行从共享队列取出的任务并等待其结束（worker 进程调用）。
+
+        任务已结束、已取消或已被淘汰时直接返回；重新执行时从断点恢复。
+        """
+        task = await self._tasks.get(task_id)
+        if not task or task.status != "running":
+            return
+        ctx = _context_from_task(await self._tasks.get_context(task_id) or {})
+        if not task.child_task_ids:
+            # 批量任务的子任务失败后由父任务统一重试
+            await self._run(task_id, ctx, allow_auto_retry=not task.parent_task_id)
+            return
+        children = await self._children_by_mode(task.child_task_ids)
+        await self._run_many(task_id, ctx, children)
+
+    async def queue_stats(self) -> Dict[str, Any]:
+        """执行池与等待队列的指标：并发数、队列深度、排队等待 / 执行耗时分位数等。"""
+        if self._job_queue is not None:
+            return {
+                "execution": "external",
+                "max_queue": self._max_queue,
+                **await self._job_queue.stats(),
+            }
+        return {"execution": "inline", **self._pool.stats()}
+
+    def pool_load(self) -> Dict[str, Dict[str, int]]:
+        """本进程执行池各分池的排队 / 执行中任务数（见 WorkerPool.load）。"""
+        return self._pool.load()
+
+    def active_stage_counts(self) -> Dict[str, int]:
+        """
+        本进程内各阶段的任务数：排队中的计入 queued，执行中的按当前阶段计（fan-out 按子任务计）。
+        """
+        counts: Dict[str, int] = {"queued": self._pool.queued_count()}
+        for stage in self._active_stages.values():
+            counts[stage] = counts.get(stage, 0) + 1
+        return counts
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    def begin_drain(self) -> None:
+        """
+        停止接收新任务（触发接口与 /ready 返回 503）；执行中与排队中的任务不受影响，由 drain 等待。
+        """
+        self._draining = True
+
+    async def drain(self, timeout_s: float) -> List[str]:
+        """
+        停机排空：不再接收新任务，等待执行中的任务结束（最多 timeout_s 秒）。
+
+        超时被中断的任务、尚未开始的排队任务以及等待中的自动重试，统一通过 TaskStore.hand_off
+        标记并登记，由下一个进程的 resume_handoff 从断点恢复。返回被移交的 task_id。
+        内存存储（durable=False）无法跨进程移交，这些任务只会被标记为失败。
+        """
+        self.begin_drain()
+        remaining = await self._pool.drain(timeout_s)
+        for task_id, handle in list(self._handles.items()):
+            handle.cancel()
+            remaining.append(task_id)
+        for task_id in remaining:
+            task = await self._tasks.get(task_id)
+            if task and "bulk" in task.context:
+                # 批量子任务各自排队：本进程池中的已在 remaining 内，外部 worker 上的继续执行
+                continue
+            for child_id in (task.child_task_ids or ()) if task else ():
+                child = await self._tasks.get(child_id)
+                if child and child.status == "running":
+                    await self._tasks.fail(child_id, _HANDOFF_ERROR)
+        await self._tasks.hand_off(remaining, _HANDOFF_ERROR)
+        if remaining and not self._tasks.durable:
+            logger.warning(
+                "Drain timed out with a non-durable task store, %d task(s) marked failed and "
+                "will not be resumed (use TASK_STORE_BACKEND=sqlite / redis): %s",
+                len(remaining),
+                remaining,
+            )
+        elif remaining:
+            logger.warning("Drain timed out, handed off %d task(s): %s", len(remaining), remaining)
+        return remaining
+
+    async def resume_handoff(self) -> List[str]:
+        """启动时恢复上一个进程移交的任务（从断点重新入队），返回恢复的 task_id。"""
+        resumed: List[str] = []
+        for task_id in await self._tasks.take_handoff():
+            try:
+                await self.retry(task_id)
+            except (KeyError, ValueError, QueueFullError) as exc:
+                logger.info("Skip resuming handed-off task_id=%s: %s", task_id, exc)
+                continue
+            resumed.append(task_id)
+        if resumed:
+            logger.info("Resumed %d handed-off task(s)", len(resumed))
+        return resumed
+
+    async def _dedup(
+        self, ctx: ProcessContext, modes: List[str], idempotency_key: Optional[str]
+    ) -> tuple[Optional[str], Optional[ReuseFn]]:
+        """
+        返回 (幂等键, 复用判定)：显式幂等键在有效期内总是复用；内容去重键只复用运行中或窗口内成功的任务。
+        """
+        if idempotency_key or self._dedup_window_s <= 0:
+            return idempotency_key, None
+        revision = await self._pm.get_doc_revision(ctx.doc_token)
+        text_hash = hashlib.sha256(ctx.selected_text.encode()).hexdigest() if ctx.selected_text else ""
+        digest = hashlib.sha256(
+            json.dumps([ctx.doc_token, sorted(modes), text_hash, revision]).encode()
+        ).hexdigest()
+        window = self._dedup_window_s
+
+        def reuse(task: TaskSnapshot) -> bool:
+            if task.status == "running":
+                return True
+            finished_at = task.updated_at or task.created_at
+            return task.status == "succeeded" and time.time() - finished_at <= window
+
+        return f"dedup:{digest}", reuse
+
+    async def _check_capacity(self) -> None:
+        if self._draining:
+            raise ServiceDrainingError("Service is shutting down")
+        if self._job_queue is None:
+            self._pool.check_capacity()
+            return
+        depth = await self._job_queue.depth()
+        if depth >= self._max_queue:
+            raise QueueFullError(depth, self._pool.retry_after_s())
+
+    async def _children_by_mode(self, child_task_ids: tuple[str, ...]) -> Dict[str, str]:
+        children: Dict[str, str] = {}
+        for child_id in child_task_ids:
+            child = await self._tasks.get(child_id)
+            if child:
+                children[child.context["mode"]] = child_id
+        return children
+
+    async def _enqueue(
+        self, task_id: str, ctx: ProcessContext, run: JobFn, *, cost: int = 1
+    ) -> None:
+        if self._job_queue is not None:
+            # 外部 worker 模式：排队位置只在入队时估算一次（按共享队列长度）
+            position = await self._job_queue.depth() + 1
+            await self._tasks.update_progress(
+                task_id,
+                stage="queued",
+                percent=0,
+                message=_queued_message(position),
+                extra={"queue_position": position},
+            )
+            await self._job_queue.push(task_id)
+            return
+        # 需要排队时由 _report_queue 补写排队位置
         await self._tasks.update_progress(
             task_id, stage="queued", percent=0, message="任务已进入队列"
         )
-        asyncio.create_task(self._run(task_id, ctx))
-        return task_id
-
-    async def _run(self, task_id: str, ctx: ProcessContext) -> None:
         try:
+            self._pool.submit(
+                task_id,
+                run,
+                user_key=ctx.user_id,
+                doc_key=ctx.doc_token,
+                cost=cost,
+                # 重试的 fan-out 父任务 mode 为 "a,b"，取第一个 mode 的分池
+                pool=self._mode_pools.get(ctx.mode.split(",")[0], DEFAULT_POOL),
+            )
+        except QueueFullError:
+            # 预检与提交之间队列被占满
+            await self._tasks.fail(task_id, "任务队列已满，请稍后重试")
+            raise
+
+    async def _report_queue(self, task_ids: List[str]) -> None:
+        """
+        队列变化后刷新等待中任务的排队位置与预计开始时间（写入 progress，SSE / 长轮询可感知）。
+        """
+        for task_id in task_ids:
+            # 逐个取最新位置：写入期间可能已有任务出队
+            position = self._pool.position(task_id)
+            if not position:
+                continue
+            extra: Dict[str, Any] = {"queue_position": position}
+            wait_s = self._pool.estimated_wait_s(task_id)
+            if wait_s is not None:
+                extra["estimated_start_at"] = round(time.time() + wait_s)
             await self._tasks.update_progress(
-                task_id, stage="started", percent=1, message="开始处理"
+                task_id,
+                stage="queued",
+                percent=0,
+                message=_queued_message(position),
+                extra=extra,
             )
 
-            async def progress(stage: str, percent: int, message: str) -> None:
+    def _spawn(self, task_id: str, coro: Coroutine[Any, Any, Any]) -> None:
+        handle = asyncio.create_task(coro)
+        self._handles[task_id] = handle
+
+        def _forget(_: asyncio.Task[Any]) -> None:
+            # 自动重试会以同一 task_id 登记新句柄，只移除自己
+            if self._handles.get(task_id) is handle:
+                del self._handles[task_id]
+
+        handle.add_done_callback(_forget)
+
+    async def _run(
+        self,
+        task_id: str,
+        ctx: ProcessContext,
+        *,
+        source: FetchedSource | None = None,
+        on_progress: ProgressFn | None = None,
+        allow_auto_retry: bool = True,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        执行单个任务并写回 TaskStore；成功返回序列化结果，失败返回 None。
+
+        每个阶段的产物都写入断点，重试时从最后完成的阶段继续。
+        """
+        # 本进程执行中的任务及其当前阶段（/metrics 按阶段统计）
+        self._active_stages[task_id] = "started"
+        try:
+            checkpoints = await self._checkpoints_for(task_id)
+            timeline = await self._start_timeline(task_id)
+            try:
                 await self._tasks.update_progress(
-                    task_id, stage=stage, percent=percent, message=message
+                    task_id,
+                    stage="started",
+                    percent=1,
+                    message="开始处理",
+                    timeline=timeline.to_list(),
+                )
+
+                async def progress(stage: str, percent: int, message: str) -> None:
+                    current = await self._tasks.get(task_id)
+                    if current is not None and current.status == "cancelled":
+                        # 在其他 worker 上被取消（本进程没有句柄）：在阶段边界中断执行
+                        raise asyncio.CancelledError()
+                    _advance(timeline, stage)
+                    self._active_stages[task_id] = stage
+                    await self._tasks.update_progress(
+                        task_id,
+                        stage=stage,
+                        percent=percent,
+                        message=message,
+                        timeline=timeline.to_list(),
+                    )
+                    if on_progress:
+                        await on_progress(stage, percent, message)
+
+                result = await self._pm.process_doc(
+                    ctx, progress=progress, source=source, checkpoints=checkpoints
+                )
+            except asyncio.CancelledError:
+                await self._cleanup_cancelled(task_id, ctx, checkpoints)
+                raise
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Processing failed task_id=%s doc=%s", task_id, ctx.doc_token)
+                timeline.finish()
+                await self._tasks.fail(task_id, str(exc), timeline=timeline.to_list())
+                if allow_auto_retry and checkpoints.has("processor"):
+                    await self._schedule_auto_retry(task_id)
+                return None
+
+            timeline.finish()
+            spans = timeline.to_list()
+            self.stage_stats.observe(ctx.mode, spans)
+            serialized = self._serialize_process_result(result)
+            await self._tasks.succeed(task_id, serialized, timeline=spans)
+            return serialized
+        finally:
+            self._active_stages.pop(task_id, None)
+
+    async def _run_many(
+        self, parent_id: str, ctx: ProcessContext, children: Dict[str, str]
+    ) -> None:
+        modes = list(children.keys())
+        child_progress: Dict[str, Dict[str, Any]] = {
+            mode: {"task_id": task_id, "stage": "queued", "percent": 0}
+            for mode, task_id in children.items()
+        }
+
+        timeline = await self._start_timeline(parent_id)
+
+        async def parent_progress(stage: str, percent: int, message: str) -> None:
+            _advance(timeline, stage)
+            await self._tasks.update_progress(
+                parent_id,
+                stage=stage,
+                percent=percent,
+                message=message,
+                extra={"modes": child_progress},
+                timeline=timeline.to_list(),
+            )
+
+        await parent_progress("started", 1, "开始处理")
+        parent_checkpoints = await self._checkpoints_for(parent_id)
+        try:
+            saved_source = parent_checkpoints.get("source")
+            if saved_source:
+                source = FetchedSource(
+                    source_doc=SourceDoc(
+                        doc_token=ctx.doc_token,
+                        title=saved_source["title"],
+                        parent_token=saved_source.get("parent_token"),
+                    ),
+                    content=saved_source["content"],
                 )
+            else:
+                source = await self._pm.fetch_source(ctx, progress=parent_progress)
+                await parent_checkpoints.save(
+                    "source",
+                    {
+                        "title": source.source_doc.title,
+                        "parent_token": source.source_doc.parent_token,
+                        "content": source.content,
+                    },
+                )
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Fetching source failed task_id=%s doc=%s", parent_id, ctx.doc_token)
+            for task_id in children.values():
+                await self._tasks.fail(task_id, str(exc))
+            timeline.finish()
+            await self._tasks.fail(parent_id, str(exc), timeline=timeline.to_list())
+            return
+
+        def make_child_progress(mode: str) -> ProgressFn:
+            async def _on_progress(stage: str, percent: int, message: str) -> None:
+                child_progress[mode] = {
+                    "task_id": children[mode],
+                    "stage": stage,
+                    "percent": int(percent),
+                }
+                overall = sum(item["percent"] for item in child_progress.values()) // len(modes)
+                # 读取阶段已完成，整体进度从 15% 起算
+                await parent_progress("processing", max(15, overall), message)
+
+            return _on_progress
+
+        async def run_child(mode: str) -> Optional[Dict[str, Any]]:
+            child = await self._tasks.get(children[mode])
+            if child and child.status == "succeeded":
+                # 父任务重试时，已成功的 mode 直接复用结果
+                child_progress[mode] = {"task_id": children[mode], "stage": "done", "percent": 100}
+                return child.result
+            return await self._run(
+                children[mode],
+                replace(ctx, mode=mode),
+                source=source,
+                on_progress=make_child_progress(mode),
+                allow_auto_retry=False,
+            )
+
+        results = await asyncio.gather(*(run_child(mode) for mode in modes))
+
+        timeline.finish()
+        failed_modes = [mode for mode, result in zip(modes, results) if result is None]
+        if failed_modes:
+            await self._tasks.fail(
+                parent_id,
+                f"以下模式处理失败: {', '.join(failed_modes)}",
+                timeline=timeline.to_list(),
+            )
+            return
+        await self._tasks.succeed(
+            parent_id,
+            {
+                "children": {
+                    mode: {"task_id": children[mode], **result}
+                    for mode, result in zip(modes, results)
+                    if result is not None
+                }
+            },
+            timeline=timeline.to_list(),
+        )
+
+    async def _run_bulk(
+        self, parent_id: str, ctx: ProcessContext, spec: Mapping[str, Any]
+    ) -> None:
+        """
+        批量任务协调协程：枚举文档 → 逐篇创建 / 复用子任务并提交 → 汇总进度。
 
-            result = await self._pm.process_doc(ctx, progress=progress)
+        枚举结果写入父任务断点，重试时沿用同一份文档清单，已成功的文档不再处理。
+        """
+        checkpoints = await self._checkpoints_for(parent_id)
+        saved = checkpoints.get("bulk_docs")
+        try:
+            if saved:
+                items = [BulkItem(**item) for item in saved["items"]]
+            else:
+                await self._tasks.update_progress(
+                    parent_id, stage="listing", percent=1, message="正在枚举文档"
+                )
+                items = await self._pm.list_bulk_docs(
+                    ctx.doc_token,
+                    source_type=spec.get("source_type", "auto"),
+                    recursive=spec.get("recursive", True),
+                    limit=spec.get("max_docs"),
+                )
+                await checkpoints.save("bulk_docs", {"items": [asdict(item) for item in items]})
         except Exception as exc:  # noqa: BLE001
-            logger.exception("Processing failed task_id=%s doc=%s", task_id, ctx.doc_token)
-            await self._tasks.fail(task_id, str(exc))
+            logger.exception("Listing bulk docs failed task_id=%s token=%s", parent_id, ctx.doc_token)
+            await self._tasks.fail(parent_id, str(exc))
+            return
+
+        # 重试时按 doc_token 复用已有子任务
+        existing: Dict[str, str] = {}
+        parent = await self._tasks.get(parent_id)
+        for child_id in (parent.child_task_ids or ()) if parent else ():
+            child = await self._tasks.get(child_id)
+            if child:
+                existing[child.context["doc_token"]] = child_id
+
+        total = len(items)
+        counts = {"succeeded": 0, "failed": 0}
+        failed_ids: List[str] = []
+
+        async def report() -> None:
+            done = counts["succeeded"] + counts["failed"]
+            await self._tasks.update_progress(
+                parent_id,
+                stage="processing",
+                percent=max(1, done * 100 // total) if total else 100,
+                message=f"已完成 {done}/{total} 篇文档",
+                extra={"bulk": {"total": total, **counts}},
+            )
+
+        slots = asyncio.Semaphore(max(1, int(spec.get("concurrency", 1))))
+
+        async def track(child_id: str) -> None:
+            try:
+                child = await self._wait_finished(child_id)
+            finally:
+                slots.release()
+            if child is not None and child.status == "succeeded":
+                counts["succeeded"] += 1
+            else:
+                counts["failed"] += 1
+                failed_ids.append(child_id)
+            await report()
+
+        todo: List[tuple[BulkItem, Optional[str]]] = []
+        for item in items:
+            child_id = existing.get(item.doc_token)
+            child = await self._tasks.get(child_id) if child_id else None
+            if child is not None and child.status == "succeeded":
+                counts["succeeded"] += 1
+            else:
+                todo.append((item, child_id))
+        await report()
+
+        trackers: List[asyncio.Task[None]] = []
+        try:
+            for item, child_id in todo:
+                await slots.acquire()
+                current = await self._tasks.get(parent_id)
+                if current is None or current.status != "running":
+                    # 父任务已被取消：不再提交新的子任务
+                    slots.release()
+                    break
+                child_ctx = replace(
+                    ctx,
+                    doc_token=item.doc_token,
+                    wiki_node_token=item.wiki_node_token,
+                    wiki_space_id=item.wiki_space_id,
+                )
+                child = await self._tasks.get(child_id) if child_id else None
+                if child is None:
+                    child_id = await self._tasks.create_task(
+                        context=asdict(child_ctx), parent_task_id=parent_id
+                    )
+                    await self._submit_bulk_child(child_id, child_ctx)
+                elif child.status != "running":
+                    await self._tasks.restart(child_id)
+                    await self._submit_bulk_child(child_id, child_ctx)
+                # 仍在运行的子任务（在外部 worker 上执行）只需继续跟踪
+                trackers.append(asyncio.create_task(track(child_id)))
+            await asyncio.gather(*trackers)
+        finally:
+            # 协调协程被取消（用户取消 / 停机）时不再跟踪子任务
+            for tracker in trackers:
+                tracker.cancel()
+
+        summary = {"total": total, **counts, "failed_task_ids": failed_ids}
+        if failed_ids:
+            await self._tasks.update_progress(
+                parent_id,
+                stage="done",
+                percent=100,
+                message=f"{counts['failed']} 篇文档处理失败",
+                extra={"bulk": summary},
+            )
+            await self._tasks.fail(parent_id, f"{counts['failed']}/{total} 篇文档处理失败")
+            return
+        await self._tasks.succeed(parent_id, summary)
+
+    async def _submit_bulk_child(self, child_id: str, ctx: ProcessContext) -> None:
+        """提交批量任务的子任务；队列已满或正在停机时等待，而不是让子任务失败。"""
+        while True:
+            try:
+                await self._check_capacity()
+            except QueueFullError as exc:
+                await asyncio.sleep(exc.retry_after_s)
+                continue
+            except ServiceDrainingError:
+                # 停机排空会取消本协程并移交父任务
+                await asyncio.sleep(1.0)
+                continue
+            break
+        try:
+            await self._enqueue(
+                child_id, ctx, partial(self._run, child_id, ctx, allow_auto_retry=False)
+            )
+        except QueueFullError:
+            # 预检与提交之间队列被占满：子任务已标记失败，计入失败数，可通过重试父任务补跑
+            pass
+
+    async def _wait_finished(self, task_id: str) -> Optional[TaskSnapshot]:
+        """等待任务进入终态并返回其记录；任务被淘汰时返回 None。"""
+        task = await self._tasks.get(task_id)
+        while task is not None and task.status == "running":
+            task = await self._tasks.wait_for_change(task_id, task.version, 30.0)
+        return task
+
+    async def _cleanup_cancelled(
+        self, task_id: str, ctx: ProcessContext, checkpoints: StageCheckpoints
+    ) -> None:
+        task = await self._tasks.get(task_id)
+        if task is None or task.status != "cancelled":
+            # 非用户取消（如进程关停）：保留已创建的资源与断点，便于之后重试
+            return
+        logger.info("Task cancelled task_id=%s doc=%s mode=%s", task_id, ctx.doc_token, ctx.mode)
+        try:
+            await self._pm.cleanup_outputs(ctx, checkpoints)
+        except Exception:  # noqa: BLE001
+            logger.exception("Cleanup after cancel failed task_id=%s", task_id)
+
+    async def _start_timeline(self, task_id: str) -> TaskTimeline:
+        """
+        为本次执行建立时间线并绑定到当前上下文（重试时在已有时间线后追加）。
+        """
+        task = await self._tasks.get(task_id)
+        saved = task.timeline if task else None
+        timeline = TaskTimeline(saved)
+        if not saved:
+            # 从创建到开始执行的排队时间
+            timeline.mark("queued", now=task.created_at if task else None)
+        timeline.mark("started")
+        bind_timeline(timeline)
+        return timeline
+
+    async def _checkpoints_for(self, task_id: str) -> StageCheckpoints:
+        async def save(stage: str, data: Dict[str, Any]) -> None:
+            await self._tasks.save_checkpoint(task_id, stage, data)
+
+        saved = await self._tasks.get_checkpoints(task_id)
+        return StageCheckpoints(saved, save_fn=save)
+
+    async def _schedule_auto_retry(self, task_id: str) -> None:
+        task = await self._tasks.get(task_id)
+        attempts = (task.attempts or 1) if task else 1
+        if attempts > self._auto_retry_max:
             return
+        await self._tasks.update_progress(
+            task_id,
+            stage="retry_scheduled",
+            message=f"将在 {self._auto_retry_delay_s:g}s 后从断点自动重试（第 {attempts} 次）",
+        )
+        self._spawn(task_id, self._deferred_retry(task_id))
 
-        await self._tasks.succeed(task_id, self._serialize_process_result(result))
+    async def _deferred_retry(self, task_id: str) -> None:
+        await asyncio.sleep(self._auto_retry_delay_s)
+        try:
+            await self.retry(task_id)
+        except (KeyError, ValueError, QueueFullError, ServiceDrainingError) as exc:
+            # 期间已被手动重试、任务已不存在、队列已满或服务正在停机
+            logger.info("Skip auto retry task_id=%s: %s", task_id, exc)
 
     def _serialize_process_result(self, result: ProcessResult) -> Dict[str, Any]:
         processor_result = result.processor_result
@@ -72,3 +891,19 @@ class TriggerService:
         }
 
 
+def _queued_message(position: int) -> str:
+    return f"排队中，前面还有 {position - 1} 个任务"
+
+
+def _advance(timeline: TaskTimeline, stage: str) -> None:
+    # "done" 是终态标记，不单独计时
+    if stage == "done":
+        timeline.finish()
+    else:
+        timeline.mark(stage)
+
+
+def _context_from_task(context: Mapping[str, Any]) -> ProcessContext:
+    """从任务的完整 context 还原 ProcessContext（忽略 fan-out 父任务的附加字段）。"""
+    names = {f.name for f in fields(ProcessContext)}
+    return ProcessContext(**{k: v for k, v in context.items() if k in names})
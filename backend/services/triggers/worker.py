@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Optional, Set
+
+from backend.services.triggers.job_queue import RedisJobQueue
+from backend.services.triggers.service import TriggerService
+
+logger = logging.getLogger(__name__)
+
+
+class QueueWorker:
+    """
+    独立 worker 进程的主循环：从 RedisJobQueue 取任务，交给本进程的 TriggerService 执行。
+
+    - 同时执行的任务不超过 concurrency 个，有空位时才取下一个任务（其余任务留在共享队列，由其他 worker 领取）
+    - 定期写心跳并接管失联 worker 的任务；stop 时先等待执行中的任务，超时的中断并放回队首
+    - 取队列立即返回空（poll_timeout_s 为 0、连接重连中或后端不支持阻塞）时至少等待 idle_backoff_s 再取，
+      不空转事件循环
+    """
+
+    def __init__(
+        self,
+        *,
+        service: TriggerService,
+        queue: RedisJobQueue,
+        concurrency: int,
+        worker_id: str | None = None,
+        poll_timeout_s: float = 5.0,
+        idle_backoff_s: float = 0.1,
+    ) -> None:
+        self._service = service
+        self._queue = queue
+        self._slots = asyncio.Semaphore(concurrency)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._poll_timeout_s = poll_timeout_s
+        self._idle_backoff_s = idle_backoff_s
+        self._inflight: Set[asyncio.Task[None]] = set()
+        self._heartbeat: Optional[asyncio.Task[None]] = None
+        self._stopping = False
+
+    async def run(self) -> None:
+        """取任务直到 stop 被调用。"""
+        await self._queue.heartbeat(self.worker_id)
+        await self._queue.recover()
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        logger.info("Worker %s started", self.worker_id)
+        while not self._stopping:
+            await self._slots.acquire()
+            started = time.monotonic()
+            try:
+                task_id = await self._queue.pop(self.worker_id, self._poll_timeout_s)
+            except Exception:  # noqa: BLE001
+                self._slots.release()
+                logger.exception("Worker %s failed to pop job", self.worker_id)
+                await asyncio.sleep(1.0)
+                continue
+            if task_id is None:
+                self._slots.release()
+                await asyncio.sleep(max(0.0, self._idle_backoff_s - (time.monotonic() - started)))
+                continue
+            handle = asyncio.create_task(self._handle(task_id))
+            self._inflight.add(handle)
+            handle.add_done_callback(self._on_done)
+
+    async def stop(self, drain_s: float = 0.0) -> None:
+        """
+        停止取任务，等待执行中的任务最多 drain_s 秒；仍未完成的中断并放回共享队列（由其他 worker 从断点继续）。
+        """
+        self._stopping = True
+        if self._inflight and drain_s > 0:
+            await asyncio.wait(list(self._inflight), timeout=drain_s)
+        for handle in [*self._inflight, self._heartbeat]:
+            if handle is not None:
+                handle.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._heartbeat is not None:
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+        await self._queue.requeue(self.worker_id)
+        logger.info("Worker %s stopped", self.worker_id)
+
+    async def _handle(self, task_id: str) -> None:
+        try:
+            await self._service.run_queued(task_id)
+        except asyncio.CancelledError:
+            if self._stopping:
+                # 保留在处理中列表，stop 时放回队列
+                raise
+            # 任务已被取消（由 API 进程写入 cancelled 状态，执行在下一次进度上报时中断）
+        except Exception:  # noqa: BLE001
+            logger.exception("Worker %s failed to run task_id=%s", self.worker_id, task_id)
+        await self._queue.ack(self.worker_id, task_id)
+
+    def _on_done(self, handle: asyncio.Task[None]) -> None:
+        self._inflight.discard(handle)
+        self._slots.release()
+
+    async def _heartbeat_loop(self) -> None:
+        interval = self._queue.heartbeat_ttl_s / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._queue.heartbeat(self.worker_id)
+                await self._queue.recover()
+            except Exception:  # noqa: BLE001
+                logger.exception("Worker %s heartbeat failed", self.worker_id)
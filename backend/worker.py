@@ -0,0 +1,61 @@
+"""
+独立 worker 进程入口：python -m backend.worker
+
+配合 TASK_EXECUTION=external 使用：API 进程只把任务写入 Redis 队列，本进程领取并执行文档处理流水线，
+进度写回共享的 RedisTaskStore。可按负载启动多个进程。
+"""
+
+import asyncio
+import logging
+import signal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(name)s %(levelname)s %(message)s",
+)
+
+from backend.config import get_settings
+from backend.container import build_container
+from backend.services.triggers.worker import QueueWorker
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    settings = get_settings()
+    if settings.TASK_EXECUTION.lower() != "external":
+        raise SystemExit("backend.worker requires TASK_EXECUTION=external")
+
+    # 与 API 进程相同的依赖容器；自动重试同样写回共享队列，可能由其他 worker 领取
+    container = build_container(settings)
+    assert container.job_queue is not None
+    worker = QueueWorker(
+        service=container.trigger_service,
+        queue=container.job_queue,
+        concurrency=settings.TASK_WORKERS,
+    )
+
+    await container.start(resume_handoff=False)
+    container.report_startup()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = asyncio.create_task(worker.run())
+    try:
+        await stop.wait()
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        await worker.stop(settings.SHUTDOWN_DRAIN_S)
+        # 等待中的自动重试移交给下一个启动的进程；随后关闭队列、存储与各客户端连接池
+        await container.close(drain_s=0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -9,6 +9,10 @@ PORT="${PORT:-8001}"
 # 默认日志级别（可通过环境变量 LOG_LEVEL 或参数 --log-level 覆盖）
 LOG_LEVEL="${LOG_LEVEL:-info}"
 
+# 代码变更自动重载（开发用，可通过环境变量 RELOAD=1 或参数 --reload 开启）；
+# 重载会重启进程，执行中的任务需走停机排空
+RELOAD="${RELOAD:-0}"
+
 # 从参数中解析 --port / --port=xxxx 和 --log-level（并移除，避免传给 uvicorn 重复）
 UVICORN_EXTRA_ARGS=()
 while [[ $# -gt 0 ]]; do
@@ -35,6 +39,10 @@ while [[ $# -gt 0 ]]; do
       LOG_LEVEL="debug"
       shift
       ;;
+    --reload)
+      RELOAD=1
+      shift
+      ;;
     *)
       UVICORN_EXTRA_ARGS+=("$1")
       shift
@@ -50,7 +58,12 @@ if [[ -f .env ]]; then
   set +a
 fi
 
-echo "==> 准备启动后端：host=0.0.0.0 port=${PORT} log_level=${LOG_LEVEL}"
+# 停机排空时限（秒），与后端 SHUTDOWN_DRAIN_S 一致
+SHUTDOWN_DRAIN_S="${SHUTDOWN_DRAIN_S:-25}"
+# 已有连接（如 SSE 长连接）最多等待的秒数，之后进入应用的停机排空流程
+GRACEFUL_TIMEOUT_S="${GRACEFUL_TIMEOUT_S:-5}"
+
+echo "==> 准备启动后端：host=0.0.0.0 port=${PORT} log_level=${LOG_LEVEL} reload=${RELOAD}"
 
 # 获取监听该端口的进程 PID（尽量使用 ss 的过滤语法，避免 grep 误匹配）
 get_listen_pids() {
@@ -65,22 +78,27 @@ get_listen_pids() {
 PIDS="$(get_listen_pids "${PORT}" || true)"
 if [[ -n "${PIDS}" ]]; then
   echo "==> 检测到端口 ${PORT} 已被占用，尝试停止进程：${PIDS}"
-  # 先优雅退出
+  # 先优雅退出：旧进程停止接收新任务，等待执行中的任务，超时未完成的任务移交给新进程
   for pid in ${PIDS}; do
     kill -TERM "${pid}" 2>/dev/null || true
   done
 
-  # 等待最多 5 秒
-  for _ in {1..10}; do
+  # 等待连接关闭 + 停机排空时限，再留 5 秒落盘余量；进程退出即结束等待
+  WAIT_S=$(( ${SHUTDOWN_DRAIN_S%.*} + GRACEFUL_TIMEOUT_S + 5 ))
+  echo "==> 等待旧进程排空退出（最多 ${WAIT_S}s）"
+  for _ in $(seq 1 $(( WAIT_S * 2 ))); do
     sleep 0.5
-    STILL="$(get_listen_pids "${PORT}" || true)"
-    [[ -z "${STILL}" ]] && break
+    ALIVE=""
+    for pid in ${PIDS}; do
+      kill -0 "${pid}" 2>/dev/null && ALIVE="${ALIVE} ${pid}"
+    done
+    [[ -z "${ALIVE}" ]] && break
   done
 
-  # 仍存在则强杀
-  STILL="$(get_listen_pids "${PORT}" || true)"
+  # 仍存在则强杀（监听端口在收到 SIGTERM 后即关闭，按 PID 判断是否已退出）
+  STILL="${ALIVE}"
   if [[ -n "${STILL}" ]]; then
-    echo "==> 仍有进程占用端口 ${PORT}，强制结束：${STILL}"
+    echo "==> 旧进程未在时限内退出，强制结束：${STILL}"
     for pid in ${STILL}; do
       kill -KILL "${pid}" 2>/dev/null || true
     done
@@ -88,7 +106,13 @@ if [[ -n "${PIDS}" ]]; then
 fi
 
 # 设置日志级别，支持 info/debug 等
-exec uvicorn backend.main:app --reload --host 0.0.0.0 --port "${PORT}" --log-level "${LOG_LEVEL}" "${UVICORN_EXTRA_ARGS[@]}"
+RELOAD_ARGS=()
+if [[ "${RELOAD}" == "1" ]]; then
+  RELOAD_ARGS+=(--reload)
+fi
+
+exec uvicorn backend.main:app "${RELOAD_ARGS[@]}" --host 0.0.0.0 --port "${PORT}" --log-level "${LOG_LEVEL}" \
+  --timeout-graceful-shutdown "${GRACEFUL_TIMEOUT_S}" "${UVICORN_EXTRA_ARGS[@]}"
 
 
 
@@ -1,10 +1,14 @@
-import { TimeoutError } from "./errors.js";
+import { HTTPError, TimeoutError } from "./errors.js";
 import { HttpClient } from "./http.js";
 import type {
+  AddonBatchProcessAccepted,
+  AddonBatchProcessRequest,
+  AddonBulkProcessRequest,
   AddonProcessAccepted,
   AddonProcessRequest,
   AuthRequest,
   AuthResponse,
+  BulkTriggerOptions,
   GenerateOptions,
   GenerateResult,
   IdeaExpandOptions,
@@ -17,10 +21,21 @@ import type {
   TriggerOptions,
 } from "./types.js";
 
+// 会话缓存：未过期前页面重新加载也无需再次认证
+const SESSION_CACHE_KEY = "ai_idea_gen:session";
+const SESSION_REFRESH_MARGIN_MS = 60_000;
+
+// 长轮询单次最长挂起时间（秒），需不超过后端 wait_s 上限
+const LONG_POLL_WAIT_S = 25;
+
 function sleep(ms: number): Promise<void> {
   return new Promise((r) => setTimeout(r, ms));
 }
 
+function isFinished(task: TaskStatusResponse): boolean {
+  return task.status !== "running";
+}
+
 export class FeishuAIDocSDK {
   private readonly http: HttpClient;
   private readonly config: SDKConfig;
@@ -76,8 +91,12 @@ export class FeishuAIDocSDK {
 
   /**
    * 确保获取到用户 openId（懒加载）
+   * 优先复用本地缓存的未过期会话（不请求后端 / 飞书），否则用登录 code 换取 openId 与会话令牌
    */
   private async ensureOpenId(): Promise<string> {
+    if (!this._openId) {
+      this.restoreSession();
+    }
     if (!this._openId) {
       let code: string;
       if (this.config.codeProvider) {
@@ -93,6 +112,7 @@ export class FeishuAIDocSDK {
       const payload: AuthRequest = { code };
       const resp = await this.http.postJSON<AuthResponse>("/addon/auth", payload);
       this._openId = resp.open_id;
+      this.saveSession(resp);
     }
     if (!this._openId) {
       throw new Error("openId 获取失败");
@@ -111,6 +131,33 @@ export class FeishuAIDocSDK {
     return null;
   }
 
+  private restoreSession(): void {
+    const storage = this.getStorage();
+    if (!storage) return;
+    try {
+      const raw = storage.getItem(SESSION_CACHE_KEY);
+      const session = raw ? (JSON.parse(raw) as AuthResponse) : null;
+      // 临近过期的会话不再使用，避免请求途中失效
+      if (session && session.expires_at * 1000 - Date.now() > SESSION_REFRESH_MARGIN_MS) {
+        this._openId = session.open_id;
+        this.http.setSessionToken(session.session_token);
+      }
+    } catch {
+      // 缓存损坏时忽略，重新认证
+    }
+  }
+
+  private saveSession(session: AuthResponse): void {
+    this.http.setSessionToken(session.session_token);
+    const storage = this.getStorage();
+    if (!storage) return;
+    try {
+      storage.setItem(SESSION_CACHE_KEY, JSON.stringify(session));
+    } catch {
+      // localStorage 可能不存在或超限，忽略错误
+    }
+  }
+
   private getTaskCacheKey(docToken: string): string {
     return `ai_idea_gen:last_task:${docToken}`;
   }
@@ -213,7 +260,7 @@ export class FeishuAIDocSDK {
     const result = task.result ?? {};
     return {
       taskId: task.task_id,
-      status: task.status === "succeeded" ? "succeeded" : "failed",
+      status: task.status === "running" ? "failed" : task.status,
       childDocUrl: typeof result["child_doc_url"] === "string" ? result["child_doc_url"] : undefined,
       childDocToken: typeof result["child_doc_token"] === "string" ? result["child_doc_token"] : undefined,
       containerUrl: typeof result["container_url"] === "string" ? result["container_url"] : undefined,
@@ -273,7 +320,28 @@ export class FeishuAIDocSDK {
    * （保持向后兼容，需要手动传入 userId）
    */
   public async trigger(options: TriggerOptions): Promise<AddonProcessAccepted> {
-    const payload: AddonProcessRequest = {
+    const payload = this._toProcessRequest(options);
+    const headers = options.idempotencyKey ? { "Idempotency-Key": options.idempotencyKey } : undefined;
+    return await this.http.postJSON<AddonProcessAccepted>("/addon/process", payload, headers);
+  }
+
+  /**
+   * 一次请求触发多篇文档：对应后端 POST /api/addon/process/batch
+   * （按顺序返回每项的 task_id 或拒绝原因；单项失败不影响其他项，各项的 idempotencyKey 忽略，用 opts.idempotencyKey）
+   */
+  public async triggerBatch(
+    items: TriggerOptions[],
+    opts?: { idempotencyKey?: string }
+  ): Promise<AddonBatchProcessAccepted> {
+    const payload: AddonBatchProcessRequest = {
+      items: items.map((options) => this._toProcessRequest(options)),
+    };
+    const headers = opts?.idempotencyKey ? { "Idempotency-Key": opts.idempotencyKey } : undefined;
+    return await this.http.postJSON<AddonBatchProcessAccepted>("/addon/process/batch", payload, headers);
+  }
+
+  private _toProcessRequest(options: TriggerOptions): AddonProcessRequest {
+    return {
       token: options.token ?? null,
       doc_token: options.docToken ?? options.token ?? null,  // 优先使用 docToken，其次 token，避免空字符串
       user_id: options.userId,
@@ -283,14 +351,58 @@ export class FeishuAIDocSDK {
       wiki_node_token: options.wikiNodeToken ?? null,
       wiki_space_id: options.wikiSpaceId ?? null,
     };
-    return await this.http.postJSON<AddonProcessAccepted>("/addon/process", payload);
+  }
+
+  /**
+   * 批量处理云盘文件夹 / 知识库子树：对应后端 POST /api/addon/process/bulk
+   * （返回父任务 id，progress.bulk 为汇总进度，逐篇结果通过 getTaskChildren 查询）
+   */
+  public async triggerBulk(options: BulkTriggerOptions): Promise<AddonProcessAccepted> {
+    const payload: AddonBulkProcessRequest = {
+      token: options.token,
+      source_type: options.sourceType ?? "auto",
+      user_id: options.userId,
+      mode: options.mode,
+      concurrency: options.concurrency,
+      recursive: options.recursive,
+      max_docs: options.maxDocs,
+      trigger_source: "docs_addon",
+    };
+    return await this.http.postJSON<AddonProcessAccepted>("/addon/process/bulk", payload);
+  }
+
+  /**
+   * 分页查询子任务：对应后端 GET /api/addon/tasks/{task_id}/children（offset 为已读取的条数）
+   */
+  public async getTaskChildren(
+    taskId: string,
+    opts?: { limit?: number; offset?: number }
+  ): Promise<TaskStatusResponse[]> {
+    const params = new URLSearchParams({ limit: String(opts?.limit ?? 50) });
+    if (opts?.offset) params.set("cursor", String(opts.offset));
+    return await this.http.getJSON<TaskStatusResponse[]>(`/addon/tasks/${taskId}/children?${params.toString()}`);
   }
 
   /**
    * 查询任务状态：对应后端 GET /api/addon/tasks/{task_id}
    */
-  public async getTask(taskId: string): Promise<TaskStatusResponse> {
-    return await this.http.getJSON<TaskStatusResponse>(`/addon/tasks/${taskId}`);
+  public async getTask(
+    taskId: string,
+    opts?: { since?: number; waitS?: number }
+  ): Promise<TaskStatusResponse> {
+    const params = new URLSearchParams();
+    if (opts?.since !== undefined) params.set("since", String(opts.since));
+    if (opts?.waitS) params.set("wait_s", String(opts.waitS));
+    const query = params.toString();
+    return await this.http.getJSON<TaskStatusResponse>(`/addon/tasks/${taskId}${query ? `?${query}` : ""}`);
+  }
+
+  /**
+   * 取消运行中的任务：对应后端 POST /api/addon/tasks/{task_id}/cancel
+   * （fan-out 任务需传父任务 id；已创建的云盘子文档会被删除）
+   */
+  public async cancelTask(taskId: string): Promise<TaskStatusResponse> {
+    return await this.http.postJSON<TaskStatusResponse>(`/addon/tasks/${taskId}/cancel`, {});
   }
 
   /**
@@ -312,24 +424,88 @@ export class FeishuAIDocSDK {
   }
 
   /**
-   * 等待任务完成（轮询）
+   * 等待任务完成：优先订阅 SSE 事件流（GET /addon/tasks/{id}/events），
+   * 运行环境不支持流式读取或连接失败时回退为轮询
    */
   public async waitTask(
     taskId: string,
     opts?: { pollIntervalMs?: number; timeoutMs?: number }
   ): Promise<TaskStatusResponse> {
-    const pollIntervalMs = opts?.pollIntervalMs ?? 2000;
-    const timeoutMs = opts?.timeoutMs ?? 180_000;
-    const deadline = Date.now() + timeoutMs;
+    return await this._follow(taskId, {
+      pollIntervalMs: opts?.pollIntervalMs ?? 2000,
+      timeoutMs: opts?.timeoutMs ?? 180_000,
+      label: "waitTask",
+    });
+  }
 
+  /**
+   * 跟踪任务直到结束，每次拿到新状态时调用 onUpdate
+   */
+  private async _follow(
+    taskId: string,
+    opts: {
+      pollIntervalMs: number;
+      timeoutMs: number;
+      label: string;
+      onUpdate?: (task: TaskStatusResponse) => void;
+    }
+  ): Promise<TaskStatusResponse> {
+    const deadline = Date.now() + opts.timeoutMs;
+    const timeout = () => new TimeoutError(`${opts.label} timeout: task_id=${taskId}`);
+
+    if (this.config.useEventStream !== false) {
+      const task = await this._followEvents(taskId, deadline, opts.onUpdate);
+      if (task) return task;
+      if (Date.now() >= deadline) throw timeout();
+    }
+
+    // 长轮询：带上已知版本号，服务端挂起到版本变化或等待超时；旧版后端不返回 version 时按固定间隔轮询
+    let version: number | undefined;
     while (true) {
-      const task = await this.getTask(taskId);
-      if (task.status === "succeeded" || task.status === "failed") return task;
-      if (Date.now() >= deadline) {
-        throw new TimeoutError(`waitTask timeout: task_id=${taskId}`);
+      const waitS = version === undefined ? 0 : Math.min(LONG_POLL_WAIT_S, (deadline - Date.now()) / 1000);
+      const task = await this.getTask(taskId, waitS > 0 ? { since: version, waitS } : undefined);
+      opts.onUpdate?.(task);
+      if (isFinished(task)) return task;
+      if (Date.now() >= deadline) throw timeout();
+      if (task.version === undefined) await sleep(opts.pollIntervalMs);
+      version = task.version;
+    }
+  }
+
+  /**
+   * 通过 SSE 跟踪任务；返回 null 表示需要回退到轮询（或已到截止时间）
+   */
+  private async _followEvents(
+    taskId: string,
+    deadline: number,
+    onUpdate?: (task: TaskStatusResponse) => void
+  ): Promise<TaskStatusResponse | null> {
+    let lastEventId: string | undefined;
+    while (Date.now() < deadline) {
+      const controller = typeof AbortController !== "undefined" ? new AbortController() : undefined;
+      const timer = setTimeout(() => controller?.abort(), Math.max(0, deadline - Date.now()));
+      try {
+        for await (const evt of this.http.streamEvents(`/addon/tasks/${taskId}/events`, {
+          lastEventId,
+          signal: controller?.signal,
+        })) {
+          if (evt.id) lastEventId = evt.id;
+          if (evt.event === "gone") {
+            throw new HTTPError(`Task not found: task_id=${taskId}`, { status: 404, bodyText: evt.data });
+          }
+          const task = JSON.parse(evt.data) as TaskStatusResponse;
+          onUpdate?.(task);
+          if (isFinished(task)) return task;
+        }
+        // 连接被代理等中途断开：带上 Last-Event-ID 重连
+      } catch (err) {
+        if (err instanceof HTTPError && err.status === 404) throw err;
+        return null;
+      } finally {
+        clearTimeout(timer);
       }
-      await sleep(pollIntervalMs);
     }
+    return null;
   }
 
   /**
@@ -400,56 +576,50 @@ export class FeishuAIDocSDK {
     this.cacheTaskId(docToken, accepted.task_id);
     
     const taskId = accepted.task_id;
-    const pollIntervalMs = options.pollIntervalMs ?? 2000;
-    const timeoutMs = options.timeoutMs ?? 180_000;
-    const deadline = Date.now() + timeoutMs;
 
     let lastStage: string | undefined;
     let lastPercent: number | undefined;
     let lastStatus: string | undefined;
 
-    while (true) {
-      const task = await this.getTask(taskId);
-      const stage = task.progress?.stage ?? undefined;
-      const percent = task.progress?.percent ?? undefined;
-      const message = task.progress?.message ?? undefined;
-
-      const statusChanged = task.status !== lastStatus;
-      const stageChanged = stage !== lastStage;
-      const percentChanged = percent !== lastPercent;
-
-      if (options.onProgress && (statusChanged || stageChanged || percentChanged)) {
-        options.onProgress({
-          taskId,
-          status: task.status,
-          stage,
-          percent,
-          message,
-          raw: task,
-        });
-      }
+    const task = await this._follow(taskId, {
+      pollIntervalMs: options.pollIntervalMs ?? 2000,
+      timeoutMs: options.timeoutMs ?? 180_000,
+      label: "generate",
+      onUpdate: (update) => {
+        const stage = update.progress?.stage ?? undefined;
+        const percent = update.progress?.percent ?? undefined;
+        const message = update.progress?.message ?? undefined;
+
+        const statusChanged = update.status !== lastStatus;
+        const stageChanged = stage !== lastStage;
+        const percentChanged = percent !== lastPercent;
+
+        if (options.onProgress && (statusChanged || stageChanged || percentChanged)) {
+          options.onProgress({
+            taskId,
+            status: update.status,
+            stage,
+            percent,
+            message,
+            raw: update,
+          });
+        }
 
-      lastStatus = task.status;
-      lastStage = stage;
-      lastPercent = percent;
-
-      if (task.status === "succeeded" || task.status === "failed") {
-        const result = task.result ?? {};
-        return {
-          task,
-          childDocUrl: typeof result["child_doc_url"] === "string" ? result["child_doc_url"] : undefined,
-          childDocToken: typeof result["child_doc_token"] === "string" ? result["child_doc_token"] : undefined,
-          containerUrl: typeof result["container_url"] === "string" ? result["container_url"] : undefined,
-          containerToken: typeof result["container_token"] === "string" ? result["container_token"] : undefined,
-          error: task.error ?? undefined,
-        };
-      }
+        lastStatus = update.status;
+        lastStage = stage;
+        lastPercent = percent;
+      },
+    });
 
-      if (Date.now() >= deadline) {
-        throw new TimeoutError(`generate timeout: task_id=${taskId}`);
-      }
-      await sleep(pollIntervalMs);
-    }
+    const result = task.result ?? {};
+    return {
+      task,
+      childDocUrl: typeof result["child_doc_url"] === "string" ? result["child_doc_url"] : undefined,
+      childDocToken: typeof result["child_doc_token"] === "string" ? result["child_doc_token"] : undefined,
+      containerUrl: typeof result["container_url"] === "string" ? result["container_url"] : undefined,
+      containerToken: typeof result["container_token"] === "string" ? result["container_token"] : undefined,
+      error: task.error ?? undefined,
+    };
   }
 }
 
@@ -6,11 +6,14 @@ export class HTTPError extends SDKError {
   public readonly name = "HTTPError";
   public readonly status: number;
   public readonly bodyText?: string;
+  /** 429（任务队列已满）等响应的 Retry-After（秒） */
+  public readonly retryAfterS?: number;
 
-  constructor(message: string, opts: { status: number; bodyText?: string }) {
+  constructor(message: string, opts: { status: number; bodyText?: string; retryAfterS?: number }) {
     super(message);
     this.status = opts.status;
     this.bodyText = opts.bodyText;
+    this.retryAfterS = opts.retryAfterS;
   }
 }
 
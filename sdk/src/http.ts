@@ -1,6 +1,12 @@
 import { HTTPError } from "./errors.js";
 import type { SDKConfig } from "./types.js";
 
+export interface SSEEvent {
+  id?: string;
+  event: string;
+  data: string;
+}
+
 function joinUrl(base: string, path: string): string {
   const b = base.replace(/\/+$/, "");
   const p = path.startsWith("/") ? path : `/${path}`;
@@ -12,6 +18,8 @@ export class HttpClient {
   private readonly apiPrefix: string;
   private readonly authProvider?: SDKConfig["authProvider"];
   private readonly fetchImpl: typeof fetch;
+  // /addon/auth 签发的会话令牌，设置后随每个请求发送
+  private sessionToken: string | null = null;
 
   constructor(cfg: SDKConfig) {
     this.baseUrl = cfg.baseUrl;
@@ -23,14 +31,19 @@ export class HttpClient {
     }
   }
 
+  public setSessionToken(token: string | null): void {
+    this.sessionToken = token;
+  }
+
   public async postJSON<TResp>(
     path: string,
-    body: unknown
+    body: unknown,
+    extraHeaders?: Record<string, string>
   ): Promise<TResp> {
     return await this.requestJSON<TResp>(path, {
       method: "POST",
       body: JSON.stringify(body),
-      headers: { "Content-Type": "application/json" },
+      headers: { "Content-Type": "application/json", ...extraHeaders },
     });
   }
 
@@ -38,6 +51,69 @@ export class HttpClient {
     return await this.requestJSON<TResp>(path, { method: "GET" });
   }
 
+  /**
+   * 读取 Server-Sent Events 流（基于 fetch + ReadableStream，兼容没有 EventSource 的环境）
+   * - lastEventId：断线重连时从该事件之后继续
+   * - 运行环境不支持流式读取时抛出错误，由调用方回退到轮询
+   */
+  public async *streamEvents(
+    path: string,
+    opts?: { lastEventId?: string; signal?: AbortSignal }
+  ): AsyncGenerator<SSEEvent> {
+    const url = joinUrl(this.baseUrl, joinUrl(this.apiPrefix, path));
+    const headers = new Headers({ Accept: "text/event-stream" });
+    const token = await this.getAuthToken();
+    if (token) headers.set("Authorization", `Bearer ${token}`);
+    if (this.sessionToken) headers.set("X-Session-Token", this.sessionToken);
+    if (opts?.lastEventId) headers.set("Last-Event-ID", opts.lastEventId);
+
+    const resp = await this.fetchImpl(url, { method: "GET", headers, signal: opts?.signal });
+    if (!resp.ok) {
+      throw new HTTPError(`HTTP ${resp.status} for ${url}`, {
+        status: resp.status,
+        bodyText: await resp.text(),
+      });
+    }
+    if (!resp.body || typeof resp.body.getReader !== "function") {
+      throw new Error("Streaming response body is not supported in this environment");
+    }
+
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let current: Partial<SSEEvent> & { dataLines: string[] } = { dataLines: [] };
+    try {
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) return;
+        buffer += decoder.decode(value, { stream: true });
+        let newline: number;
+        while ((newline = buffer.indexOf("\n")) >= 0) {
+          const line = buffer.slice(0, newline).replace(/\r$/, "");
+          buffer = buffer.slice(newline + 1);
+          if (line === "") {
+            // 空行表示一个事件结束；只有注释（心跳）的块不产生事件
+            if (current.dataLines.length > 0) {
+              yield { id: current.id, event: current.event ?? "message", data: current.dataLines.join("\n") };
+            }
+            current = { dataLines: [] };
+          } else if (line.startsWith(":")) {
+            continue;
+          } else {
+            const sep = line.indexOf(":");
+            const field = sep >= 0 ? line.slice(0, sep) : line;
+            const val = sep >= 0 ? line.slice(sep + 1).replace(/^ /, "") : "";
+            if (field === "data") current.dataLines.push(val);
+            else if (field === "event") current.event = val;
+            else if (field === "id") current.id = val;
+          }
+        }
+      }
+    } finally {
+      reader.releaseLock();
+    }
+  }
+
   private async requestJSON<TResp>(
     path: string,
     init: RequestInit
@@ -47,14 +123,19 @@ export class HttpClient {
 
     const token = await this.getAuthToken();
     if (token) headers.set("Authorization", `Bearer ${token}`);
+    if (this.sessionToken && !headers.has("X-Session-Token")) {
+      headers.set("X-Session-Token", this.sessionToken);
+    }
 
     const resp = await this.fetchImpl(url, { ...init, headers });
     const text = await resp.text();
 
     if (!resp.ok) {
+      const retryAfter = Number(resp.headers.get("Retry-After"));
       throw new HTTPError(`HTTP ${resp.status} for ${url}`, {
         status: resp.status,
         bodyText: text,
+        retryAfterS: Number.isFinite(retryAfter) && retryAfter > 0 ? retryAfter : undefined,
       });
     }
 
@@ -15,12 +15,51 @@ export interface AddonProcessRequest {
   wiki_space_id?: string | null;
 }
 
+export interface AddonBulkProcessRequest {
+  /** 云盘文件夹 token 或知识库节点 node_token */
+  token: string;
+  source_type?: "auto" | "folder" | "wiki";
+  user_id: string;
+  mode?: Mode;
+  /** 同时排队 / 执行的文档数上限 */
+  concurrency?: number;
+  recursive?: boolean;
+  max_docs?: number;
+  trigger_source?: string | null;
+}
+
+export interface AddonBatchProcessRequest {
+  /** 每项与 AddonProcessRequest 相同 */
+  items: AddonProcessRequest[];
+}
+
+export interface AddonBatchItemResult {
+  index: number;
+  status: "accepted" | "rejected";
+  task_id?: string | null;
+  child_task_ids?: Record<string, string> | null;
+  /** 被拒绝的原因与对应的单请求状态码（400 / 429 / 502） */
+  error?: string | null;
+  status_code?: number | null;
+}
+
+export interface AddonBatchProcessAccepted {
+  accepted: number;
+  rejected: number;
+  items: AddonBatchItemResult[];
+}
+
 export interface AuthRequest {
-  code: string;
+  /** 携带有效的 X-Session-Token 时可不传 */
+  code?: string | null;
 }
 
 export interface AuthResponse {
   open_id: string;
+  /** 会话令牌：之后的请求通过 X-Session-Token 请求头携带，后端本地校验 */
+  session_token: string;
+  /** 会话过期时间（Unix 时间戳，秒） */
+  expires_at: number;
 }
 
 export interface AddonProcessAccepted {
@@ -29,7 +68,7 @@ export interface AddonProcessAccepted {
   message: string;
 }
 
-export type TaskStatus = "running" | "succeeded" | "failed";
+export type TaskStatus = "running" | "succeeded" | "failed" | "cancelled";
 
 export interface TaskStatusResponse {
   task_id: string;
@@ -40,12 +79,22 @@ export interface TaskStatusResponse {
     stage?: string;
     percent?: number;
     message?: string;
+    /** 排队中（stage=queued）时的队列位置，1 表示下一个执行 */
+    queue_position?: number;
+    /** 排队中时的预计开始时间（Unix 秒），按最近平均执行耗时估算 */
+    estimated_start_at?: number;
+    /** 批量任务的汇总进度 */
+    bulk?: { total: number; succeeded: number; failed: number };
   } | null;
   mode?: string;
   doc_token?: string;
   user_id?: string;
   created_at: number;
   updated_at?: number | null;
+  /** 记录版本号，每次状态/进度变更加一（SSE 事件 id 即为该值） */
+  version?: number;
+  parent_task_id?: string | null;
+  child_task_ids?: string[] | null;
 }
 
 export interface SDKConfig {
@@ -90,6 +139,12 @@ export interface SDKConfig {
    * 默认调用 DocMiniApp.Service.User.login()
    */
   codeProvider?: () => Promise<string>;
+
+  /**
+   * 是否通过 SSE 事件流等待任务（默认 true）；
+   * 设为 false 或运行环境不支持流式读取时使用轮询
+   */
+  useEventStream?: boolean;
 }
 
 export interface TriggerOptions {
@@ -109,6 +164,19 @@ export interface TriggerOptions {
   triggerSource?: string;
   wikiNodeToken?: string;
   wikiSpaceId?: string;
+  /** 可选：幂等键（Idempotency-Key 请求头），同一 key 的重复请求返回同一个 task_id */
+  idempotencyKey?: string;
+}
+
+export interface BulkTriggerOptions {
+  /** 云盘文件夹 token 或知识库节点 node_token */
+  token: string;
+  sourceType?: "auto" | "folder" | "wiki";
+  userId: string;
+  mode?: Mode;
+  concurrency?: number;
+  recursive?: boolean;
+  maxDocs?: number;
 }
 
 export interface ProcessOptions {
@@ -132,7 +200,7 @@ export interface SaveOptions {
 
 export interface GenerateOptions extends TriggerOptions {
   /**
-   * 轮询间隔（毫秒）
+   * 轮询间隔（毫秒，仅在无法使用 SSE 事件流时生效）
    */
   pollIntervalMs?: number;
   /**
@@ -140,7 +208,7 @@ export interface GenerateOptions extends TriggerOptions {
    */
   timeoutMs?: number;
   /**
-   * 进度回调：每次轮询拿到新状态/进度时触发
+   * 进度回调：每次收到新状态/进度时触发
    */
   onProgress?: (evt: {
     taskId: string;
@@ -166,7 +234,7 @@ export interface GenerateResult {
 
 export interface SaveResult {
   taskId: string;
-  status: "succeeded" | "failed";
+  status: "succeeded" | "failed" | "cancelled";
   childDocUrl?: string;
   childDocToken?: string;
   containerUrl?: string;
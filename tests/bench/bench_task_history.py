@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+任务历史查询基准：全表扫描 + 排序 vs 二级索引。
+
+对比：
+- scan：旧实现，遍历全部任务按 doc_token 过滤后按创建时间排序
+- index：TaskStore.list_tasks，按 doc 索引倒序取一页
+
+用法：
+    python -m tests.bench.bench_task_history --sizes 1000 10000 100000 --docs 500
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict
+
+from backend.core.task_store import TaskStore
+
+
+def _scan(tasks: Dict[str, Dict[str, Any]], doc_token: str, limit: int) -> list[str]:
+    items: list[tuple[str, float]] = []
+    for task_id, data in tasks.items():
+        ctx = data.get("context") or {}
+        if ctx.get("doc_token") != doc_token:
+            continue
+        items.append((task_id, float(data.get("created_at", 0.0))))
+    items.sort(key=lambda x: x[1], reverse=True)
+    return [task_id for task_id, _ in items[:limit]]
+
+
+async def _bench(size: int, *, docs: int, queries: int, limit: int) -> None:
+    store = TaskStore()
+    for i in range(size):
+        await store.create_task(context={"doc_token": f"doc_{i % docs}", "user_id": f"u_{i % 50}"})
+
+    start = time.perf_counter()
+    for q in range(queries):
+        _scan(store._tasks, f"doc_{q % docs}", limit)
+    scan_ms = (time.perf_counter() - start) * 1000 / queries
+
+    start = time.perf_counter()
+    for q in range(queries):
+        await store.list_tasks(doc_token=f"doc_{q % docs}", limit=limit)
+    index_ms = (time.perf_counter() - start) * 1000 / queries
+
+    print(f"  {size:>8} tasks  scan {scan_ms:9.3f} ms/query  index {index_ms:7.3f} ms/query")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"by-doc history query, {args.docs} docs, page size {args.limit}")
+    for size in args.sizes:
+        await _bench(size, docs=args.docs, queries=args.queries, limit=args.limit)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+任务记录内存基准：嵌套 dict（旧结构）vs __slots__ TaskRecord（大字段外置）。
+
+- dict：旧版记录结构，context 为完整的 asdict(ProcessContext)（含 selected_text），progress 为嵌套 dict，
+  状态 / 阶段字符串每次更新都是新对象
+- record：TaskRecord，进度平铺、字符串驻留，selected_text 单独存放
+
+分别统计“常驻”部分（轮询 / 历史查询实际访问的记录）与包含 selected_text 的总量；
+最后给出完整 TaskStore（含二级索引、淘汰队列）的单任务开销作为参考。
+
+用法：
+    python -m tests.bench.bench_task_record_size --tasks 10000 --selected-chars 2000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+from typing import Any, Callable, Dict
+
+from backend.core.manager import ProcessContext
+from backend.core.task_record import TaskRecord, split_context
+from backend.core.task_store import TaskStore
+
+
+def _context(i: int, selected_chars: int) -> Dict[str, Any]:
+    return asdict(
+        ProcessContext(
+            doc_token=f"doxcn{i:020d}",
+            user_id=f"ou_{i % 300:030d}",
+            mode="idea_expand",
+            trigger_source="addon",
+            selected_text="选" * selected_chars if selected_chars else None,
+        )
+    )
+
+
+def _legacy(i: int, selected_chars: int) -> Dict[str, Any]:
+    return {
+        "status": "".join(["succ", "eeded"]),
+        "created_at": time.time(),
+        "updated_at": time.time(),
+        "context": _context(i, selected_chars),
+        "result": {},
+        "progress": {"stage": "".join(["ll", "m"]), "percent": 60, "message": "生成中"},
+    }
+
+
+def _record(i: int, selected_chars: int) -> tuple[TaskRecord, Dict[str, Any]]:
+    compact, large = split_context(_context(i, selected_chars))
+    record = TaskRecord(status="running", created_at=time.time(), context=compact)
+    record = record.evolve({"progress": {"stage": "".join(["ll", "m"]), "percent": 60, "message": "生成中"}})
+    record = record.evolve({"status": "".join(["succ", "eeded"]), "result": {}, "updated_at": time.time()})
+    return record, large
+
+
+def _measure(fn: Callable[[], Any], tasks: int) -> tuple[Any, float]:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, (after - before) / tasks
+
+
+async def _fill_store(tasks: int, selected_chars: int) -> TaskStore:
+    store = TaskStore()
+    for i in range(tasks):
+        task_id = await store.create_task(context=_context(i, selected_chars))
+        await store.update_progress(task_id, stage="llm", percent=60, message="生成中")
+        await store.succeed(task_id, {})
+    return store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--selected-chars", type=int, default=2000)
+    args = parser.parse_args()
+    n, chars = args.tasks, args.selected_chars
+    text_bytes = sys.getsizeof("选" * chars) if chars else 0
+
+    legacy, legacy_total = _measure(lambda: [_legacy(i, chars) for i in range(n)], n)
+    records, record_total = _measure(lambda: [_record(i, chars) for i in range(n)], n)
+    store, store_total = _measure(lambda: asyncio.run(_fill_store(n, chars)), n)
+    _ = (legacy, records, store)
+
+    print(f"{n} tasks, selected_text {chars} chars ({text_bytes} bytes each)")
+    print(f"  {'':<22} {'hot bytes/task':>15} {'total bytes/task':>17}")
+    print(f"  {'dict (before)':<22} {legacy_total:15.0f} {legacy_total:17.0f}")
+    print(f"  {'TaskRecord (after)':<22} {record_total - text_bytes:15.0f} {record_total:17.0f}")
+    print(f"  {'TaskStore (+indexes)':<22} {store_total - text_bytes:15.0f} {store_total:17.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+TaskStore 后端基准：并发进度更新下的吞吐对比。
+
+对比：
+- memory：进程内 TaskStore
+- sqlite（write-through）：每次变更立即落盘（flush_interval_s=0）
+- sqlite（coalesced）：批量合并落盘（默认 0.5s 一个周期）
+
+用法：
+    python -m tests.bench.bench_task_store --tasks 200 --updates 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from backend.core.task_store import BaseTaskStore, TaskStore
+from backend.core.task_store_sqlite import SQLiteTaskStore
+
+
+async def _run(store: BaseTaskStore, *, tasks: int, updates: int) -> float:
+    await store.start()
+    task_ids = [
+        await store.create_task(context={"doc_token": f"doc_{i % 20}", "user_id": f"u_{i % 7}"})
+        for i in range(tasks)
+    ]
+
+    async def worker(task_id: str) -> None:
+        for i in range(updates):
+            await store.update_progress(task_id, stage="llm", percent=i, message="running")
+            # 让出事件循环，模拟真实任务中穿插的 IO
+            await asyncio.sleep(0)
+        await store.succeed(task_id, {"ok": True})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(task_id) for task_id in task_ids))
+    elapsed = time.perf_counter() - start
+    await store.close()
+    return elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=50)
+    args = parser.parse_args()
+
+    total = args.tasks * (args.updates + 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memory": lambda: TaskStore(),
+            "sqlite (write-through)": lambda: SQLiteTaskStore(
+                path=str(Path(tmp) / "through.db"), flush_interval_s=0
+            ),
+            "sqlite (coalesced 0.5s)": lambda: SQLiteTaskStore(
+                path=str(Path(tmp) / "coalesced.db"), flush_interval_s=0.5
+            ),
+        }
+        print(f"{args.tasks} tasks x {args.updates} progress updates ({total} writes)")
+        for name, factory in backends.items():
+            elapsed = await _run(factory(), tasks=args.tasks, updates=args.updates)
+            print(f"  {name:<26} {elapsed * 1000:9.1f} ms  {total / elapsed:12.0f} updates/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
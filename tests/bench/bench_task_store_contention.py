@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+TaskStore 并发争用基准：大量任务写进度的同时，前端轮询状态与历史查询。
+
+对比：
+- global-lock：旧实现的访问方式，所有读写经过同一把 asyncio.Lock，读取时复制任务 dict
+- snapshot：当前实现，copy-on-write 版本化记录，读取直接返回只读快照
+
+用法：
+    python -m tests.bench.bench_task_store_contention --tasks 2000 --updates 20 --readers 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict
+
+from backend.core.task_store import TaskStore
+
+
+class _GlobalLockTaskStore(TaskStore):
+    """复现旧的全局锁 + 读取复制语义，作为对照组。"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = asyncio.Lock()
+
+    async def get(self, task_id: str) -> Dict[str, Any] | None:  # type: ignore[override]
+        async with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    async def list_tasks(self, **kwargs: Any):  # type: ignore[override]
+        async with self._lock:
+            items, cursor = await super().list_tasks(**kwargs)
+            return [(task_id, dict(task)) for task_id, task in items], cursor
+
+    async def _update(self, task_id: str, payload: Dict[str, Any]) -> None:
+        async with self._lock:
+            await super()._update(task_id, payload)
+
+
+async def _run(store: TaskStore, *, tasks: int, updates: int, readers: int) -> Dict[str, float]:
+    task_ids = [
+        await store.create_task(context={"doc_token": f"doc_{i % 50}", "user_id": f"u_{i % 20}"})
+        for i in range(tasks)
+    ]
+    write_latencies: list[float] = []
+    reads = 0
+    stop = asyncio.Event()
+
+    async def writer(task_id: str) -> None:
+        for i in range(updates):
+            start = time.perf_counter()
+            await store.update_progress(task_id, stage="llm", percent=i, message="running")
+            write_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0)
+
+    async def reader(n: int) -> None:
+        nonlocal reads
+        while not stop.is_set():
+            await store.get(task_ids[n % len(task_ids)])
+            await store.list_tasks(user_id=f"u_{n % 20}", limit=50)
+            reads += 2
+            await asyncio.sleep(0)
+
+    reader_tasks = [asyncio.create_task(reader(n)) for n in range(readers)]
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(task_id) for task_id in task_ids))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*reader_tasks)
+
+    write_latencies.sort()
+    return {
+        "elapsed_ms": elapsed * 1000,
+        "writes_per_s": len(write_latencies) / elapsed,
+        "reads_per_s": reads / elapsed,
+        "write_p50_us": statistics.median(write_latencies) * 1e6,
+        "write_p99_us": write_latencies[int(len(write_latencies) * 0.99)] * 1e6,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.tasks} tasks x {args.updates} updates, {args.readers} concurrent pollers")
+    for name, factory in {"global-lock": _GlobalLockTaskStore, "snapshot": TaskStore}.items():
+        r = await _run(factory(), tasks=args.tasks, updates=args.updates, readers=args.readers)
+        print(
+            f"  {name:<12} {r['elapsed_ms']:8.1f} ms  writes {r['writes_per_s']:9.0f}/s  "
+            f"reads {r['reads_per_s']:9.0f}/s  write p50 {r['write_p50_us']:6.1f} us  "
+            f"p99 {r['write_p99_us']:7.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
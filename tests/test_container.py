@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import signal
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from backend.container import AppContainer, GracefulSignalHandler
+from backend.core.manager import ProcessManager
+
+
+def _closable(calls: list[str], name: str, method: str = "close", *, fail: bool = False) -> SimpleNamespace:
+    async def close(*_args, **_kwargs) -> None:
+        calls.append(name)
+        if fail:
+            raise RuntimeError(f"{name} failed")
+
+    return SimpleNamespace(**{method: close})
+
+
+class TestAppContainerClose(unittest.IsolatedAsyncioTestCase):
+    async def test_close_drains_before_releasing_clients_and_continues_on_failure(self) -> None:
+        calls: list[str] = []
+        container = AppContainer(
+            settings=MagicMock(),
+            feishu_client=_closable(calls, "feishu_client"),
+            llm_client=_closable(calls, "llm_client", fail=True),
+            workflow_registry=MagicMock(),
+            task_store=_closable(calls, "task_store"),
+            job_queue=None,
+            process_manager=_closable(calls, "process_manager"),
+            trigger_service=_closable(calls, "trigger_service", "drain"),
+            event_debouncer=_closable(calls, "event_debouncer", "flush"),
+            session_signer=MagicMock(),
+        )
+
+        with self.assertLogs("backend.container", level="ERROR"):
+            await container.close(drain_s=0)
+
+        self.assertEqual(
+            calls,
+            [
+                "event_debouncer",
+                "trigger_service",
+                "task_store",
+                "process_manager",
+                "llm_client",
+                "feishu_client",
+            ],
+        )
+
+
+class TestProcessManagerOutputHandlers(unittest.IsolatedAsyncioTestCase):
+    async def test_output_handler_is_built_once_per_mode_and_closed(self) -> None:
+        handler = SimpleNamespace(close=AsyncMock())
+        factory = MagicMock(return_value=handler)
+        workflow = SimpleNamespace(output_factory=factory)
+        pm = ProcessManager(feishu_client=MagicMock(), llm_client=MagicMock(), workflow_registry=MagicMock())
+
+        self.assertIs(pm._output_handler("idea_expand", workflow), handler)
+        self.assertIs(pm._output_handler("idea_expand", workflow), handler)
+        self.assertEqual(factory.call_count, 1)
+
+        await pm.close()
+        handler.close.assert_awaited_once()
+
+
+class TestGracefulSignalHandler(unittest.IsolatedAsyncioTestCase):
+    async def test_sigterm_begins_drain_before_forwarding_to_previous_handler(self) -> None:
+        forwarded: list[int] = []
+        original = signal.signal(signal.SIGTERM, lambda sig, frame: forwarded.append(sig))
+        begin = AsyncMock()
+        handler = GracefulSignalHandler(begin, grace_s=0.1)
+        handler.install()
+        try:
+            signal.raise_signal(signal.SIGTERM)
+            await asyncio.sleep(0.05)
+            begin.assert_awaited_once()
+            self.assertEqual(forwarded, [])
+            await asyncio.sleep(0.1)
+            self.assertEqual(forwarded, [signal.SIGTERM])
+        finally:
+            handler.uninstall()
+            signal.signal(signal.SIGTERM, original)
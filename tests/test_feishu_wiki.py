@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from backend.services.feishu.cache import TTLCache
+from backend.services.feishu.errors import FeishuAPIError
+from backend.services.feishu.wiki import FeishuWikiClient
+
+
+def _make_base(request: AsyncMock) -> SimpleNamespace:
+    return SimpleNamespace(
+        meta_cache=TTLCache(ttl_s=300),
+        settings=SimpleNamespace(FEISHU_NEGATIVE_CACHE_TTL_S=60),
+        request=request,
+    )
+
+
+class TestWikiResolveToken(unittest.IsolatedAsyncioTestCase):
+    async def test_resolution_is_cached_including_misses(self) -> None:
+        async def request(method, path, *, params=None, json=None):
+            if params["token"] == "wikcn_node":
+                return {"data": {"node": {"obj_token": "doxc_obj", "space_id": "7"}}}
+            raise FeishuAPIError("not a wiki node", status_code=400)
+
+        base = _make_base(AsyncMock(side_effect=request))
+        wiki = FeishuWikiClient(base)
+
+        for _ in range(2):
+            self.assertEqual(
+                await wiki.resolve_token("wikcn_node"),
+                {"doc_token": "doxc_obj", "wiki_node_token": "wikcn_node", "wiki_space_id": "7"},
+            )
+            self.assertIsNone((await wiki.resolve_token("Abc123docx"))["wiki_node_token"])
+        # 旧版 doc token 不查询 wiki
+        self.assertEqual((await wiki.resolve_token("doxcnLegacy"))["doc_token"], "doxcnLegacy")
+        self.assertEqual(base.request.await_count, 2)
+
+    async def test_throttled_lookup_is_not_cached(self) -> None:
+        base = _make_base(AsyncMock(side_effect=FeishuAPIError("rate limited", status_code=429)))
+        wiki = FeishuWikiClient(base)
+
+        await wiki.resolve_token("Abc123docx")
+        await wiki.resolve_token("Abc123docx")
+        self.assertEqual(base.request.await_count, 2)
+
+    async def test_http_200_error_code_is_cached_unless_rate_limited(self) -> None:
+        # 飞书以 HTTP 200 + 非 0 code 返回业务错误（如节点不存在）
+        base = _make_base(
+            AsyncMock(side_effect=FeishuAPIError("node not found", status_code=200, code=131005))
+        )
+        wiki = FeishuWikiClient(base)
+        for _ in range(2):
+            self.assertIsNone((await wiki.resolve_token("Abc123docx"))["wiki_node_token"])
+        self.assertEqual(base.request.await_count, 1)
+
+        base = _make_base(
+            AsyncMock(side_effect=FeishuAPIError("frequency limit", status_code=200, code=99991400))
+        )
+        wiki = FeishuWikiClient(base)
+        await wiki.resolve_token("Abc123docx")
+        await wiki.resolve_token("Abc123docx")
+        self.assertEqual(base.request.await_count, 2)
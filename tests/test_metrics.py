@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import unittest
+
+from backend.core.metrics import UNMATCHED_ROUTE, MetricsRegistry, RouteTemplates, percentile
+
+
+class TestMetricsRegistry(unittest.IsolatedAsyncioTestCase):
+    async def test_render_prometheus_text(self) -> None:
+        registry = MetricsRegistry()
+        latency = registry.histogram("x_seconds", "latency", ("route",), buckets=(0.1, 1.0))
+        errors = registry.counter("x_errors_total", "errors", ("code",))
+        size = registry.gauge("x_tasks", "tasks")
+
+        async def collect() -> None:
+            size.set(3)
+
+        registry.add_collector(collect)
+        for value in (0.05, 0.1, 5.0):
+            latency.observe(value, "/a")
+        errors.inc('99"1')
+
+        lines = (await registry.render()).splitlines()
+        # 桶计数按 le 累计，+Inf 等于总数
+        self.assertIn('x_seconds_bucket{route="/a",le="0.1"} 2', lines)
+        self.assertIn('x_seconds_bucket{route="/a",le="1"} 2', lines)
+        self.assertIn('x_seconds_bucket{route="/a",le="+Inf"} 3', lines)
+        self.assertIn('x_seconds_count{route="/a"} 3', lines)
+        self.assertIn('x_errors_total{code="99\\"1"} 1', lines)
+        self.assertIn("x_tasks 3", lines)
+        with self.assertRaises(ValueError):
+            registry.counter("x_errors_total", "dup")
+
+    def test_route_templates_bound_label_values(self) -> None:
+        routes = RouteTemplates(
+            [
+                "/open-apis/drive/v1/files/{file_token}",
+                "/open-apis/drive/v1/files/create_folder",
+                "/open-apis/docx/v1/documents/{document_id}/blocks/{block_id}/descendant",
+            ]
+        )
+        self.assertEqual(
+            routes.match("/open-apis/docx/v1/documents/doxcnabc/blocks/Blk1/descendant?x=1"),
+            "/open-apis/docx/v1/documents/{document_id}/blocks/{block_id}/descendant",
+        )
+        # 全小写的 token 同样归并，静态路径优先于占位符
+        self.assertEqual(
+            routes.match("/open-apis/drive/v1/files/fldcnabc"), "/open-apis/drive/v1/files/{file_token}"
+        )
+        self.assertEqual(
+            routes.match("/open-apis/drive/v1/files/create_folder"),
+            "/open-apis/drive/v1/files/create_folder",
+        )
+        self.assertEqual(routes.match("/open-apis/drive/v1/files/a/b"), UNMATCHED_ROUTE)
+
+    def test_percentile_nearest_rank(self) -> None:
+        values = [float(i) for i in range(1, 11)]
+        self.assertEqual([percentile(values, pct) for pct in (1, 50, 90, 99, 100)], [1.0, 5.0, 9.0, 10.0, 10.0])
+        self.assertEqual(percentile([3.0], 50), 3.0)
@@ -3,6 +3,7 @@ from __future__ import annotations
 import unittest
 from unittest.mock import AsyncMock, Mock
 
+from backend.core.checkpoints import StageCheckpoints
 from backend.services.outputs.feishu_child_doc import FeishuChildDocOutputHandler
 from backend.services.outputs.base import SourceDoc
 from backend.core.manager import ProcessContext
@@ -95,6 +96,67 @@ class TestFeishuChildDocOutputHandler(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(out.child_doc_url, "https://feishu.cn/docx/doxc_child")
 
 
+class TestFeishuChildDocResume(unittest.IsolatedAsyncioTestCase):
+    """子文档已创建、授权前中断：重试时复用已创建的文档，只补做授权。"""
+
+    def _handler(self) -> tuple[FeishuChildDocOutputHandler, Mock]:
+        feishu = Mock()
+        feishu.drive.create_doc = AsyncMock()
+        feishu.drive.add_permission = AsyncMock()
+        feishu.create_wiki_child_doc = AsyncMock()
+        feishu.write_doc_content = AsyncMock()
+        feishu.append_reference_block = AsyncMock()
+        return FeishuChildDocOutputHandler(feishu_client=feishu, llm_client=Mock()), feishu
+
+    async def _handle(
+        self, handler: FeishuChildDocOutputHandler, ctx: ProcessContext, created: dict
+    ) -> tuple[object, StageCheckpoints]:
+        cps = StageCheckpoints({"output.title": {"title": "t"}, "output.created": created})
+        out = await handler.handle(
+            ctx=ctx,
+            source_doc=SourceDoc(doc_token="doxc_source", title="src", parent_token="fld_1"),
+            processor_result=ProcessorResult(title="t", content_md="# hi", summary="s"),
+            notify_user=False,
+            checkpoints=cps,
+        )
+        return out, cps
+
+    async def test_drive_path_reuses_created_doc(self) -> None:
+        handler, feishu = self._handler()
+        ctx = ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="idea_expand")
+
+        out, cps = await self._handle(
+            handler,
+            ctx,
+            {"child_doc_token": "doxc_child", "folder_token": "fld_new", "folder_name": "src"},
+        )
+
+        feishu.drive.create_doc.assert_not_awaited()
+        granted = [call.kwargs["token"] for call in feishu.drive.add_permission.await_args_list]
+        self.assertEqual(granted, ["fld_new", "doxc_child"])
+        self.assertEqual(feishu.write_doc_content.await_args.args[0], "doxc_child")
+        self.assertEqual(out.child_doc_url, "https://feishu.cn/docx/doxc_child")
+        self.assertTrue(cps.get("output.child_doc")["permission_granted"])
+
+    async def test_wiki_path_reuses_created_node(self) -> None:
+        handler, feishu = self._handler()
+        ctx = ProcessContext(
+            doc_token="doxc_source",
+            user_id="ou_xxx",
+            mode="idea_expand",
+            wiki_node_token="wikcn_parent",
+            wiki_space_id="spc_1",
+        )
+
+        out, _ = await self._handle(
+            handler, ctx, {"child_doc_token": "doxc_child", "child_node_token": "wikcn_child"}
+        )
+
+        feishu.create_wiki_child_doc.assert_not_awaited()
+        self.assertEqual(feishu.drive.add_permission.await_args.kwargs["token"], "wikcn_child")
+        self.assertEqual(out.child_doc_url, "https://feishu.cn/wiki/wikcn_child")
+
+
 if __name__ == "__main__":
     unittest.main()
 
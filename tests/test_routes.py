@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import os
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 路由模块导入时读取配置（请求模型的上下限）
+os.environ.setdefault("FEISHU_APP_ID", "cli_test")
+os.environ.setdefault("FEISHU_APP_SECRET", "test_secret")
+
+from backend.api.routes import router  # noqa: E402
+from backend.config import get_settings  # noqa: E402
+from backend.core.session import SessionSigner  # noqa: E402
+from backend.core.task_store import TaskStore  # noqa: E402
+
+
+class RouteTestCase(unittest.IsolatedAsyncioTestCase):
+    """挂载路由的最小应用：app.state.container 只提供被测路由用到的组件。"""
+
+    async def asyncSetUp(self) -> None:
+        self.signer = SessionSigner(secret="s3cret", ttl_s=60)
+        self.task_store = TaskStore()
+        self.trigger_service = SimpleNamespace(
+            retry=AsyncMock(), cancel=AsyncMock(), trigger_batch=AsyncMock()
+        )
+        self.feishu_client = SimpleNamespace(
+            exchange_code_for_user_token=AsyncMock(return_value={"open_id": "ou_alice"}),
+            resolve_token=AsyncMock(),
+        )
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.state.container = SimpleNamespace(
+            session_signer=self.signer,
+            task_store=self.task_store,
+            trigger_service=self.trigger_service,
+            feishu_client=self.feishu_client,
+            workflow_registry=SimpleNamespace(get=MagicMock()),
+        )
+        self.client = TestClient(app)
+
+    def session(self, open_id: str) -> dict[str, str]:
+        return {"X-Session-Token": self.signer.issue(open_id)[0]}
+
+
+class TestAddonAuth(RouteTestCase):
+    async def test_code_exchange_issues_a_session_token(self) -> None:
+        resp = self.client.post("/api/addon/auth", json={"code": "code_1"})
+
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["open_id"], "ou_alice")
+        self.assertEqual(self.signer.verify(body["session_token"]), "ou_alice")
+        self.feishu_client.exchange_code_for_user_token.assert_awaited_once_with("code_1")
+
+    async def test_valid_session_token_is_reused_without_calling_feishu(self) -> None:
+        headers = self.session("ou_alice")
+
+        resp = self.client.post("/api/addon/auth", json={}, headers=headers)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["session_token"], headers["X-Session-Token"])
+        self.feishu_client.exchange_code_for_user_token.assert_not_awaited()
+
+    async def test_expired_or_tampered_token_is_rejected(self) -> None:
+        expired, _ = self.signer.issue("ou_alice", now=time.time() - 120)
+        payload, _, signature = self.signer.issue("ou_alice")[0].partition(".")
+        forged, _ = SessionSigner(secret="other", ttl_s=60).issue("ou_alice")
+        tampered = f"{payload[:-2]}xx.{signature}"
+
+        for token in (expired, tampered, forged):
+            headers = {"X-Session-Token": token}
+            self.assertEqual(self.client.post("/api/addon/auth", json={}, headers=headers).status_code, 401)
+            self.assertEqual(
+                self.client.post("/api/addon/tasks/t1/cancel", headers=headers).status_code, 401
+            )
+        self.feishu_client.exchange_code_for_user_token.assert_not_awaited()
+
+        # 会话失效但带有 code 时重新走飞书认证
+        resp = self.client.post(
+            "/api/addon/auth", json={"code": "code_1"}, headers={"X-Session-Token": expired}
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.json()["session_token"], expired)
+
+    async def test_user_id_must_match_the_session_user(self) -> None:
+        resp = self.client.post(
+            "/api/addon/process",
+            json={"token": "doxc_1", "user_id": "ou_bob"},
+            headers=self.session("ou_alice"),
+        )
+
+        self.assertEqual(resp.status_code, 403)
+        self.feishu_client.resolve_token.assert_not_awaited()
+
+
+class TestTaskOwnership(RouteTestCase):
+    async def test_retry_and_cancel_require_the_task_owner(self) -> None:
+        task_id = await self.task_store.create_task(context={"user_id": "ou_alice"})
+
+        for action in ("retry", "cancel"):
+            url = f"/api/addon/tasks/{task_id}/{action}"
+            self.assertEqual(self.client.post(url, headers=self.session("ou_mallory")).status_code, 403)
+            self.assertEqual(self.client.post(url, headers=self.session("ou_alice")).status_code // 100, 2)
+
+        self.trigger_service.retry.assert_awaited_once_with(task_id)
+        self.trigger_service.cancel.assert_awaited_once_with(task_id)
+        self.assertEqual(
+            self.client.post("/api/addon/tasks/missing/cancel", headers=self.session("ou_alice")).status_code,
+            404,
+        )
+
+
+class TestBatchProcess(RouteTestCase):
+    async def test_unexpected_resolve_error_rejects_only_that_item(self) -> None:
+        async def resolve_token(token: str) -> dict[str, str | None]:
+            if token == "doxc_broken":
+                raise RuntimeError("connection reset")
+            return {"doc_token": token, "wiki_node_token": None, "wiki_space_id": None}
+
+        self.feishu_client.resolve_token.side_effect = resolve_token
+        self.trigger_service.trigger_batch.return_value = ["task_ok"]
+        items = [{"token": token, "user_id": "ou_alice"} for token in ("doxc_ok", "doxc_broken")]
+
+        with self.assertLogs("backend.api.routes", level="ERROR"):
+            resp = self.client.post(
+                "/api/addon/process/batch", json={"items": items}, headers=self.session("ou_alice")
+            )
+
+        self.assertEqual(resp.status_code, 202)
+        body = resp.json()
+        self.assertEqual((body["accepted"], body["rejected"]), (1, 1))
+        self.assertEqual(body["items"][0]["task_id"], "task_ok")
+        self.assertEqual(
+            (body["items"][1]["status"], body["items"][1]["status_code"]), ("rejected", 502)
+        )
+
+
+    async def test_item_limit_follows_current_settings(self) -> None:
+        items = [{"token": f"doxc_{i}", "user_id": "ou_alice"} for i in range(3)]
+
+        with patch.object(get_settings(), "BATCH_MAX_ITEMS", 2):
+            resp = self.client.post(
+                "/api/addon/process/batch", json={"items": items}, headers=self.session("ou_alice")
+            )
+
+        self.assertEqual(resp.status_code, 422)
+        self.feishu_client.resolve_token.assert_not_awaited()
+        self.trigger_service.trigger_batch.assert_not_awaited()
+
+
+class TestSessionRequired(RouteTestCase):
+    async def test_requests_without_a_session_token_are_rejected(self) -> None:
+        task_id = await self.task_store.create_task(context={"user_id": "ou_alice"})
+
+        for method, url, body in (
+            ("post", "/api/addon/process", {"token": "doxc_1", "user_id": "ou_alice"}),
+            ("get", f"/api/addon/tasks/{task_id}", None),
+            ("get", f"/api/addon/tasks/{task_id}/events", None),
+            ("get", f"/api/addon/tasks/{task_id}/children", None),
+            ("get", "/api/addon/tasks/by-doc?doc_token=d1", None),
+            ("get", "/api/addon/tasks/by-user?user_id=ou_alice", None),
+            ("post", f"/api/addon/tasks/{task_id}/cancel", None),
+        ):
+            resp = self.client.request(method, url, json=body)
+            self.assertEqual(resp.status_code, 401, url)
+        self.feishu_client.resolve_token.assert_not_awaited()
+        self.trigger_service.cancel.assert_not_awaited()
+
+    async def test_compat_mode_trusts_user_id_when_no_token_is_sent(self) -> None:
+        task_id = await self.task_store.create_task(context={"user_id": "ou_alice"})
+
+        with patch.object(get_settings(), "SESSION_REQUIRED", False):
+            self.assertEqual(self.client.get(f"/api/addon/tasks/{task_id}").status_code, 200)
+            # 携带令牌时仍校验本人
+            self.assertEqual(
+                self.client.get(
+                    f"/api/addon/tasks/{task_id}", headers=self.session("ou_mallory")
+                ).status_code,
+                403,
+            )
+
+
+class TestTaskReadOwnership(RouteTestCase):
+    async def test_status_events_and_children_require_the_task_owner(self) -> None:
+        task_id = await self.task_store.create_task(context={"user_id": "ou_alice", "doc_token": "d1"})
+        await self.task_store.succeed(task_id, {"child_doc_url": "https://feishu.cn/docx/x"})
+
+        for suffix in ("", "/events", "/children"):
+            url = f"/api/addon/tasks/{task_id}{suffix}"
+            self.assertEqual(self.client.get(url, headers=self.session("ou_mallory")).status_code, 403)
+            self.assertEqual(self.client.get(url, headers=self.session("ou_alice")).status_code, 200)
+
+    async def test_by_doc_lists_only_the_session_users_tasks(self) -> None:
+        mine = await self.task_store.create_task(context={"user_id": "ou_alice", "doc_token": "d1"})
+        await self.task_store.create_task(context={"user_id": "ou_bob", "doc_token": "d1"})
+
+        resp = self.client.get("/api/addon/tasks/by-doc?doc_token=d1", headers=self.session("ou_alice"))
+
+        self.assertEqual([item["task_id"] for item in resp.json()], [mine])
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import unittest
+from types import SimpleNamespace
+
+from backend.core.session import SessionSigner, build_session_signer
+
+
+class TestSessionSigner(unittest.TestCase):
+    def test_issue_and_verify_locally(self) -> None:
+        signer = SessionSigner(secret="s3cret", ttl_s=60)
+        token, expires_at = signer.issue("ou_xxx", now=1000.0)
+
+        self.assertEqual(expires_at, 1060.0)
+        self.assertEqual(signer.decode(token, now=1059.0), ("ou_xxx", 1060.0))
+        with self.assertRaisesRegex(ValueError, "expired"):
+            signer.verify(token, now=1060.0)
+
+        payload, _, signature = token.partition(".")
+        for forged in (
+            f"{payload}x.{signature}",
+            f"{payload}.{signature[:-1]}",
+            payload,
+            "不是令牌",
+        ):
+            with self.assertRaisesRegex(ValueError, "Invalid"):
+                signer.verify(forged, now=1000.0)
+        # 不同 secret 签发的令牌不被接受
+        with self.assertRaises(ValueError):
+            SessionSigner(secret="other", ttl_s=60).verify(token, now=1000.0)
+
+    def test_unconfigured_secret_is_random_per_process(self) -> None:
+        settings = SimpleNamespace(SESSION_SECRET=None, FEISHU_APP_SECRET="", SESSION_TTL_S=60)
+        with self.assertLogs("backend.core.session", level="WARNING"):
+            first = build_session_signer(settings)
+        with self.assertLogs("backend.core.session", level="WARNING"):
+            second = build_session_signer(settings)
+
+        token, _ = first.issue("ou_xxx")
+        with self.assertRaises(ValueError):
+            second.verify(token)
+
+        configured = SimpleNamespace(SESSION_SECRET="shared", FEISHU_APP_SECRET="", SESSION_TTL_S=60)
+        token, _ = build_session_signer(configured).issue("ou_xxx")
+        self.assertEqual(build_session_signer(configured).verify(token), "ou_xxx")
@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from backend.core.task_store import TaskCreate, TaskStore
+from backend.core.task_store_sqlite import SQLiteTaskStore
+
+try:
+    import fakeredis
+    from backend.core.task_store_redis import RedisTaskStore
+except ImportError:  # redis / fakeredis 为可选依赖
+    fakeredis = None
+
+
+class TestTaskStore(unittest.IsolatedAsyncioTestCase):
+    async def test_idempotency_key_returns_same_task(self) -> None:
+        store = TaskStore()
+        first = await store.create_task(context={"doc_token": "d"}, idempotency_key="evt_1")
+        second = await store.create_task(context={"doc_token": "d"}, idempotency_key="evt_1")
+        self.assertEqual(first, second)
+
+    async def test_list_task_ids_filters_and_orders(self) -> None:
+        store = TaskStore()
+        a = await store.create_task(context={"doc_token": "d1", "user_id": "u1"})
+        b = await store.create_task(context={"doc_token": "d1", "user_id": "u2"})
+        await store.create_task(context={"doc_token": "d2", "user_id": "u1"})
+        self.assertEqual(await store.list_task_ids(doc_token="d1"), [b, a])
+        self.assertEqual(len(await store.list_task_ids(user_id="u1")), 2)
+
+    async def test_get_returns_immutable_versioned_snapshot(self) -> None:
+        store = TaskStore()
+        task_id = await store.create_task(context={"doc_token": "d"})
+        before = await store.get(task_id)
+        await store.update_progress(task_id, stage="llm", percent=50)
+        after = await store.get(task_id)
+
+        self.assertEqual(before["progress"]["stage"], "accepted")
+        self.assertEqual((before["version"], after["version"]), (1, 2))
+        with self.assertRaises(TypeError):
+            after["status"] = "failed"  # type: ignore[index]
+
+    async def test_wait_for_change_wakes_on_update(self) -> None:
+        store = TaskStore()
+        task_id = await store.create_task(context={"doc_token": "d"})
+        waiter = asyncio.create_task(store.wait_for_change(task_id, 1, timeout=5))
+        await asyncio.sleep(0)
+        await store.update_progress(task_id, stage="llm", percent=10)
+        self.assertEqual((await waiter).version, 2)
+
+        unchanged = await store.wait_for_change(task_id, 2, timeout=0.01)
+        self.assertEqual(unchanged.version, 2)
+        self.assertEqual(store._watchers, {})
+
+    async def test_selected_text_is_kept_out_of_line(self) -> None:
+        store = TaskStore()
+        task_id = await store.create_task(
+            context={"doc_token": "d", "mode": "idea_expand", "selected_text": "long text"}
+        )
+        task = await store.get(task_id)
+        self.assertNotIn("selected_text", task.context)
+        self.assertFalse(hasattr(task, "__dict__"))
+        self.assertEqual((await store.get_context(task_id))["selected_text"], "long text")
+
+    async def test_list_tasks_paginates_with_cursor(self) -> None:
+        store = TaskStore()
+        ids = [await store.create_task(context={"doc_token": "d1", "user_id": "u1"}) for _ in range(5)]
+        await store.create_task(context={"doc_token": "d2", "user_id": "u1"})
+
+        page1, cursor = await store.list_tasks(doc_token="d1", limit=2)
+        self.assertEqual([task_id for task_id, _ in page1], ids[:2:-1])
+        page2, cursor = await store.list_tasks(doc_token="d1", limit=2, cursor=cursor)
+        self.assertEqual([task_id for task_id, _ in page2], ids[2:0:-1])
+        page3, cursor = await store.list_tasks(doc_token="d1", limit=2, cursor=cursor)
+        self.assertEqual([task_id for task_id, _ in page3], ids[:1])
+        self.assertIsNone(cursor)
+
+        both, _ = await store.list_tasks(doc_token="d2", user_id="u1")
+        self.assertEqual(len(both), 1)
+        with self.assertRaises(ValueError):
+            await store.list_tasks(user_id="u1", cursor="bad")
+
+    async def test_sweep_evicts_expired_finished_tasks_and_keys(self) -> None:
+        store = TaskStore(retention_s=60, idempotency_ttl_s=30)
+        done = await store.create_task(context={"doc_token": "d1"}, idempotency_key="evt_1")
+        running = await store.create_task(context={"doc_token": "d1"})
+        await store.succeed(done, {})
+        now = (await store.get(done))["updated_at"]
+
+        self.assertEqual(await store.sweep(now=now + 10), 0)
+        self.assertEqual(await store.sweep(now=now + 61), 1)
+        self.assertIsNone(await store.get(done))
+        self.assertEqual(await store.list_task_ids(doc_token="d1"), [running])
+        self.assertEqual(len(store._idempotency), 0)
+        stats = await store.stats()
+        self.assertEqual((stats["tasks"], stats["running"], stats["evicted_total"]), (1, 1, 1))
+
+    async def test_max_records_keeps_running_tasks(self) -> None:
+        store = TaskStore(max_records=2)
+        first = await store.create_task(context={})
+        second = await store.create_task(context={})
+        await store.fail(second, "boom")
+        third = await store.create_task(context={})
+        # 超出上限时只淘汰已结束的任务
+        self.assertIsNone(await store.get(second))
+        self.assertIsNotNone(await store.get(first))
+        self.assertIsNotNone(await store.get(third))
+
+
+class TestSQLiteTaskStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self._tmp.name) / "tasks.db")
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    async def test_tasks_survive_restart(self) -> None:
+        store = SQLiteTaskStore(path=self.path, flush_interval_s=60)
+        await store.start()
+        done = await store.create_task(
+            context={"doc_token": "d1", "user_id": "u1", "selected_text": "划词"},
+            idempotency_key="evt_1",
+        )
+        await store.succeed(done, {"child_doc_url": "https://feishu.cn/docx/x"})
+        running = await store.create_task(context={"doc_token": "d1", "user_id": "u1"})
+        await store.save_checkpoint(running, "processor", {"title": "t", "content_md": "md"})
+        await store.close()
+
+        reopened = SQLiteTaskStore(path=self.path, flush_interval_s=60)
+
+        await reopened.start()
+        task = await reopened.get(done)
+        self.assertEqual(task["status"], "succeeded")
+        self.assertEqual(task["result"]["child_doc_url"], "https://feishu.cn/docx/x")
+        self.assertEqual((await reopened.get_context(done))["selected_text"], "划词")
+        self.assertEqual(await reopened.list_task_ids(doc_token="d1"), [running, done])
+        self.assertEqual(
+            await reopened.create_task(context={}, idempotency_key="evt_1"), done
+        )
+        # 重启前仍在运行的任务标记为失败，断点保留以便 retry
+        interrupted = await reopened.get(running)
+        self.assertEqual(interrupted["status"], "failed")
+        self.assertIn("processor", await reopened.get_checkpoints(running))
+        await reopened.close()
+
+    async def test_database_is_opened_on_start(self) -> None:
+        store = SQLiteTaskStore(path=self.path, flush_interval_s=60)
+        self.assertFalse(Path(self.path).exists())
+        await store.start()
+        self.assertTrue(Path(self.path).exists())
+        await store.close()
+
+    async def test_progress_updates_are_coalesced(self) -> None:
+        store = SQLiteTaskStore(path=self.path, flush_interval_s=60)
+        await store.start()
+        task_id = await store.create_task(context={"doc_token": "d1"})
+        for i in range(50):
+            await store.update_progress(task_id, stage="llm", percent=i)
+        self.assertEqual(store._dirty, {task_id})
+        await store.flush()
+        self.assertEqual(store._dirty, set())
+
+        conn = sqlite3.connect(self.path)
+        (count,) = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()
+        (mode,) = conn.execute("PRAGMA journal_mode").fetchone()
+        conn.close()
+        self.assertEqual(count, 1)
+        self.assertEqual(mode, "wal")
+        await store.close()
+
+    async def test_evicted_tasks_are_deleted_from_disk(self) -> None:
+        store = SQLiteTaskStore(path=self.path, flush_interval_s=60, retention_s=60)
+        await store.start()
+        task_id = await store.create_task(context={"doc_token": "d1"}, idempotency_key="evt_1")
+        await store.succeed(task_id, {})
+        await store.flush()
+        await store.sweep(now=(await store.get(task_id))["updated_at"] + 61)
+        await store.close()
+
+        conn = sqlite3.connect(self.path)
+        (count,) = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()
+        (keys,) = conn.execute("SELECT COUNT(*) FROM idempotency").fetchone()
+        conn.close()
+        self.assertEqual((count, keys), (0, 0))
+
+    async def test_checkpoints_are_stored_out_of_line(self) -> None:
+        store = SQLiteTaskStore(path=self.path, flush_interval_s=60)
+        await store.start()
+        task_id = await store.create_task(context={"doc_token": "d1"})
+        await store.save_checkpoint(task_id, "processor", {"content_md": "md" * 1000})
+        await store.update_progress(task_id, stage="output", percent=90)
+        self.assertEqual((await store.get(task_id)).checkpoints, ("processor",))
+        await store.close()
+
+        conn = sqlite3.connect(self.path)
+        (data,) = conn.execute("SELECT data FROM tasks").fetchone()
+        (stored,) = conn.execute("SELECT data FROM checkpoints WHERE stage = 'processor'").fetchone()
+        # 旧版本内联在任务行中的断点数据在加载时迁移到 checkpoints 表
+        legacy = json.loads(data)
+        legacy.update(task_id="legacy", checkpoints={"source": {"title": "t"}})
+        with conn:
+            conn.execute(
+                "INSERT INTO tasks (task_id, doc_token, user_id, status, created_at, updated_at, data)"
+                " VALUES ('legacy', 'd1', NULL, 'failed', 0, 0, ?)",
+                (json.dumps(legacy),),
+            )
+        conn.close()
+        self.assertNotIn("md" * 1000, data)
+        self.assertEqual(json.loads(stored), {"content_md": "md" * 1000})
+
+        reopened = SQLiteTaskStore(path=self.path, flush_interval_s=60)
+
+        await reopened.start()
+        self.assertEqual(await reopened.get_checkpoints("legacy"), {"source": {"title": "t"}})
+        self.assertEqual((await reopened.get("legacy")).checkpoints, ("source",))
+        await reopened.close()
+        conn = sqlite3.connect(self.path)
+        (data,) = conn.execute("SELECT data FROM tasks WHERE task_id = 'legacy'").fetchone()
+        conn.close()
+        self.assertEqual(json.loads(data)["checkpoints"], ["source"])
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis not installed")
+class TestRedisTaskStore(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.server = fakeredis.FakeServer()
+
+    def _store(self, **kwargs: object) -> "RedisTaskStore":
+        client = fakeredis.aioredis.FakeRedis(server=self.server, decode_responses=True)
+        return RedisTaskStore(client=client, **kwargs)
+
+    async def test_tasks_are_shared_between_workers(self) -> None:
+        a, b = self._store(), self._store()
+        task_id = await a.create_task(
+            context={"doc_token": "d1", "user_id": "u1", "selected_text": "划词"},
+            idempotency_key="evt_1",
+        )
+        self.assertEqual(await b.create_task(context={}, idempotency_key="evt_1"), task_id)
+
+        waiter = asyncio.create_task(b.wait_for_change(task_id, 1, timeout=5))
+        await asyncio.sleep(0.05)
+        await a.update_progress(task_id, stage="llm", percent=40)
+        self.assertEqual((await waiter).progress["percent"], 40)
+
+        await b.fail(task_id, "boom")
+        self.assertTrue(await a.restart(task_id))
+        task = await a.get(task_id)
+        self.assertEqual((task.status, task.version, task.attempts), ("running", 4, 2))
+        self.assertEqual((await b.get_context(task_id))["selected_text"], "划词")
+        await a.close()
+        await b.close()
+
+    async def test_concurrent_creates_with_same_key_share_one_task(self) -> None:
+        stores = [self._store() for _ in range(4)]
+        results = await asyncio.gather(
+            *(s.get_or_create_task(context={"doc_token": "d1"}, idempotency_key="evt_1") for s in stores)
+        )
+        self.assertEqual(len({task_id for task_id, _ in results}), 1)
+        self.assertEqual(sum(created for _, created in results), 1)
+        self.assertIsNotNone(await stores[0].get(results[0][0]))
+        for s in stores:
+            await s.close()
+
+    async def test_list_tasks_and_sweep(self) -> None:
+        store = self._store(retention_s=60)
+        ids = [await store.create_task(context={"doc_token": "d1", "user_id": "u1"}) for _ in range(3)]
+        await store.create_task(context={"doc_token": "d2", "user_id": "u1"})
+
+        page1, cursor = await store.list_tasks(doc_token="d1", limit=2)
+        page2, cursor2 = await store.list_tasks(doc_token="d1", limit=2, cursor=cursor)
+        self.assertEqual([t for t, _ in page1 + page2], ids[::-1])
+        self.assertIsNone(cursor2)
+        self.assertEqual(len(await store.list_task_ids(doc_token="d2", user_id="u1")), 1)
+
+        await store.succeed(ids[0], {})
+        now = (await store.get(ids[0])).updated_at
+        self.assertEqual(await store.sweep(now=now + 61), 1)
+        self.assertIsNone(await store.get(ids[0]))
+        self.assertEqual(await store.list_task_ids(doc_token="d1"), ids[:0:-1])
+        self.assertEqual((await store.stats())["evicted_total"], 1)
+        await store.close()
+
+    async def test_checkpoints_are_stored_out_of_line(self) -> None:
+        a, b = self._store(), self._store()
+        task_id = await a.create_task(context={"doc_token": "d1"})
+        await a.save_checkpoint(task_id, "processor", {"content_md": "md"})
+        await b.save_checkpoint(task_id, "source", {"title": "t"})
+        await a.update_progress(task_id, stage="output", percent=90)
+
+        self.assertEqual((await b.get(task_id)).checkpoints, ("processor", "source"))
+        self.assertEqual(
+            await b.get_checkpoints(task_id),
+            {"processor": {"content_md": "md"}, "source": {"title": "t"}},
+        )
+        self.assertNotIn("content_md", await a._redis.hget(a._task_key(task_id), "record"))
+        await a.close()
+        await b.close()
+
+    async def test_legacy_inline_checkpoints_are_migrated(self) -> None:
+        store = self._store()
+        task_id = await store.create_task(context={"doc_token": "d1"})
+        key = store._task_key(task_id)
+        record = json.loads(await store._redis.hget(key, "record"))
+        record["checkpoints"] = {"source": {"title": "t"}}
+        # 旧记录的序列化格式不一定带空格，按解析结果而不是字符串判断
+        await store._redis.hset(key, "record", json.dumps(record, separators=(",", ":")))
+
+        self.assertEqual(await store.get_checkpoints(task_id), {"source": {"title": "t"}})
+        await store.save_checkpoint(task_id, "processor", {"content_md": "md"})
+        self.assertEqual(
+            await store.get_checkpoints(task_id),
+            {"source": {"title": "t"}, "processor": {"content_md": "md"}},
+        )
+        self.assertEqual((await store.get(task_id)).checkpoints, ("source", "processor"))
+        await store.close()
+
+    async def test_children_link_to_existing_parent_only(self) -> None:
+        store = self._store()
+        parent_id = await store.create_task(context={"doc_token": "d1"})
+        results = await store.get_or_create_tasks(
+            [
+                TaskCreate(context={"doc_token": "d2"}, parent_task_id=parent_id),
+                TaskCreate(context={"doc_token": "d3"}, parent_task_id="missing"),
+            ]
+        )
+        (child_id, _), (orphan_id, _) = results
+        self.assertEqual((await store.get(parent_id)).child_task_ids, (child_id,))
+        self.assertEqual((await store.get(child_id)).parent_task_id, parent_id)
+        self.assertIsNone((await store.get(orphan_id)).parent_task_id)
+        self.assertIsNone(await store.get("missing"))
+        await store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
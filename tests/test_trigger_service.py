@@ -0,0 +1,729 @@
+from __future__ import annotations
+
+import asyncio
+import tempfile
+import unittest
+from dataclasses import replace
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+from backend.core.manager import BulkItem, FetchedSource, ProcessContext, ProcessResult
+from backend.core.task_store import TaskStore
+from backend.core.task_store_sqlite import SQLiteTaskStore
+from backend.core.timeline import StageLatencyStats, record_call
+from backend.services.outputs.base import OutputResult, SourceDoc
+from backend.services.processors.base import ProcessorResult
+from backend.services.triggers.debounce import EventDebouncer
+from backend.services.triggers.pool import PoolSpec, QueueFullError, WorkerPool
+from backend.services.triggers.service import ServiceDrainingError, TriggerService
+
+try:
+    import fakeredis
+    from backend.core.task_store_redis import RedisTaskStore
+    from backend.services.triggers.job_queue import RedisJobQueue
+    from backend.services.triggers.worker import QueueWorker
+except ImportError:  # redis / fakeredis 为可选依赖
+    fakeredis = None
+
+
+def _make_result(mode: str) -> ProcessResult:
+    return ProcessResult(
+        child_doc_token=f"doxc_{mode}",
+        child_doc_url=f"https://feishu.cn/docx/doxc_{mode}",
+        processor_result=ProcessorResult(title=f"t-{mode}", content_md="# hi"),
+        output_result=OutputResult(child_doc_token=f"doxc_{mode}", metadata={}),
+    )
+
+
+async def _wait_finished(store: TaskStore, task_id: str) -> dict:
+    for _ in range(200):
+        task = await store.get(task_id)
+        if task and task["status"] != "running":
+            return task
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"task {task_id} not finished")
+
+
+class TestTriggerServiceFanOut(unittest.IsolatedAsyncioTestCase):
+    def _make_ctx(self) -> ProcessContext:
+        return ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="idea_expand")
+
+    async def test_fan_out_fetches_source_once(self) -> None:
+        source = FetchedSource(source_doc=SourceDoc(doc_token="doxc_source", title="t"), content="c")
+        pm = Mock()
+        pm.fetch_source = AsyncMock(return_value=source)
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            await progress("llm", 35, "llm")
+            return _make_result(ctx.mode)
+
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm)
+
+        parent_id, children = await service.trigger_many(
+            ctx=self._make_ctx(), modes=["idea_expand", "research"]
+        )
+        parent = await _wait_finished(store, parent_id)
+
+        pm.fetch_source.assert_awaited_once()
+        self.assertEqual(pm.process_doc.await_count, 2)
+        for call in pm.process_doc.await_args_list:
+            self.assertIs(call.kwargs["source"], source)
+        self.assertEqual(parent["status"], "succeeded")
+        self.assertEqual(sorted(parent["child_task_ids"]), sorted(children.values()))
+        self.assertEqual(
+            parent["result"]["children"]["research"]["child_doc_token"], "doxc_research"
+        )
+        for mode, task_id in children.items():
+            child = await _wait_finished(store, task_id)
+            self.assertEqual(child["status"], "succeeded")
+            self.assertEqual(child["parent_task_id"], parent_id)
+            self.assertEqual(child["context"]["mode"], mode)
+
+    async def test_fan_out_reports_failed_modes(self) -> None:
+        source = FetchedSource(source_doc=SourceDoc(doc_token="doxc_source", title="t"), content="c")
+        pm = Mock()
+        pm.fetch_source = AsyncMock(return_value=source)
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            if ctx.mode == "research":
+                raise RuntimeError("boom")
+            return _make_result(ctx.mode)
+
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm)
+
+        parent_id, children = await service.trigger_many(
+            ctx=self._make_ctx(), modes=["idea_expand", "research"]
+        )
+        parent = await _wait_finished(store, parent_id)
+
+        self.assertEqual(parent["status"], "failed")
+        self.assertIn("research", parent["error"])
+        child = await _wait_finished(store, children["idea_expand"])
+        self.assertEqual(child["status"], "succeeded")
+
+
+class TestTriggerServiceRetry(unittest.IsolatedAsyncioTestCase):
+    async def test_retry_resumes_from_processor_checkpoint(self) -> None:
+        calls: list[set[str]] = []
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            calls.append(set(checkpoints.stages()))
+            if not checkpoints.has("processor"):
+                await checkpoints.save("processor", {"title": "t", "content_md": "# md"})
+                raise RuntimeError("write_doc_content failed")
+            return _make_result(ctx.mode)
+
+        pm = Mock()
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm)
+
+        task_id = await service.trigger(
+            ctx=ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="research")
+        )
+        task = await _wait_finished(store, task_id)
+        self.assertEqual(task["status"], "failed")
+
+        await service.retry(task_id)
+        task = await _wait_finished(store, task_id)
+
+        self.assertEqual(task["status"], "succeeded")
+        self.assertEqual(task["attempts"], 2)
+        self.assertEqual(calls, [set(), {"processor"}])
+
+        with self.assertRaises(ValueError):
+            await service.retry(task_id)
+        with self.assertRaises(KeyError):
+            await service.retry("missing")
+
+    async def test_auto_retry_after_processor_checkpoint(self) -> None:
+        attempts = 0
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                await checkpoints.save("processor", {"title": "t", "content_md": "# md"})
+                raise RuntimeError("transient")
+            return _make_result(ctx.mode)
+
+        pm = Mock()
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        store = TaskStore()
+        service = TriggerService(
+            task_store=store, process_manager=pm, auto_retry_max=1, auto_retry_delay_s=0
+        )
+
+        task_id = await service.trigger(
+            ctx=ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="research")
+        )
+        for _ in range(200):
+            task = await store.get(task_id)
+            if task["status"] == "succeeded":
+                break
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(task["status"], "succeeded")
+        self.assertEqual(attempts, 2)
+
+
+class TestTriggerServiceCancel(unittest.IsolatedAsyncioTestCase):
+    async def test_cancel_interrupts_run_and_cleans_up_outputs(self) -> None:
+        started = asyncio.Event()
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            await checkpoints.save("output.created", {"child_doc_token": "doxc_child"})
+            started.set()
+            await asyncio.sleep(60)
+            return _make_result(ctx.mode)
+
+        pm = Mock()
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        pm.cleanup_outputs = AsyncMock()
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm)
+
+        task_id = await service.trigger(
+            ctx=ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="research")
+        )
+        await started.wait()
+        await service.cancel(task_id)
+        self.assertEqual((await store.get(task_id)).status, "cancelled")
+        for _ in range(100):
+            if pm.cleanup_outputs.await_count:
+                break
+            await asyncio.sleep(0.01)
+
+        checkpoints = pm.cleanup_outputs.await_args.args[1]
+        self.assertEqual(checkpoints.get("output.created"), {"child_doc_token": "doxc_child"})
+        self.assertEqual(service._handles, {})
+        # 取消后在途的写入被忽略
+        await store.succeed(task_id, {})
+        self.assertEqual((await store.get(task_id)).status, "cancelled")
+        with self.assertRaises(ValueError):
+            await service.cancel(task_id)
+        with self.assertRaises(KeyError):
+            await service.cancel("missing")
+
+    async def test_cancel_from_other_worker_stops_at_next_progress(self) -> None:
+        gate = asyncio.Event()
+        reached_llm = False
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            nonlocal reached_llm
+            await gate.wait()
+            await progress("llm", 35, "llm")
+            reached_llm = True
+            return _make_result(ctx.mode)
+
+        pm = Mock()
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        pm.cleanup_outputs = AsyncMock()
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm)
+
+        task_id = await service.trigger(
+            ctx=ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="research")
+        )
+        await asyncio.sleep(0.01)
+        # 模拟其他 worker 处理了取消请求：只有状态变化，本进程的句柄未被取消
+        await store.cancel(task_id, "cancelled elsewhere")
+        gate.set()
+        for _ in range(100):
+            if pm.cleanup_outputs.await_count:
+                break
+            await asyncio.sleep(0.01)
+
+        self.assertFalse(reached_llm)
+        pm.cleanup_outputs.assert_awaited_once()
+        self.assertEqual((await store.get(task_id)).error, "cancelled elsewhere")
+
+    async def test_cancel_fan_out_cancels_children(self) -> None:
+        source = FetchedSource(source_doc=SourceDoc(doc_token="doxc_source", title="t"), content="c")
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            await asyncio.sleep(60)
+
+        pm = Mock()
+        pm.fetch_source = AsyncMock(return_value=source)
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        pm.cleanup_outputs = AsyncMock()
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm)
+
+        parent_id, children = await service.trigger_many(
+            ctx=ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="idea_expand"),
+            modes=["idea_expand", "research"],
+        )
+        await asyncio.sleep(0.01)
+        with self.assertRaises(ValueError):
+            await service.cancel(children["research"])
+        await service.cancel(parent_id)
+        await asyncio.sleep(0.01)
+
+        self.assertEqual((await store.get(parent_id)).status, "cancelled")
+        for task_id in children.values():
+            self.assertEqual((await store.get(task_id)).status, "cancelled")
+        self.assertEqual(pm.cleanup_outputs.await_count, 2)
+
+
+class TestTriggerServiceDedup(unittest.IsolatedAsyncioTestCase):
+    async def test_content_dedup_reuses_running_or_recent_tasks(self) -> None:
+        gate = asyncio.Event()
+        outcomes = {"doxc_fail": RuntimeError("boom")}
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            await gate.wait()
+            if ctx.doc_token in outcomes:
+                raise outcomes[ctx.doc_token]
+            return _make_result(ctx.mode)
+
+        pm = Mock()
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        pm.get_doc_revision = AsyncMock(return_value="r1")
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm, dedup_window_s=60)
+        ctx = ProcessContext(doc_token="doxc_a", user_id="ou_xxx", mode="idea_expand")
+
+        first = await service.trigger(ctx=ctx)
+        self.assertEqual(await service.trigger(ctx=ctx), first)
+        other_text = await service.trigger(ctx=replace(ctx, selected_text="x"))
+        self.assertNotEqual(other_text, first)
+
+        gate.set()
+        await _wait_finished(store, first)
+        # 窗口内成功的任务直接复用；文档版本变化后重新处理
+        self.assertEqual(await service.trigger(ctx=ctx), first)
+        pm.get_doc_revision.return_value = "r2"
+        self.assertNotEqual(await service.trigger(ctx=ctx), first)
+
+        # 失败的任务不复用
+        failed_ctx = ProcessContext(doc_token="doxc_fail", user_id="ou_xxx", mode="idea_expand")
+        failed = await service.trigger(ctx=failed_ctx)
+        await _wait_finished(store, failed)
+        self.assertNotEqual(await service.trigger(ctx=failed_ctx), failed)
+
+    async def test_explicit_key_does_not_rerun_existing_task(self) -> None:
+        pm = Mock()
+        pm.process_doc = AsyncMock(return_value=_make_result("idea_expand"))
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm)
+        ctx = ProcessContext(doc_token="doxc_a", user_id="ou_xxx", mode="idea_expand")
+
+        task_id = await service.trigger(ctx=ctx, idempotency_key="evt_1")
+        await _wait_finished(store, task_id)
+        self.assertEqual(await service.trigger(ctx=ctx, idempotency_key="evt_1"), task_id)
+        await asyncio.sleep(0.01)
+
+        pm.process_doc.assert_awaited_once()
+        self.assertEqual((await store.get(task_id))["status"], "succeeded")
+
+
+class TestTriggerServiceBatch(unittest.IsolatedAsyncioTestCase):
+    async def test_batch_creates_tasks_in_one_store_call(self) -> None:
+        gate = asyncio.Event()
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            await gate.wait()
+            return _make_result(ctx.mode)
+
+        pm = Mock()
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        pm.get_doc_revision = AsyncMock(return_value="r1")
+        store = TaskStore()
+        store.get_or_create_tasks = AsyncMock(wraps=store.get_or_create_tasks)
+        service = TriggerService(
+            task_store=store, process_manager=pm, workers=1, max_queue=1, dedup_window_s=60
+        )
+        ctxs = [
+            ProcessContext(doc_token=doc, user_id="ou_xxx", mode="idea_expand")
+            for doc in ("doxc_a", "doxc_a", "doxc_b", "doxc_c")
+        ]
+
+        results = await service.trigger_batch(ctxs=ctxs, concurrency=2)
+        store.get_or_create_tasks.assert_awaited_once()
+        # 同批重复内容复用同一任务；超出队列容量的条目单独拒绝
+        self.assertEqual(results[0], results[1])
+        self.assertIsInstance(results[2], str)
+        self.assertIsInstance(results[3], QueueFullError)
+        self.assertEqual(pm.get_doc_revision.await_count, 4)
+
+        gate.set()
+        for task_id in results[:3]:
+            self.assertEqual((await _wait_finished(store, task_id))["status"], "succeeded")
+
+
+class TestTriggerServiceBulk(unittest.IsolatedAsyncioTestCase):
+    async def test_bulk_caps_concurrency_and_retry_skips_succeeded(self) -> None:
+        running = 0
+        peak = 0
+        processed: list[str] = []
+        broken = {"doxc_2"}
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                await asyncio.sleep(0.01)
+                processed.append(ctx.doc_token)
+                if ctx.doc_token in broken:
+                    raise RuntimeError("boom")
+                return _make_result(ctx.mode)
+            finally:
+                running -= 1
+
+        pm = Mock()
+        pm.list_bulk_docs = AsyncMock(
+            return_value=[
+                BulkItem(doc_token=f"doxc_{i}", title=f"t{i}", wiki_node_token=f"wikcn_{i}")
+                for i in range(5)
+            ]
+        )
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm, workers=8)
+
+        parent_id = await service.trigger_bulk(
+            ctx=ProcessContext(doc_token="wikcn_root", user_id="ou_xxx", mode="idea_expand"),
+            concurrency=2,
+        )
+        parent = await _wait_finished(store, parent_id)
+
+        self.assertEqual(parent["status"], "failed")
+        self.assertEqual(parent["progress"]["bulk"]["succeeded"], 4)
+        self.assertEqual(parent["progress"]["bulk"]["failed"], 1)
+        self.assertEqual(peak, 2)
+        self.assertEqual(len(parent["child_task_ids"]), 5)
+        child = await store.get(parent["child_task_ids"][0])
+        self.assertEqual(child["parent_task_id"], parent_id)
+        self.assertEqual(child["context"]["wiki_node_token"], "wikcn_0")
+        self.assertEqual(child["result"]["child_doc_token"], "doxc_idea_expand")
+
+        broken.clear()
+        processed.clear()
+        await service.retry(parent_id)
+        parent = await _wait_finished(store, parent_id)
+
+        self.assertEqual(parent["status"], "succeeded")
+        self.assertEqual(parent["result"]["succeeded"], 5)
+        self.assertEqual(processed, ["doxc_2"])
+        self.assertEqual(len(parent["child_task_ids"]), 5)
+        pm.list_bulk_docs.assert_awaited_once()
+
+
+class TestTriggerServiceQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_bounded_queue_reports_position_and_rejects_overflow(self) -> None:
+        gate = asyncio.Event()
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            await gate.wait()
+            return _make_result(ctx.mode)
+
+        pm = Mock()
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        pm.cleanup_outputs = AsyncMock()
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm, workers=1, max_queue=2)
+        ctx = ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="research")
+
+        running = await service.trigger(ctx=ctx)
+        first = await service.trigger(ctx=ctx)
+        second = await service.trigger(ctx=ctx)
+        with self.assertRaises(QueueFullError):
+            await service.trigger(ctx=ctx)
+        await asyncio.sleep(0.01)
+        self.assertEqual((await store.get(second)).progress["queue_position"], 2)
+
+        # 取消排队中的任务后，后面的任务位置前移
+        await service.cancel(first)
+        await asyncio.sleep(0.01)
+        self.assertEqual((await store.get(second)).progress["queue_position"], 1)
+        stats = await service.queue_stats()
+        self.assertEqual((stats["running"], stats["queued"], stats["rejected_total"]), (1, 1, 1))
+
+        gate.set()
+        self.assertEqual((await _wait_finished(store, running))["status"], "succeeded")
+        self.assertEqual((await _wait_finished(store, second))["status"], "succeeded")
+        self.assertEqual(pm.process_doc.await_count, 2)
+
+
+class TestTriggerServiceDrain(unittest.IsolatedAsyncioTestCase):
+    async def test_drain_hands_off_unfinished_tasks_to_next_process(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = str(Path(tmp.name) / "tasks.db")
+        gate = asyncio.Event()
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            await gate.wait()
+            return _make_result(ctx.mode)
+
+        pm = Mock()
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        pm.cleanup_outputs = AsyncMock()
+        store = SQLiteTaskStore(path=path, flush_interval_s=60)
+        await store.start()
+        service = TriggerService(task_store=store, process_manager=pm, workers=1)
+        ctx = ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="research")
+        running = await service.trigger(ctx=ctx)
+        queued = await service.trigger(ctx=ctx)
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(await service.drain(0.05), [running, queued])
+        self.assertTrue(service.draining)
+        with self.assertRaises(ServiceDrainingError):
+            await service.trigger(ctx=ctx)
+        self.assertEqual(pm.process_doc.await_count, 1)
+        pm.cleanup_outputs.assert_not_awaited()
+        await store.close()
+
+        gate.set()
+        reopened = SQLiteTaskStore(path=path, flush_interval_s=60)
+        await reopened.start()
+        successor = TriggerService(task_store=reopened, process_manager=pm)
+        self.assertEqual(await successor.resume_handoff(), [running, queued])
+        for task_id in (running, queued):
+            task = await _wait_finished(reopened, task_id)
+            self.assertEqual((task["status"], task["attempts"]), ("succeeded", 2))
+        self.assertEqual(await reopened.take_handoff(), [])
+        await reopened.close()
+
+
+class TestEventDebouncer(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_coalesces_into_one_trigger(self) -> None:
+        trigger = AsyncMock(return_value="task_1")
+        debouncer = EventDebouncer(trigger=trigger, quiet_s=0.05, max_wait_s=1.0)
+        for user_id in ("ou_a", "ou_b", "ou_c"):
+            debouncer.submit(ProcessContext(doc_token="doxc_source", user_id=user_id, mode="idea_expand"))
+            await asyncio.sleep(0.01)
+        debouncer.submit(ProcessContext(doc_token="doxc_source", user_id="ou_a", mode="research"))
+        trigger.assert_not_awaited()
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(trigger.await_count, 2)
+        # 合并后以最后一个事件的上下文触发
+        self.assertEqual(trigger.await_args_list[0].args[0].user_id, "ou_c")
+        stats = debouncer.stats()
+        self.assertEqual(
+            (stats["received_total"], stats["coalesced_total"], stats["triggered_total"], stats["pending"]),
+            (4, 2, 2, 0),
+        )
+
+    async def test_max_wait_caps_delay_and_queue_full_is_retried(self) -> None:
+        trigger = AsyncMock(side_effect=["task_1", QueueFullError(1, 0.02), "task_2"])
+        debouncer = EventDebouncer(trigger=trigger, quiet_s=0.1, max_wait_s=0.15)
+        ctx = ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="idea_expand")
+        # 持续编辑从未静默满 quiet_s，仍在首个事件后 max_wait_s 触发
+        for _ in range(5):
+            debouncer.submit(ctx)
+            await asyncio.sleep(0.04)
+        self.assertEqual(trigger.await_count, 1)
+
+        # 停机 flush 立即触发；队列已满时按 retry_after 重试
+        await debouncer.flush()
+        self.assertEqual(trigger.await_count, 2)
+        self.assertEqual(debouncer.stats()["pending"], 1)
+        await asyncio.sleep(0.05)
+        self.assertEqual(trigger.await_count, 3)
+        self.assertEqual(debouncer.stats()["triggered_total"], 2)
+
+
+class TestWorkerPoolFairness(unittest.IsolatedAsyncioTestCase):
+    async def test_round_robin_across_users_with_caps(self) -> None:
+        gate = asyncio.Event()
+        started: list[str] = []
+
+        def job(task_id: str):
+            async def run() -> None:
+                started.append(task_id)
+                await gate.wait()
+
+            return run
+
+        pool = WorkerPool(workers=1, max_queue=100, max_per_user=1, serialize_docs=True)
+        pool.submit("blocker", job("blocker"), user_key="u0", doc_key="d0")
+        for i in range(4):
+            pool.submit(f"heavy{i}", job(f"heavy{i}"), user_key="heavy", doc_key=f"h{i}")
+        pool.submit("light", job("light"), user_key="light", doc_key="d0")
+        # 轻量用户的任务排在批量用户第二个任务之前
+        self.assertEqual(pool.position("light"), 2)
+        self.assertEqual(pool.position("heavy1"), 3)
+
+        gate.set()
+        for _ in range(100):
+            if len(started) == 6:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(started, ["blocker", "heavy0", "light", "heavy1", "heavy2", "heavy3"])
+
+    async def test_user_cap_and_doc_serialization_let_others_pass(self) -> None:
+        gate = asyncio.Event()
+
+        async def run() -> None:
+            await gate.wait()
+
+        pool = WorkerPool(workers=3, max_queue=100, max_per_user=1, serialize_docs=True)
+        pool.submit("a1", run, user_key="a", doc_key="d1")
+        pool.submit("a2", run, user_key="a", doc_key="d2")
+        pool.submit("b1", run, user_key="b", doc_key="d1")
+        pool.submit("c1", run, user_key="c", doc_key="d3")
+        # a2 受用户并发上限阻塞、b1 受文档串行阻塞，c1 越过两者先执行
+        self.assertEqual(
+            [pool.position(t) for t in ("a1", "a2", "b1", "c1")], [0, 1, 2, 0]
+        )
+        self.assertEqual(pool.stats()["running"], 2)
+        gate.set()
+        await asyncio.sleep(0.05)
+        self.assertEqual(pool.stats()["completed_total"], 4)
+
+
+class TestWorkerPoolPools(unittest.IsolatedAsyncioTestCase):
+    async def test_dedicated_slots_and_borrowing_returns_to_owner(self) -> None:
+        gates = {name: asyncio.Event() for name in ("s1", "s2", "s3", "l1")}
+        started: list[str] = []
+
+        def job(task_id: str):
+            async def run() -> None:
+                started.append(task_id)
+                await gates[task_id].wait()
+
+            return run
+
+        pool = WorkerPool(
+            workers=1,
+            max_queue=100,
+            pools={"default": PoolSpec(workers=1, borrow=True), "long": PoolSpec(workers=1)},
+        )
+        pool.submit("s1", job("s1"), user_key="u")
+        # long 分池空闲：短任务借用其执行位
+        pool.submit("s2", job("s2"), user_key="u")
+        pool.submit("l1", job("l1"), user_key="u", pool="long")
+        pool.submit("s3", job("s3"), user_key="u")
+        await asyncio.sleep(0)
+        self.assertEqual(started, ["s1", "s2"])
+        self.assertEqual(pool.position("l1"), 1)
+        self.assertEqual(pool.position("s3"), 1)
+        stats = pool.stats()["pools"]
+        self.assertEqual(stats["default"]["borrowed"], 1)
+        self.assertEqual(stats["long"]["queued"], 1)
+        self.assertEqual(
+            pool.load(),
+            {"default": {"queued": 1, "running": 2}, "long": {"queued": 1, "running": 0}},
+        )
+
+        # 空出的执行位先还给 long 分池的排队任务
+        gates["s1"].set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(started, ["s1", "s2", "l1"])
+        gates["s2"].set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(started, ["s1", "s2", "l1", "s3"])
+
+        with self.assertRaises(ValueError):
+            pool.submit("x", job("s3"), pool="missing")
+        for gate in gates.values():
+            gate.set()
+        await asyncio.sleep(0.01)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis not installed")
+class TestExternalWorker(unittest.IsolatedAsyncioTestCase):
+    async def test_api_enqueues_and_worker_executes(self) -> None:
+        server = fakeredis.FakeServer()
+
+        def client():
+            return fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            await progress("llm", 50, "thinking")
+            return _make_result(ctx.mode)
+
+        api_pm = Mock()
+        api_pm.process_doc = AsyncMock(side_effect=AssertionError("API process must not run tasks"))
+        worker_pm = Mock()
+        worker_pm.process_doc = AsyncMock(side_effect=process_doc)
+        api_store = RedisTaskStore(client=client())
+        api = TriggerService(
+            task_store=api_store,
+            process_manager=api_pm,
+            job_queue=RedisJobQueue(client=client()),
+            max_queue=1,
+        )
+        ctx = ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="research")
+        task_id = await api.trigger(ctx=ctx)
+        with self.assertRaises(QueueFullError):
+            await api.trigger(ctx=ctx)
+
+        queue = RedisJobQueue(client=client())
+        worker = QueueWorker(
+            service=TriggerService(
+                task_store=RedisTaskStore(client=client()),
+                process_manager=worker_pm,
+                job_queue=queue,
+            ),
+            queue=queue,
+            concurrency=1,
+            poll_timeout_s=0.05,
+        )
+        runner = asyncio.create_task(worker.run())
+        try:
+            task = await asyncio.wait_for(_wait_finished(api_store, task_id), timeout=5)
+        finally:
+            # stop 后主循环在下一次（最多 poll_timeout_s）取队列返回时退出
+            await worker.stop()
+            await asyncio.wait_for(runner, timeout=5)
+
+        self.assertEqual(task["status"], "succeeded")
+        self.assertEqual((await api.queue_stats())["queued"], 0)
+
+
+class TestTriggerServiceTimeline(unittest.IsolatedAsyncioTestCase):
+    async def test_timeline_records_stages_and_sub_calls(self) -> None:
+        async def process_doc(ctx, *, progress=None, source=None, checkpoints=None):
+            await progress("fetch_meta", 5, "meta")
+            record_call("feishu")
+            await progress("llm", 35, "llm")
+            record_call("llm")
+            record_call("llm")
+            await progress("done", 100, "done")
+            return _make_result(ctx.mode)
+
+        pm = Mock()
+        pm.process_doc = AsyncMock(side_effect=process_doc)
+        store = TaskStore()
+        service = TriggerService(task_store=store, process_manager=pm)
+
+        task_id = await service.trigger(
+            ctx=ProcessContext(doc_token="doxc_source", user_id="ou_xxx", mode="research")
+        )
+        task = await _wait_finished(store, task_id)
+
+        stages = [span["stage"] for span in task["timeline"]]
+        self.assertEqual(stages, ["queued", "started", "fetch_meta", "llm"])
+        spans = {span["stage"]: span for span in task["timeline"]}
+        self.assertEqual(spans["fetch_meta"]["calls"], {"feishu": 1})
+        self.assertEqual(spans["llm"]["calls"], {"llm": 2})
+        self.assertTrue(all(span["duration_s"] is not None for span in task["timeline"]))
+        self.assertEqual(service.stage_stats.summary()["research"]["llm"]["count"], 1)
+
+
+class TestStageLatencyStats(unittest.TestCase):
+    def test_percentiles(self) -> None:
+        stats = StageLatencyStats()
+        for i in range(1, 101):
+            stats.observe("idea_expand", [{"stage": "llm", "duration_s": float(i)}])
+        summary = stats.summary()["idea_expand"]["llm"]
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["p50"], 50.0)
+        self.assertEqual(summary["p90"], 90.0)
+        self.assertEqual(summary["p99"], 99.0)
+        self.assertEqual(summary["max"], 100.0)
+
+
+if __name__ == "__main__":
+    unittest.main()